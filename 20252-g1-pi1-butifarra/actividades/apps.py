@@ -6,3 +6,6 @@ class ActividadesConfig(AppConfig):
     name = 'butifarra.actividades'
     label = 'actividades'  # opcional pero recomendable
 
+
+    def ready(self):
+        from butifarra.actividades import checks  # noqa: F401  (registers the system checks)
@@ -5,3 +5,6 @@ class ActividadesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'butifarra.actividades'
     label = 'actividades'
+
+    def ready(self):
+        from . import checks  # noqa: F401  (registers the system checks)
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+REPORTS_VERSION_KEY = "reports:dashboard:version"
+REPORTS_HITS_KEY = "reports:dashboard:hits"
+REPORTS_MISSES_KEY = "reports:dashboard:misses"
+# Backends private to one process: other workers never see their writes or deletes
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def cache_is_shared(alias="default"):
+    """
+    Whether every worker reads and writes the same cache. With a per-process
+    backend an invalidation (logout, an unread counter reset, a reports
+    version bump) only reaches the worker that made it.
+    """
+    return settings.CACHES.get(alias, {}).get("BACKEND") not in PROCESS_LOCAL_CACHE_BACKENDS
+
+
+def _incr(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        return cache.incr(key)
+
+
+def reports_cache_version():
+    """
+    Current dashboard cache version. It is seeded from the clock so that a
+    version lost to eviction restarts above every version already used.
+    """
+    version = cache.get(REPORTS_VERSION_KEY)
+    if version is None:
+        cache.add(REPORTS_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(REPORTS_VERSION_KEY)
+    return version
+
+
+def bump_reports_version():
+    """Invalidate every cached dashboard payload."""
+    try:
+        cache.incr(REPORTS_VERSION_KEY)
+    except ValueError:
+        cache.add(REPORTS_VERSION_KEY, time.time_ns(), None)
+
+
+def reports_cache_key(filters_applied):
+    """Key for one filter combination; activity type order does not matter."""
+    normalized = dict(filters_applied)
+    if "activity_types" in normalized:
+        normalized["activity_types"] = sorted(set(normalized["activity_types"]))
+    digest = hashlib.sha1(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"reports:dashboard:{reports_cache_version()}:{digest}"
+
+
+def get_cached_report(key):
+    """
+    Cached dashboard payload, or None. Only a shared backend is used: the
+    version bump of one worker would not reach the per-process caches of
+    the others, which would keep serving stale reports.
+    """
+    payload = cache.get(key) if cache_is_shared() else None
+    _incr(REPORTS_MISSES_KEY if payload is None else REPORTS_HITS_KEY)
+    return payload
+
+
+def set_cached_report(key, payload):
+    if not cache_is_shared():
+        return
+    cache.set(key, payload, getattr(settings, "REPORTS_CACHE_TIMEOUT", 300))
+
+
+def reports_cache_stats():
+    return {
+        "hits": cache.get(REPORTS_HITS_KEY, 0),
+        "misses": cache.get(REPORTS_MISSES_KEY, 0),
+        "version": reports_cache_version(),
+    }
+
+
+# Per-user unread notification counters ----------------------------------
+
+def _unread_key(user_id):
+    return f"notifications:unread:{user_id}"
+
+
+def get_unread_count(user_id, fallback):
+    """
+    Cached unread count for a user; ``fallback()`` counts in the database on
+    a miss, and on every call when the cache is not shared by all workers.
+    """
+    if not cache_is_shared():
+        return fallback()
+    count = cache.get(_unread_key(user_id))
+    if count is None:
+        count = fallback()
+        cache.add(_unread_key(user_id), count, getattr(settings, "UNREAD_COUNT_CACHE_TIMEOUT", 3600))
+    return count
+
+
+def incr_unread_counts(counts):
+    """Add ``{user_id: n}`` to the counters that are cached (missing ones are recounted on read)."""
+    for user_id, delta in counts.items():
+        try:
+            cache.incr(_unread_key(user_id), delta)
+        except ValueError:
+            pass
+
+
+def decr_unread_count(user_id, delta=1):
+    try:
+        if cache.decr(_unread_key(user_id), delta) < 0:
+            cache.delete(_unread_key(user_id))
+    except ValueError:
+        pass
+
+
+def reset_unread_count(user_id):
+    """Forget the counter so the next read recounts it from the database."""
+    cache.delete(_unread_key(user_id))
+
+
+# Per-user session payload (api_session) --------------------------------
+
+def _session_payload_key(user_id):
+    return f"session:user:{user_id}"
+
+
+def session_payload_etag(user_payload):
+    digest = hashlib.sha1(json.dumps(user_payload, sort_keys=True).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def get_session_payload(user_id):
+    """Cached ``{"user", "etag", "auth_hash", "is_active"}`` entry for a user, or None."""
+    return cache.get(_session_payload_key(user_id))
+
+
+def set_session_payload(user_id, user_payload, auth_hash, is_active=True):
+    """Cache a serialized user and return its ETag."""
+    etag = session_payload_etag(user_payload)
+    cache.set(
+        _session_payload_key(user_id),
+        {"user": user_payload, "etag": etag, "auth_hash": auth_hash, "is_active": is_active},
+        getattr(settings, "SESSION_PAYLOAD_CACHE_TIMEOUT", 3600),
+    )
+    return etag
+
+
+def invalidate_session_payload(user_id):
+    cache.delete(_session_payload_key(user_id))
@@ -0,0 +1,281 @@
+"""
+Delivery channels for the notification outbox.
+
+Every outgoing channel (email, push, sms) has an adapter with the same
+batch interface: ``send_batch(notifications)`` returns
+``{notification.pk: error}`` with ``None`` for delivered rows; rows left
+out were not attempted (transport unreachable) and stay queued. Adapters
+split a batch into chunks and send up to ``concurrency`` chunks at once.
+
+Push and SMS go through a pluggable transport configured per channel in
+``NOTIFICATION_CHANNELS`` (same idea as ``EMAIL_BACKEND``). Without one the
+channel's rows fail with an error instead of being reported as sent. The
+bundled loopback and file transports deliver locally, for tests and to
+measure each channel's throughput without an outside service.
+"""
+import json
+import logging
+import os
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('actividades.email')
+
+ADAPTERS = {}
+
+
+def register(adapter_class):
+    ADAPTERS[adapter_class.channel] = adapter_class
+    return adapter_class
+
+
+def get_adapter(channel, **overrides):
+    """Adapter for ``channel`` configured from ``NOTIFICATION_CHANNELS``."""
+    config = getattr(settings, 'NOTIFICATION_CHANNELS', {}).get(channel, {})
+    options = {
+        'concurrency': config.get('CONCURRENCY'),
+        'max_attempts': config.get('MAX_ATTEMPTS'),
+        'retry_backoff': config.get('RETRY_BACKOFF'),
+    }
+    if config.get('TRANSPORT'):
+        options['transport'] = import_string(config['TRANSPORT'])(channel=channel, **config.get('OPTIONS', {}))
+    options.update(overrides)
+    return ADAPTERS[channel](**options)
+
+
+class TransientError(Exception):
+    """Delivery failed for a reason worth retrying (timeout, throttling, temporary rejection)."""
+
+
+class ConnectionLost(Exception):
+    """The SMTP connection dropped and could not be reopened."""
+
+
+# Errors that mean the session is gone (not that this message was rejected)
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+def is_transient(exc):
+    if isinstance(exc, (TransientError,) + CONNECTION_ERRORS):
+        return True
+    # 4xx SMTP replies are temporary by definition
+    return isinstance(exc, smtplib.SMTPResponseException) and 400 <= exc.smtp_code < 500
+
+
+class ChannelAdapter:
+    channel = None
+    label = None
+    chunk_size = 100
+    concurrency = 1
+    max_attempts = 3
+    # Seconds before the first retry; doubled on every further attempt
+    retry_backoff = 60
+
+    def __init__(self, chunk_size=None, concurrency=None, max_attempts=None, retry_backoff=None):
+        self.chunk_size = chunk_size or self.chunk_size
+        self.concurrency = concurrency or self.concurrency
+        self.max_attempts = max_attempts or self.max_attempts
+        self.retry_backoff = retry_backoff if retry_backoff is not None else self.retry_backoff
+
+    def prepare(self, notification):
+        """Build the payload for one notification; raise if it can never be delivered."""
+        raise NotImplementedError
+
+    def send_chunk(self, items):
+        """Deliver ``[(notification, payload), ...]``; returns ``{pk: error or None}``."""
+        raise NotImplementedError
+
+    def retry_delay(self, attempt):
+        return self.retry_backoff * 2 ** (attempt - 1)
+
+    def send_batch(self, notifications):
+        results = {}
+        items = []
+        for notification in notifications:
+            try:
+                items.append((notification, self.prepare(notification)))
+            except Exception as exc:
+                results[notification.pk] = exc
+
+        chunks = [items[start:start + self.chunk_size] for start in range(0, len(items), self.chunk_size)]
+        if self.concurrency > 1 and len(chunks) > 1:
+            # Chunks only talk to the transport; the database stays on the calling thread
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(chunks))) as pool:
+                for chunk_results in pool.map(self._send_chunk, chunks):
+                    results.update(chunk_results)
+        else:
+            for chunk in chunks:
+                results.update(self._send_chunk(chunk))
+        return results
+
+    def _send_chunk(self, items):
+        try:
+            return self.send_chunk(items)
+        except Exception as exc:
+            # Transport unreachable: leave the chunk for the next run
+            logger.warning('%s transport failed, %s notifications left queued: %s', self.label, len(items), exc)
+            return {}
+
+
+@register
+class EmailAdapter(ChannelAdapter):
+    """One SMTP session per chunk of ``EMAIL_BATCH_SIZE`` messages (servers cap messages per session)."""
+    channel = 'email'
+    label = 'Email'
+
+    def __init__(self, chunk_size=None, **options):
+        super().__init__(chunk_size=chunk_size or getattr(settings, 'EMAIL_BATCH_SIZE', 100), **options)
+
+    def send_batch(self, notifications):
+        if not settings.EMAIL_HOST_USER or not settings.EMAIL_HOST_PASSWORD:
+            error = ValueError('Credenciales SMTP no configuradas')
+            return {notification.pk: error for notification in notifications}
+        return super().send_batch(notifications)
+
+    def prepare(self, notification):
+        return _build_email(notification)
+
+    def send_chunk(self, items):
+        results = {}
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+            for notification, message in items:
+                try:
+                    _send_over(connection, message)
+                except ConnectionLost:
+                    raise
+                except Exception as exc:
+                    results[notification.pk] = exc
+                else:
+                    results[notification.pk] = None
+        except Exception as exc:
+            logger.warning('SMTP connection failed, %s emails left queued: %s', len(items) - len(results), exc)
+        finally:
+            connection.close()
+        return results
+
+
+def _build_email(notification):
+    if not notification.user.email:
+        raise ValueError('Usuario sin email')
+    return EmailMessage(
+        subject=notification.title,
+        body=notification.body,
+        from_email=settings.DEFAULT_FROM_EMAIL or settings.EMAIL_HOST_USER,
+        to=[notification.user.email],
+    )
+
+
+def _send_over(connection, message):
+    """Send one message on an open connection, reconnecting once if the session dropped."""
+    try:
+        connection.send_messages([message])
+    except CONNECTION_ERRORS:
+        connection.close()
+        try:
+            connection.open()
+        except Exception as exc:
+            raise ConnectionLost(exc) from exc
+        connection.send_messages([message])
+
+
+def send_email_batch(notifications, chunk_size=None):
+    """Send email notifications; see ``EmailAdapter``."""
+    return get_adapter('email', chunk_size=chunk_size).send_batch(notifications)
+
+
+class TransportAdapter(ChannelAdapter):
+    """Adapter that hands each chunk of payloads to a transport's ``send(payloads)``."""
+
+    def __init__(self, transport=None, **options):
+        super().__init__(**options)
+        self.transport = transport
+
+    def send_batch(self, notifications):
+        if self.transport is None:
+            logger.error('No %s transport configured, %s notifications failed', self.label, len(notifications))
+            error = ValueError(f'Transporte {self.label} no configurado')
+            return {notification.pk: error for notification in notifications}
+        return super().send_batch(notifications)
+
+    def send_chunk(self, items):
+        errors = self.transport.send([payload for _, payload in items])
+        return {notification.pk: error for (notification, _), error in zip(items, errors)}
+
+
+@register
+class PushAdapter(TransportAdapter):
+    channel = 'push'
+    label = 'Push'
+    # Push providers accept multicast requests of up to 500 tokens
+    chunk_size = 500
+    concurrency = 4
+
+    def prepare(self, notification):
+        return {
+            'to': f'user:{notification.user_id}',
+            'title': notification.title,
+            'body': notification.body,
+            'data': {'notification_id': notification.pk},
+        }
+
+
+@register
+class SmsAdapter(TransportAdapter):
+    channel = 'sms'
+    label = 'SMS'
+    concurrency = 4
+    MAX_CHARS = 160
+
+    def prepare(self, notification):
+        profile = getattr(notification.user, 'profile', None)
+        if not profile or not profile.phone_number:
+            raise ValueError('Usuario sin celular')
+        return {'to': profile.phone_number, 'body': f'{notification.title}: {notification.body}'[:self.MAX_CHARS]}
+
+
+# Local transports ----------------------------------------------------------
+
+class LoopbackTransport:
+    """
+    Accepts every payload after ``latency`` seconds per call, to stand in
+    for a provider round trip. Payloads are kept as ``(channel, payload)``
+    only when a test sets ``LoopbackTransport.outbox`` to a list.
+    """
+    outbox = None
+    _lock = threading.Lock()
+
+    def __init__(self, channel=None, latency=0.0, **options):
+        self.channel = channel
+        self.latency = latency
+
+    def send(self, payloads):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.outbox is not None:
+            with self._lock:
+                self.outbox.extend((self.channel, payload) for payload in payloads)
+        return [None] * len(payloads)
+
+
+class FileTransport:
+    """Appends payloads as JSON lines to ``<directory>/<channel>.jsonl``."""
+    _lock = threading.Lock()
+
+    def __init__(self, channel=None, directory=None, **options):
+        self.path = os.path.join(directory or settings.BASE_DIR / 'notification-outbox', f'{channel}.jsonl')
+
+    def send(self, payloads):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as handle:
+                for payload in payloads:
+                    handle.write(json.dumps(payload, ensure_ascii=False) + '\n')
+        return [None] * len(payloads)
@@ -0,0 +1,67 @@
+"""
+Signed, self-expiring check-in tokens.
+
+A token carries the activity id, its expiry and a random nonce, signed with
+HMAC-SHA256, so the check-in endpoint validates it without reading the
+database. Tokens are independent of each other: every token generated for
+an activity stays valid until its own expiry, so several QR displays can run
+at the same time.
+
+Tokens are signed with the first key of ``CHECKIN_TOKEN_KEYS`` (``SECRET_KEY``
+when the list is empty) and any key in the list verifies them. To rotate,
+put the new key first and drop the old one once its tokens have expired.
+"""
+import secrets
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+SALT = "actividades.checkin"
+
+
+class InvalidCheckinToken(Exception):
+    """The token was not signed by us or is malformed."""
+
+
+class ExpiredCheckinToken(InvalidCheckinToken):
+    """The signature is valid but the token is past its expiry."""
+
+
+def _signer():
+    keys = getattr(settings, "CHECKIN_TOKEN_KEYS", None) or [settings.SECRET_KEY]
+    # "." keeps the token URL-safe for the QR link and the frontend route
+    return signing.Signer(key=keys[0], fallback_keys=keys[1:], sep=".", salt=SALT, algorithm="sha256")
+
+
+def make_checkin_token(activity_id, now=None):
+    """Return ``(token, expires_at)`` for a new token of ``activity_id``."""
+    now = now or timezone.now()
+    ttl = getattr(settings, "CHECKIN_TOKEN_TTL_MINUTES", 10)
+    expires_at = (now + timedelta(minutes=ttl)).replace(microsecond=0)
+    value = ".".join(
+        [
+            signing.b62_encode(activity_id),
+            signing.b62_encode(int(expires_at.timestamp())),
+            secrets.token_urlsafe(6),
+        ]
+    )
+    return _signer().sign(value), expires_at
+
+
+def read_checkin_token(token, now=None):
+    """
+    Return the activity id of a valid token. Raises ``InvalidCheckinToken``
+    for a bad signature and ``ExpiredCheckinToken`` once it has expired.
+    """
+    try:
+        value = _signer().unsign(token)
+        activity_id, expires, _nonce = value.split(".")
+        activity_id, expires = signing.b62_decode(activity_id), signing.b62_decode(expires)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise InvalidCheckinToken(token)
+    now = now or timezone.now()
+    if datetime.fromtimestamp(expires, tz=dt_timezone.utc) < now:
+        raise ExpiredCheckinToken(token)
+    return activity_id
@@ -0,0 +1,24 @@
+"""System checks for the deployment settings the app relies on."""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+from .caching import cache_is_shared
+
+CACHED_SESSION_ENGINES = (
+    "django.contrib.sessions.backends.cache",
+    "django.contrib.sessions.backends.cached_db",
+)
+
+
+@register(Tags.caches)
+def check_session_engine_cache(app_configs, **kwargs):
+    """Sessions read through a per-process cache outlive a logout handled by another worker."""
+    if settings.SESSION_ENGINE in CACHED_SESSION_ENGINES and not cache_is_shared():
+        return [
+            Error(
+                f"SESSION_ENGINE {settings.SESSION_ENGINE} needs a cache shared by all workers.",
+                hint="Point CACHE_BACKEND at Redis or Memcached, or use django.contrib.sessions.backends.db.",
+                id="actividades.E001",
+            )
+        ]
+    return []
@@ -0,0 +1,185 @@
+"""
+Notification outbox.
+
+Requests only insert ``pending``/``scheduled`` Notification rows; the
+``dispatch_notifications`` worker drains them here. Each batch is claimed
+with ``SELECT ... FOR UPDATE SKIP LOCKED`` inside its own transaction, so
+several workers can run side by side without sending a row twice, and a
+worker that dies mid-batch simply releases its rows.
+
+Scheduled rows are released once ``scheduled_for`` passes (in-app ones just
+become visible); outgoing ones due during the recipient's quiet hours are
+pushed back to the end of the window. Each outgoing channel is delivered by
+its adapter in ``channels``; transient failures are retried with
+exponential backoff and every attempt is logged.
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .channels import ADAPTERS, get_adapter, is_transient
+from .models import Campaign, Notification, NotificationDeliveryLog, _prefs_by_user, track_unread_notifications
+
+logger = logging.getLogger('actividades.email')
+
+# Channels delivered by the worker; scheduled in-app rows are only released
+OUTBOX_CHANNELS = tuple(ADAPTERS)
+SCHEDULED_CHANNELS = OUTBOX_CHANNELS + ('app',)
+
+
+def due_scheduled(now=None):
+    """Scheduled notifications whose time has come (including retries)."""
+    return Notification.objects.filter(
+        channel__in=SCHEDULED_CHANNELS, status='scheduled', scheduled_for__lte=now or timezone.now()
+    )
+
+
+def _claim(queryset, limit):
+    return list(
+        queryset.select_for_update(skip_locked=True, of=('self',)).select_related('user', 'user__profile')[:limit]
+    )
+
+
+def _release_in_app(notifications, now):
+    for notification in notifications:
+        notification.status = 'sent'
+        notification.sent_at = now
+        notification.updated_at = now
+    Notification.objects.bulk_update(notifications, ['status', 'sent_at', 'updated_at'])
+    track_unread_notifications(notifications)
+
+
+def _defer_quiet_hours(notifications, now):
+    """
+    Reschedule outgoing notifications whose recipient is inside quiet hours
+    to the end of the window. High priority notifications are never held back.
+    Returns ``(due, deferred)``.
+    """
+    prefs_by_user = _prefs_by_user({n.user_id for n in notifications if n.priority != 'high'})
+    due, deferred = [], []
+    for notification in notifications:
+        prefs = prefs_by_user.get(notification.user_id)
+        until = prefs.quiet_until(now) if prefs and notification.priority != 'high' else None
+        if until is None:
+            due.append(notification)
+            continue
+        notification.status = 'scheduled'
+        notification.scheduled_for = until
+        notification.updated_at = now
+        deferred.append(notification)
+    if deferred:
+        Notification.objects.bulk_update(deferred, ['status', 'scheduled_for', 'updated_at'])
+        logger.info('%s notifications deferred for quiet hours', len(deferred))
+    return due, deferred
+
+
+def _deliver(adapter, notifications, now):
+    """
+    Send ``notifications`` through ``adapter`` and apply the outcome to each
+    row in memory. Returns ``(sent, failed, retried, logs)``.
+    """
+    results = adapter.send_batch(notifications)
+    delivered_at = timezone.now()
+    sent, failed, retried, logs = [], [], [], []
+    for notification in notifications:
+        if notification.pk not in results:
+            continue
+        exc = results[notification.pk]
+        notification.updated_at = delivered_at
+        if exc is None:
+            notification.status = 'sent'
+            notification.sent_at = delivered_at
+            sent.append(notification)
+            logs.append(NotificationDeliveryLog(
+                notification=notification,
+                channel=notification.channel,
+                status='success',
+                detail=f'{adapter.label} enviado correctamente',
+            ))
+            continue
+
+        attempt = notification.metadata.get('attempts', 0) + 1
+        notification.metadata = {**notification.metadata, 'attempts': attempt}
+        if is_transient(exc) and attempt < adapter.max_attempts:
+            delay = adapter.retry_delay(attempt)
+            logger.info('Notification %s attempt %s failed, retrying in %ss: %s', notification.pk, attempt, delay, exc)
+            notification.status = 'scheduled'
+            notification.scheduled_for = now + timezone.timedelta(seconds=delay)
+            retried.append(notification)
+            logs.append(NotificationDeliveryLog(
+                notification=notification,
+                channel=notification.channel,
+                status='retry',
+                detail=f'Intento {attempt} fallido: {exc}. Reintento en {delay}s',
+            ))
+        else:
+            logger.warning('Notification %s failed: %s', notification.pk, exc)
+            notification.status = 'failed'
+            failed.append(notification)
+            logs.append(NotificationDeliveryLog(
+                notification=notification,
+                channel=notification.channel,
+                status='error',
+                detail=f'Error al enviar: {exc}',
+            ))
+    return sent, failed, retried, logs
+
+
+def dispatch_batch(batch_size=None, now=None):
+    """
+    Claim up to ``batch_size`` due notifications, deliver them and record a
+    NotificationDeliveryLog for each attempt. Returns the number of rows
+    processed (released, sent, failed, retried or deferred).
+    """
+    return sum(dispatch_batch_counts(batch_size, now).values())
+
+
+def dispatch_batch_counts(batch_size=None, now=None):
+    """
+    Like ``dispatch_batch``, but returns the rows of each outcome:
+    ``{"released", "deferred", "sent", "failed", "retried"}``. Only the last
+    three went through a channel adapter.
+    """
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_DISPATCH_BATCH_SIZE', 50)
+    now = now or timezone.now()
+    with transaction.atomic():
+        # Overdue scheduled rows first, in due order (scheduled_for index),
+        # then pending ones in arrival order (outbox index)
+        batch = _claim(due_scheduled(now).order_by('scheduled_for', 'id'), batch_size)
+        if len(batch) < batch_size:
+            batch += _claim(
+                Notification.objects.filter(channel__in=OUTBOX_CHANNELS, status='pending').order_by('created_at', 'id'),
+                batch_size - len(batch),
+            )
+
+        released = [n for n in batch if n.channel == 'app']
+        if released:
+            _release_in_app(released, now)
+        outgoing, deferred = _defer_quiet_hours([n for n in batch if n.channel != 'app'], now)
+
+        by_channel = defaultdict(list)
+        for notification in outgoing:
+            by_channel[notification.channel].append(notification)
+        sent, failed, retried, logs = [], [], [], []
+        for channel, notifications in by_channel.items():
+            outcome = _deliver(get_adapter(channel), notifications, now)
+            for collected, rows in zip((sent, failed, retried, logs), outcome):
+                collected.extend(rows)
+
+        # Status transitions and logs are flushed once per batch
+        Notification.objects.bulk_update(
+            sent + failed + retried, ['status', 'sent_at', 'scheduled_for', 'metadata', 'updated_at']
+        )
+        NotificationDeliveryLog.objects.bulk_create(logs)
+        Campaign.record_notifications('delivered', released + sent)
+        Campaign.record_notifications('failed', failed)
+    return {
+        'released': len(released),
+        'deferred': len(deferred),
+        'sent': len(sent),
+        'failed': len(failed),
+        'retried': len(retried),
+    }
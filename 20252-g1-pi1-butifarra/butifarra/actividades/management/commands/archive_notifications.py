@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from django.utils import timezone
+
+from actividades.models import ArchivedNotification, Notification
+
+
+class Command(BaseCommand):
+    help = 'Move read/sent notifications older than the retention period into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Keep notifications newer than this many days (default: NOTIFICATION_RETENTION_DAYS)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Notifications moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many would be archived')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is None:
+            days = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 180)
+        before = timezone.now() - timedelta(days=days)
+
+        if options['dry_run']:
+            count = Notification.objects.filter(
+                status__in=ArchivedNotification.ARCHIVABLE_STATUSES, created_at__lt=before
+            ).count()
+            self.stdout.write(f'{count} notifications older than {days} days would be archived')
+            return
+
+        total = 0
+        while True:
+            try:
+                moved = ArchivedNotification.archive_batch(before, options['batch_size'])
+            except IntegrityError as exc:
+                raise CommandError(f'Stopped after {total} notifications archived: {exc}')
+            if not moved:
+                break
+            total += moved
+            self.stdout.write(f'Archived {moved} notifications')
+        self.stdout.write(self.style.SUCCESS(f'Done: {total} notifications archived'))
@@ -0,0 +1,49 @@
+import time
+import tracemalloc
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from actividades.models import Campaign, fan_out_campaign
+
+
+class Command(BaseCommand):
+    help = 'Measure peak memory of a campaign broadcast, single-batch versus chunked fan-out'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=100000, help='Number of users to broadcast to')
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows per INSERT (default: NOTIFICATION_FANOUT_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        total = options['recipients']
+        prefix = f"bench-fanout-{uuid.uuid4().hex[:8]}"
+
+        with transaction.atomic():
+            owner = User.objects.create(username=f'{prefix}_owner')
+            users = User.objects.bulk_create(
+                [User(username=f'{prefix}-{i}', email=f'{prefix}-{i}@example.com') for i in range(total)],
+                batch_size=1000,
+            )
+            recipients = User.objects.filter(username__startswith=f'{prefix}-')
+            del users
+
+            # One batch as large as the whole segment reproduces the old single INSERT
+            self._measure('Single batch', recipients, total * 2, owner)
+            self._measure('Chunked', recipients, options['batch_size'], owner)
+            transaction.set_rollback(True)
+
+    def _measure(self, label, recipients, batch_size, owner):
+        campaign = Campaign.objects.create(name=f'Benchmark {label}', message='Mensaje de prueba', created_by=owner)
+        tracemalloc.start()
+        started = time.perf_counter()
+        with transaction.atomic():
+            created = fan_out_campaign(campaign, recipients, ['email', 'app'], batch_size=batch_size)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f'{label}: {sum(created.values())} notifications in {elapsed:.2f}s, '
+            f'peak {peak / 1024 / 1024:.1f} MiB'
+        )
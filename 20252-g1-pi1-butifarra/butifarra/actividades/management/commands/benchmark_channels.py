@@ -0,0 +1,45 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from actividades.models import Notification, UserProfile
+from butifarra.actividades.channels import ADAPTERS, LoopbackTransport, TransportAdapter, get_adapter
+
+
+class Command(BaseCommand):
+    help = 'Measure push/SMS adapter throughput against the loopback transport'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--channel', action='append', help='Channel to measure (default: push and sms)')
+        parser.add_argument('--messages', type=int, default=2000, help='Notifications sent per run')
+        parser.add_argument('--latency', type=float, default=0.02, help='Simulated provider round trip per chunk, in seconds')
+        parser.add_argument('--concurrency', type=int, default=None, help='Parallel chunks for the second run (default: adapter setting)')
+
+    def handle(self, *args, **options):
+        channels = options['channel'] or [c for c, a in ADAPTERS.items() if issubclass(a, TransportAdapter)]
+        for channel in channels:
+            if not issubclass(ADAPTERS.get(channel, object), TransportAdapter):
+                raise CommandError(f'El canal {channel} no usa un transporte intercambiable')
+
+        # Unsaved rows: the adapters never touch the database
+        user = User(id=1, username='bench-channels', email='bench@example.com')
+        user.profile = UserProfile(user=user, phone_number='3000000000')
+        notifications = []
+        for pk in range(1, options['messages'] + 1):
+            notification = Notification(id=pk, user=user, title=f'Benchmark {pk}', body='Mensaje de prueba')
+            notifications.append(notification)
+
+        for channel in channels:
+            concurrency = options['concurrency'] or get_adapter(channel).concurrency
+            for label, workers in (('sequential', 1), (f'{concurrency} workers', concurrency)):
+                transport = LoopbackTransport(channel=channel, latency=options['latency'])
+                adapter = get_adapter(channel, transport=transport, concurrency=workers)
+                started = time.perf_counter()
+                results = adapter.send_batch(notifications)
+                elapsed = time.perf_counter() - started
+                sent = sum(1 for error in results.values() if error is None)
+                rate = sent / elapsed if elapsed else 0
+                self.stdout.write(
+                    f'{channel} {label}: {sent} sent in {elapsed:.3f}s ({rate:.1f} msg/s, chunks of {adapter.chunk_size})'
+                )
@@ -0,0 +1,81 @@
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from actividades.models import Notification
+from butifarra.actividades.channels import _build_email, send_email_batch
+
+
+class CountingBackend(BaseEmailBackend):
+    """Wraps the real backend and counts the sessions (backend instances) opened."""
+    target = 'django.core.mail.backends.locmem.EmailBackend'
+    sessions = 0
+
+    def __init__(self, fail_silently=False, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        type(self).sessions += 1
+        self.inner = get_connection(self.target, fail_silently=fail_silently, **kwargs)
+
+    def open(self):
+        return self.inner.open()
+
+    def close(self):
+        return self.inner.close()
+
+    def send_messages(self, email_messages):
+        return self.inner.send_messages(email_messages)
+
+
+class Command(BaseCommand):
+    help = 'Compare per-message email sending with the batched SMTP sender'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500, help='Number of emails to send per strategy')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Messages per SMTP session (default: EMAIL_BATCH_SIZE)')
+        parser.add_argument(
+            '--backend', default='django.core.mail.backends.locmem.EmailBackend',
+            help='Email backend to benchmark against'
+        )
+
+    def handle(self, *args, **options):
+        total = options['messages']
+        CountingBackend.target = options['backend']
+        counting = f'{CountingBackend.__module__}.{CountingBackend.__name__}'
+        prefix = f"bench-email-{uuid.uuid4().hex[:8]}"
+
+        with transaction.atomic():
+            user = User.objects.create(username=prefix, email=f'{prefix}@example.com')
+            notifications = Notification.objects.bulk_create([
+                Notification(user=user, title=f'Benchmark {i}', body='Mensaje de prueba', channel='email')
+                for i in range(total)
+            ])
+            for notification in notifications:
+                notification.user = user
+
+            with override_settings(EMAIL_BACKEND=counting):
+                CountingBackend.sessions = 0
+                started = time.perf_counter()
+                for notification in notifications:
+                    _build_email(notification).send(fail_silently=False)
+                self._report('One connection per message', total, time.perf_counter() - started)
+
+                CountingBackend.sessions = 0
+                started = time.perf_counter()
+                results = send_email_batch(notifications, chunk_size=options['chunk_size'])
+                self._report('Batched connection reuse', total, time.perf_counter() - started)
+
+            failed = sum(1 for error in results.values() if error is not None)
+            self.stdout.write(f'Batched results: {len(results) - failed} sent, {failed} failed')
+            transaction.set_rollback(True)
+
+    def _report(self, label, total, elapsed):
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{label}: {elapsed:.3f}s ({rate:.1f} msg/s), {CountingBackend.sessions} sessions'
+        )
@@ -0,0 +1,79 @@
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from actividades.models import Activity, ActivityEnrollment
+from butifarra.actividades.views import ActivityViewSet
+
+
+class Command(BaseCommand):
+    help = 'Fire concurrent enroll requests at a seat-limited activity and check for overselling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300, help='Number of enroll requests (one user each)')
+        parser.add_argument('--seats', type=int, default=50, help='Capacity of the benchmark activity')
+        parser.add_argument('--workers', type=int, default=32, help='Concurrent worker threads')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark activity and users afterwards')
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        seats = options['seats']
+        workers = options['workers']
+        prefix = f"bench-enroll-{uuid.uuid4().hex[:8]}"
+
+        owner = User.objects.create(username=f"{prefix}-owner")
+        User.objects.bulk_create([User(username=f"{prefix}-{i}") for i in range(total)])
+        users = list(User.objects.filter(username__startswith=f"{prefix}-").exclude(pk=owner.pk))
+        start = timezone.now() + timedelta(days=1)
+        activity = Activity.objects.create(
+            title=f"Benchmark {prefix}",
+            category='OTRO',
+            start=start,
+            end=start + timedelta(hours=1),
+            capacity=seats,
+            available_spots=seats,
+            created_by=owner,
+        )
+
+        view = ActivityViewSet.as_view({'post': 'enroll'}, **ActivityViewSet.enroll.kwargs)
+        factory = APIRequestFactory()
+
+        def fire(user):
+            try:
+                request = factory.post(f'/api/actividades/{activity.pk}/enroll/')
+                force_authenticate(request, user=user)
+                return view(request, pk=activity.pk).status_code
+            except Exception as exc:
+                return type(exc).__name__
+            finally:
+                connection.close()
+
+        self.stdout.write(f'Firing {total} enroll requests at {seats} seats with {workers} workers...')
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = Counter(pool.map(fire, users))
+        elapsed = time.perf_counter() - started
+
+        activity.refresh_from_db(fields=['available_spots'])
+        enrolled = ActivityEnrollment.objects.filter(activity=activity).count()
+
+        self.stdout.write(f'Outcomes: {dict(outcomes)}')
+        self.stdout.write(f'Enrollments: {enrolled} / {seats} seats, available_spots={activity.available_spots}')
+        self.stdout.write(f'Elapsed: {elapsed:.3f}s ({total / elapsed if elapsed else 0:.1f} req/s)')
+
+        oversold = enrolled > seats or activity.available_spots != seats - enrolled
+        if not options['keep']:
+            activity.delete()
+            User.objects.filter(username__startswith=f"{prefix}-").delete()
+
+        if oversold:
+            raise CommandError('Overselling detected: enrollments and available_spots are inconsistent')
+        self.stdout.write(self.style.SUCCESS('No overselling detected'))
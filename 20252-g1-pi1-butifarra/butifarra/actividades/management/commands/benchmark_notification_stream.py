@@ -0,0 +1,62 @@
+import asyncio
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from butifarra.actividades.streaming import NotificationHub, event_stream
+
+
+class Command(BaseCommand):
+    help = 'Measure idle SSE notification streams per worker against the polling load they replace'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=1000, help='Concurrent idle streams to open')
+        parser.add_argument(
+            '--poll-every', type=float, default=30.0,
+            help='Seconds between unread-count polls of the client being replaced'
+        )
+
+    def handle(self, *args, **options):
+        total = options['connections']
+        poll_every = options['poll_every']
+        result = asyncio.run(self._run(total))
+
+        self.stdout.write(f"Idle streams: {total} ({result['kib_per_connection']:.1f} KiB each, {result['total_mib']:.1f} MiB total)")
+        self.stdout.write(f"Fan-out of one event per stream: {result['fanout_ms']:.1f} ms")
+        hub_interval = getattr(settings, 'NOTIFICATION_STREAM_POLL_INTERVAL', 2.0)
+        self.stdout.write(
+            f'Polling every {poll_every:g}s: {total / poll_every:.1f} req/s; '
+            f'streams: {1 / hub_interval:.1f} queries/s per worker'
+        )
+
+    async def _run(self, total):
+        # Private hub without the database poller: only the in-process fan-out is measured
+        hub = NotificationHub(poll=False)
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        streams = [event_stream(user_id, heartbeat=3600, hub=hub) for user_id in range(total)]
+        for stream in streams:
+            await stream.__anext__()  # retry frame; the stream is now subscribed
+        pending = [asyncio.ensure_future(stream.__anext__()) for stream in streams]
+        await asyncio.sleep(0)
+        used = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        hub.publish([
+            {'id': user_id + 1, 'user_id': user_id, 'title': 'Benchmark', 'body': '', 'priority': 'normal',
+             'activity': None, 'campaign': None, 'created_at': None}
+            for user_id in range(total)
+        ])
+        await asyncio.gather(*pending)
+        fanout = time.perf_counter() - started
+
+        for stream in streams:
+            await stream.aclose()
+        return {
+            'kib_per_connection': used / total / 1024 if total else 0,
+            'total_mib': used / 1024 / 1024,
+            'fanout_ms': fanout * 1000,
+        }
@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from butifarra.actividades.delivery import dispatch_batch_counts
+
+
+class Command(BaseCommand):
+    help = (
+        'Deliver pending notifications from the outbox. Runs until interrupted; '
+        'start several copies to scale out (batches are claimed with SKIP LOCKED).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Notifications claimed per transaction')
+        parser.add_argument('--sleep', type=float, default=5.0, help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the outbox and exit')
+        parser.add_argument(
+            '--rate', type=int, default=None,
+            help='Max notifications per minute for this worker (default: NOTIFICATION_DISPATCH_RATE_PER_MINUTE, 0 = unlimited)'
+        )
+
+    def handle(self, *args, **options):
+        rate = options['rate']
+        if rate is None:
+            rate = getattr(settings, 'NOTIFICATION_DISPATCH_RATE_PER_MINUTE', 0)
+        total = 0
+        try:
+            while True:
+                started = time.monotonic()
+                counts = dispatch_batch_counts(options['batch_size'])
+                processed = sum(counts.values())
+                total += processed
+                if processed:
+                    self.stdout.write(f'Dispatched {processed} notifications')
+                    if rate:
+                        # Spread large campaigns out so the SMTP provider's limits are not hit;
+                        # only rows handed to a channel count (not released in-app or deferred ones)
+                        attempted = counts['sent'] + counts['failed'] + counts['retried']
+                        pause = attempted * 60 / rate - (time.monotonic() - started)
+                        if pause > 0:
+                            time.sleep(pause)
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                # Long-running worker: drop connections the database may have closed while idle
+                close_old_connections()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Done: {total} notifications processed'))
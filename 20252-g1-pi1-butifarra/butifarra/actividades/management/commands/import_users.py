@@ -0,0 +1,39 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from butifarra.actividades.user_import import FORMATS, detect_format, import_users
+
+
+class Command(BaseCommand):
+    help = 'Bulk-create users (with profile and notification preferences) from a CSV or JSON-lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file; columns: username, email, phone_number, program, semester, role, password')
+        parser.add_argument('--format', choices=FORMATS, default=None, help='File format (default: from the extension)')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Users inserted per transaction (default: USER_IMPORT_CHUNK_SIZE)')
+        parser.add_argument('--workers', type=int, default=None, help='Password-hashing processes (default: USER_IMPORT_WORKERS, 0 = one per CPU)')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate and report')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+        if fmt is None:
+            raise CommandError('No se reconoce el formato; usa --format csv|jsonl')
+        workers = options['workers'] or getattr(settings, 'USER_IMPORT_WORKERS', 0) or os.cpu_count() or 1
+        try:
+            with open(options['path'], 'rb') as stream:
+                report = import_users(
+                    stream, fmt,
+                    chunk_size=options['chunk_size'], workers=workers, dry_run=options['dry_run'],
+                )
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for error in report['errors']:
+            details = '; '.join(f"{field}: {' '.join(messages)}" for field, messages in error['errors'].items())
+            self.stdout.write(f"Fila {error['row']}: {details}")
+        verb = 'would be created' if options['dry_run'] else 'created'
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {report['created']} users {verb}, {len(report['errors'])} rejected of {report['total']} rows"
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from actividades.models import Campaign
+
+
+class Command(BaseCommand):
+    help = 'Recompute campaign delivery and read counters from their notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', type=int, action='append', default=[], help='Only this campaign id. Can be repeated.')
+
+    def handle(self, *args, **options):
+        campaigns = Campaign.objects.all()
+        if options['campaign']:
+            campaigns = campaigns.filter(pk__in=options['campaign'])
+        campaigns = list(campaigns)
+        before = {c.pk: [getattr(c, f) for f in Campaign.COUNTER_FIELDS] for c in campaigns}
+        reconciled = Campaign.reconcile(campaigns)
+        drifted = sum(1 for c in reconciled if before[c.pk] != [getattr(c, f) for f in Campaign.COUNTER_FIELDS])
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {len(reconciled)} campaigns ({drifted} had drifted)'))
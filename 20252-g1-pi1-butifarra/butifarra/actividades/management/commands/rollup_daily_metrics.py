@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from actividades.models import Activity, ActivityEnrollment, DailyMetrics
+
+
+class Command(BaseCommand):
+    help = 'Recompute the DailyMetrics rollup behind the reports dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild every day from scratch')
+        parser.add_argument(
+            '--hours', type=int, default=24,
+            help='Recompute the days touched by rows created or updated in the last N hours (default: 24)'
+        )
+        parser.add_argument(
+            '--day', action='append', default=[],
+            help='Recompute this day (YYYY-MM-DD). Can be repeated.'
+        )
+
+    def handle(self, *args, **options):
+        if options['full']:
+            rows = DailyMetrics.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} daily metric rows'))
+            return
+
+        days = set()
+        for value in options['day']:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f'Invalid day: {value}')
+            days.add(day)
+
+        if not options['day']:
+            since = timezone.now() - timedelta(hours=options['hours'])
+            days.update(
+                Activity.objects.filter(updated_at__gte=since)
+                .annotate(day=TruncDate('start')).values_list('day', flat=True)
+            )
+            days.update(
+                ActivityEnrollment.objects.filter(enrolled_at__gte=since)
+                .annotate(day=TruncDate('activity__start')).values_list('day', flat=True)
+            )
+            days.update(
+                User.objects.filter(date_joined__gte=since)
+                .annotate(day=TruncDate('date_joined')).values_list('day', flat=True)
+            )
+
+        if not days:
+            self.stdout.write('Nothing to recompute')
+            return
+
+        rows = DailyMetrics.rebuild(days=days)
+        self.stdout.write(self.style.SUCCESS(f'Recomputed {len(days)} days ({rows} rows)'))
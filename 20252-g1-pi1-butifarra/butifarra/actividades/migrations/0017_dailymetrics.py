@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actividades', '0016_activitywaitlistentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(blank=True, default='', max_length=32)),
+                ('enrollments', models.IntegerField(default=0)),
+                ('attendees', models.IntegerField(default=0)),
+                ('new_users', models.IntegerField(default=0)),
+                ('capacity', models.IntegerField(default=0)),
+                ('actual_attendees', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('day', 'category')},
+            },
+        ),
+    ]
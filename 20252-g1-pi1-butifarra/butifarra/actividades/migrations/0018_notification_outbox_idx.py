@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actividades', '0017_dailymetrics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'scheduled'])), fields=['channel', 'created_at'], name='notification_outbox_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actividades', '0018_notification_outbox_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='app_read',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='emails_failed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='emails_read',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actividades', '0020_archived_notification'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificationdeliverylog',
+            name='status',
+            field=models.CharField(choices=[('success', 'Success'), ('retry', 'Retry'), ('error', 'Error')], max_length=16),
+        ),
+    ]
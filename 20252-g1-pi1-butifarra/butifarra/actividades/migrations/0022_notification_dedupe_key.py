@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actividades', '0021_delivery_log_retry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='dedupe_key',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='notification',
+            unique_together={('user', 'channel', 'dedupe_key')},
+        ),
+    ]
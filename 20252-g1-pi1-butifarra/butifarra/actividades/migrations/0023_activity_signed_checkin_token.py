@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actividades', '0022_notification_dedupe_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activity',
+            name='checkin_token',
+            field=models.CharField(blank=True, max_length=128, null=True),
+        ),
+    ]
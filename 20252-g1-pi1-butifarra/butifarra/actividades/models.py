@@ -1,12 +1,19 @@
-from django.db import models, transaction
+import hashlib
+import json
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Q, Sum
+from django.db.models.functions import TruncDate
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
-from django.conf import settings
-from django.core.mail import EmailMessage
+
+from .caching import bump_reports_version, incr_unread_counts, invalidate_session_payload, reset_unread_count
 
 
 class UserProfile(models.Model):
@@ -50,24 +57,6 @@ class UserProfile(models.Model):
         return self.role == "PROFESSOR"
 
 
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    """
-    Automatically create a UserProfile when a new User is created
-    """
-    if created:
-        UserProfile.objects.create(user=instance)
-
-
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """
-    Save the UserProfile when the User is saved
-    """
-    if hasattr(instance, "profile"):
-        instance.profile.save()
-
-
 class Activity(models.Model):
     # Choices for category field
     CATEGORY_CHOICES = [
@@ -116,9 +105,17 @@ class Activity(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     actual_attendees = models.PositiveIntegerField(default=0)  # Conteo real de asistentes
     notes = models.TextField(blank=True)  # Notas / reporte del profesor
-    checkin_token = models.CharField(max_length=64, null=True, blank=True, unique=True)
+    checkin_token = models.CharField(max_length=128, null=True, blank=True)  # Último token firmado, para mostrar su QR
     checkin_expires_at = models.DateTimeField(null=True, blank=True)
 
+    # Changes to these fields notify enrolled users
+    NOTIFY_FIELDS = ("start", "location", "status")
+    # Stored values kept on load: the notified fields plus what the metrics rollup needs
+    SNAPSHOT_FIELDS = NOTIFY_FIELDS + ("category", "capacity", "actual_attendees")
+    # Seat/attendance counters; saving only these runs the counter checks, not the full clean()
+    COUNTER_FIELDS = frozenset({"available_spots", "actual_attendees"})
+    VALIDATED_FIELDS = frozenset({"start", "end", "capacity", "assigned_professor", "instructor"}) | COUNTER_FIELDS
+
     class Meta:
         indexes = [
             models.Index(fields=["start"]),
@@ -126,14 +123,49 @@ class Activity(models.Model):
             models.Index(fields=["status"]),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values so save() can diff them without reading the row again
+        instance._snapshot = instance._take_snapshot()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._snapshot = {**getattr(self, "_snapshot", {}), **self._take_snapshot(fields)}
+
+    def _take_snapshot(self, fields=None):
+        """Loaded values of the snapshot fields (limited to ``fields`` when given)."""
+        return {
+            field: self.__dict__[field]
+            for field in self.SNAPSHOT_FIELDS
+            if field in self.__dict__ and (fields is None or field in fields)
+        }
+
+    def _previous_state(self):
+        """The stored version of this activity, from the load snapshot when complete."""
+        snapshot = getattr(self, "_snapshot", {})
+        if len(snapshot) == len(self.SNAPSHOT_FIELDS):
+            return type(self)(pk=self.pk, **snapshot)
+        try:
+            return type(self).objects.get(pk=self.pk)
+        except type(self).DoesNotExist:
+            return None
+
+    def _clean_counters(self):
+        # Validate available_spots is consistent with capacity
+        if self.available_spots > self.capacity:
+            raise ValidationError({"available_spots": "Available spots cannot exceed capacity"})
+
+        if self.actual_attendees and self.capacity and self.actual_attendees > self.capacity:
+            raise ValidationError({"actual_attendees": "Actual attendees cannot exceed capacity"})
+
     def clean(self):
         # Validate end time is after start time
         if self.end and self.start and self.end <= self.start:
             raise ValidationError({"end": "End time must be after start time"})
 
-        # Validate available_spots is consistent with capacity
-        if self.available_spots > self.capacity:
-            raise ValidationError({"available_spots": "Available spots cannot exceed capacity"})
+        self._clean_counters()
 
         # Si hay profesor asignado, garantizar que su perfil sea PROFESOR
         if self.assigned_professor:
@@ -145,30 +177,34 @@ class Activity(models.Model):
         if self.assigned_professor and not self.instructor:
             self.instructor = self.assigned_professor.get_full_name() or self.assigned_professor.username
 
-        if self.actual_attendees and self.capacity and self.actual_attendees > self.capacity:
-            raise ValidationError({"actual_attendees": "Actual attendees cannot exceed capacity"})
-
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        update_fields = None if update_fields is None else set(update_fields)
+
         # Set initial available spots to match capacity if not specified
-        if self.capacity and not self.available_spots:
+        if (update_fields is None or "capacity" in update_fields) and self.capacity and not self.available_spots:
             self.available_spots = self.capacity
 
-        # Detect changes in critical fields to trigger notifications
+        # Detect changes in critical fields to trigger notifications; partial
+        # saves that leave the snapshot fields alone skip it altogether
         changes = {}
-        if self.pk:
-            try:
-                prev = type(self).objects.get(pk=self.pk)
-                if prev.start != self.start:
-                    changes['start'] = {'old': prev.start, 'new': self.start}
-                if prev.location != self.location:
-                    changes['location'] = {'old': prev.location, 'new': self.location}
-                if prev.status != self.status:
-                    changes['status'] = {'old': prev.status, 'new': self.status}
-            except type(self).DoesNotExist:
-                changes = {}
-
-        self.clean()
+        prev = None
+        tracked = update_fields is None or not update_fields.isdisjoint(self.SNAPSHOT_FIELDS)
+        if tracked and self.pk:
+            prev = self._previous_state()
+            for field in self.NOTIFY_FIELDS:
+                if prev is not None and (update_fields is None or field in update_fields):
+                    if getattr(prev, field) != getattr(self, field):
+                        changes[field] = {'old': getattr(prev, field), 'new': getattr(self, field)}
+
+        if update_fields is None or not update_fields.isdisjoint(self.VALIDATED_FIELDS - self.COUNTER_FIELDS):
+            self.clean()
+        elif not update_fields.isdisjoint(self.COUNTER_FIELDS):
+            self._clean_counters()
         super().save(*args, **kwargs)
+        self._snapshot = {**getattr(self, "_snapshot", {}), **self._take_snapshot(update_fields)}
+        if tracked:
+            DailyMetrics.track_activity(prev, self)
 
         # Enqueue notifications after saving successfully
         if changes:
@@ -318,6 +354,11 @@ class TournamentEnrollment(models.Model):
 
 
 class ActivityEnrollment(models.Model):
+    RESULT_ENROLLED = "enrolled"
+    RESULT_ALREADY_ENROLLED = "already_enrolled"
+    RESULT_FULL = "full"
+    RESULT_WAITLISTED = "waitlisted"
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="activity_enrollments")
     activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name="enrollments")
     enrolled_at = models.DateTimeField(auto_now_add=True)
@@ -332,6 +373,361 @@ class ActivityEnrollment(models.Model):
     def __str__(self):
         return f"{self.user.username} -> {self.activity.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored flag so attendance flips can be rolled up
+        instance._loaded_attended = instance.__dict__.get("attended")
+        return instance
+
+    @classmethod
+    def enroll(cls, user, activity, waitlist=True):
+        """
+        Claim a seat and create the enrollment in one transaction.
+
+        The capacity check and decrement are a single conditional UPDATE, so
+        concurrent requests can never oversell and no row is read back into
+        Python. That fast path only applies while nobody is waiting; otherwise
+        free seats go to the head of the waitlist first, under the activity
+        lock. When the activity is full the user joins its waitlist instead
+        (unless ``waitlist`` is False). Returns ``(result, obj)`` where ``obj``
+        is the enrollment or the waitlist entry.
+        """
+        try:
+            with transaction.atomic():
+                claimed = Activity.objects.filter(
+                    ~Exists(ActivityWaitlistEntry.objects.filter(activity=OuterRef("pk"))),
+                    pk=activity.pk,
+                    available_spots__gt=0,
+                ).update(available_spots=F("available_spots") - 1)
+                if claimed:
+                    return cls.RESULT_ENROLLED, cls.objects.create(user=user, activity=activity)
+        except IntegrityError:
+            # Duplicate enrollment: the rollback also gives the seat back
+            return cls.RESULT_ALREADY_ENROLLED, None
+
+        if not waitlist:
+            return cls.RESULT_FULL, None
+
+        with transaction.atomic():
+            _lock_activity(activity.pk)
+            if cls.objects.filter(user=user, activity=activity).exists():
+                return cls.RESULT_ALREADY_ENROLLED, None
+            # Seats freed while we waited for the lock, or outside unenroll (check-in
+            # recounts), are handed to the users already in line before this one
+            spots = Activity.objects.filter(pk=activity.pk).values_list("available_spots", flat=True).first() or 0
+            if spots:
+                promoted = ActivityWaitlistEntry.promote(activity, seats=spots)
+                if promoted:
+                    Activity.objects.filter(pk=activity.pk).update(
+                        available_spots=F("available_spots") - len(promoted)
+                    )
+                    spots -= len(promoted)
+                if user.pk in promoted:
+                    return cls.RESULT_ENROLLED, cls.objects.get(user=user, activity=activity)
+            if spots:
+                Activity.objects.filter(pk=activity.pk).update(available_spots=F("available_spots") - 1)
+                return cls.RESULT_ENROLLED, cls.objects.create(user=user, activity=activity)
+            return cls.RESULT_WAITLISTED, ActivityWaitlistEntry.join(user, activity)
+
+    @classmethod
+    def unenroll(cls, user, activity):
+        """
+        Delete the enrollment and hand its seat to the head of the waitlist,
+        or return it to ``available_spots`` when nobody is waiting.
+        Returns False if there was no enrollment.
+        """
+        with transaction.atomic():
+            _lock_activity(activity.pk)
+            deleted, _ = cls.objects.filter(user=user, activity=activity).delete()
+            if not deleted:
+                return False
+            promoted = ActivityWaitlistEntry.promote(activity, seats=1)
+            if not promoted:
+                Activity.objects.filter(
+                    pk=activity.pk, available_spots__lt=F("capacity")
+                ).update(available_spots=F("available_spots") + 1)
+        return True
+
+
+class ActivityWaitlistEntry(models.Model):
+    """
+    FIFO waitlist for full activities.
+
+    ``position`` is kept dense (1..n) so a student's place in line is a single
+    indexed read; the rare writes (leave/promote) shift the tail with one UPDATE.
+    All writes run under the activity row lock.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="activity_waitlist_entries")
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name="waitlist_entries")
+    position = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("user", "activity")
+        indexes = [
+            models.Index(fields=["activity", "position"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} -> {self.activity.title} (#{self.position})"
+
+    @classmethod
+    def join(cls, user, activity):
+        """Append the user to the waitlist (idempotent). Caller holds the activity lock."""
+        existing = cls.objects.filter(user=user, activity=activity).first()
+        if existing:
+            return existing
+        last = cls.objects.filter(activity=activity).aggregate(last=Max("position"))["last"] or 0
+        return cls.objects.create(user=user, activity=activity, position=last + 1)
+
+    @classmethod
+    def leave(cls, user, activity):
+        """Remove the user from the waitlist. Returns False if they were not on it."""
+        with transaction.atomic():
+            _lock_activity(activity.pk)
+            return cls._remove(user.pk, activity)
+
+    @classmethod
+    def _remove(cls, user_id, activity):
+        """Delete one entry and close the gap behind it. Caller holds the activity lock."""
+        entry = cls.objects.filter(user_id=user_id, activity=activity).first()
+        if entry is None:
+            return False
+        entry.delete()
+        cls.objects.filter(activity=activity, position__gt=entry.position).update(
+            position=F("position") - 1
+        )
+        return True
+
+    @classmethod
+    def promote(cls, activity, seats):
+        """
+        Enroll up to ``seats`` users from the head of the waitlist. Must run
+        inside a transaction holding the activity lock. The promoted users are
+        notified in one batch once the transaction commits.
+        """
+        # Users enrolled some other way (e.g. at check-in) only leave the line
+        enrolled = ActivityEnrollment.objects.filter(activity=activity, user_id=OuterRef("user_id"))
+        for user_id in cls.objects.filter(Exists(enrolled), activity=activity).values_list("user_id", flat=True):
+            cls._remove(user_id, activity)
+
+        entries = list(
+            cls.objects.filter(activity=activity).order_by("position")[:seats]
+        )
+        if not entries:
+            return []
+
+        ActivityEnrollment.objects.bulk_create(
+            [ActivityEnrollment(user_id=e.user_id, activity=activity) for e in entries]
+        )
+        DailyMetrics.bump_activity(activity, enrollments=len(entries))
+        transaction.on_commit(bump_reports_version)
+        cls.objects.filter(pk__in=[e.pk for e in entries]).delete()
+        cls.objects.filter(activity=activity).update(position=F("position") - len(entries))
+
+        user_ids = [e.user_id for e in entries]
+        transaction.on_commit(lambda: notify_waitlist_promotions(activity, user_ids))
+        return user_ids
+
+
+def _lock_activity(activity_id):
+    """Take the row lock that serializes waitlist changes for one activity."""
+    list(Activity.objects.select_for_update().filter(pk=activity_id).values_list("pk", flat=True))
+
+
+# ======================
+# Reporting rollup
+# ======================
+class DailyMetrics(models.Model):
+    """
+    Per day x category counters behind the reports dashboard series.
+
+    Days are local dates of ``Activity.start`` (``User.date_joined`` for
+    ``new_users``, stored under the blank category). Rows are kept current
+    with single-statement deltas on enrollment, check-in and signup events;
+    ``rollup_daily_metrics`` recomputes them from the source tables.
+    """
+    USERS_CATEGORY = ""
+
+    day = models.DateField()
+    category = models.CharField(max_length=32, blank=True, default=USERS_CATEGORY)
+    enrollments = models.IntegerField(default=0)
+    attendees = models.IntegerField(default=0)
+    new_users = models.IntegerField(default=0)
+    # Totals over activities with capacity > 0, as in capacity_vs_attendance
+    capacity = models.IntegerField(default=0)
+    actual_attendees = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("day", "category")
+
+    def __str__(self):
+        return f"DailyMetrics({self.day}, {self.category or 'usuarios'})"
+
+    @classmethod
+    def bump(cls, day, category, **deltas):
+        """Add ``deltas`` to one row with an UPDATE, creating the row on first use."""
+        deltas = {field: value for field, value in deltas.items() if value}
+        if not deltas:
+            return
+        changes = {field: F(field) + value for field, value in deltas.items()}
+        changes["updated_at"] = timezone.now()
+        rows = cls.objects.filter(day=day, category=category)
+        if rows.update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(day=day, category=category, **deltas)
+        except IntegrityError:
+            # Someone else created the row first
+            rows.update(**changes)
+
+    @classmethod
+    def bump_activity(cls, activity, **deltas):
+        if any(deltas.values()):
+            cls.bump(*_metrics_key(activity), **deltas)
+
+    @classmethod
+    def track_activity(cls, previous, activity):
+        """Roll up a saved activity given its state before the save (None on create)."""
+        key = _metrics_key(activity)
+        capacity, attendees = _capacity_totals(activity)
+        old_capacity, old_attendees = _capacity_totals(previous) if previous is not None else (0, 0)
+        if previous is None or _metrics_key(previous) == key:
+            cls.bump(*key, capacity=capacity - old_capacity, actual_attendees=attendees - old_attendees)
+            return
+        # Enrollments move with the activity: take them off the old key and
+        # add them to the new one, so concurrent deltas are never overwritten
+        moved = ActivityEnrollment.objects.filter(activity=activity).aggregate(
+            enrollments=Count("id"), attendees=Count("id", filter=Q(attended=True))
+        )
+        cls.bump(
+            *_metrics_key(previous),
+            enrollments=-moved["enrollments"],
+            attendees=-moved["attendees"],
+            capacity=-old_capacity,
+            actual_attendees=-old_attendees,
+        )
+        cls.bump(*key, capacity=capacity, actual_attendees=attendees, **moved)
+
+    @classmethod
+    def rebuild(cls, days=None):
+        """
+        Recompute the rows of ``days`` (every day when None) from the source
+        tables. The existing rows are locked first, so deltas bumped meanwhile
+        wait for the new rows instead of landing on the ones being replaced.
+        """
+        with transaction.atomic():
+            return cls._rebuild(days)
+
+    @classmethod
+    def _rebuild(cls, days):
+        enrollments = ActivityEnrollment.objects.all()
+        activities = Activity.objects.filter(capacity__gt=0)
+        users = User.objects.all()
+        rows = cls.objects.all()
+        if days is not None:
+            days = list(days)
+            enrollments = enrollments.filter(activity__start__date__in=days)
+            activities = activities.filter(start__date__in=days)
+            users = users.filter(date_joined__date__in=days)
+            rows = rows.filter(day__in=days)
+        list(rows.select_for_update().values_list("pk", flat=True))
+
+        buckets = defaultdict(dict)
+        for item in (
+            enrollments.annotate(day=TruncDate("activity__start"))
+            .values("day", "activity__category")
+            .annotate(total=Count("id"), attended_total=Count("id", filter=Q(attended=True)))
+        ):
+            buckets[(item["day"], item["activity__category"])].update(
+                enrollments=item["total"], attendees=item["attended_total"]
+            )
+        for item in (
+            activities.annotate(day=TruncDate("start"))
+            .values("day", "category")
+            .annotate(total_capacity=Sum("capacity"), total_attendees=Sum("actual_attendees"))
+        ):
+            buckets[(item["day"], item["category"])].update(
+                capacity=item["total_capacity"] or 0, actual_attendees=item["total_attendees"] or 0
+            )
+        for item in (
+            users.annotate(day=TruncDate("date_joined")).values("day").annotate(total=Count("id"))
+        ):
+            buckets[(item["day"], cls.USERS_CATEGORY)]["new_users"] = item["total"]
+
+        rows.delete()
+        cls.objects.bulk_create(
+            [cls(day=day, category=category, **values) for (day, category), values in buckets.items()],
+            batch_size=1000,
+        )
+        return len(buckets)
+
+
+def _metrics_day(value):
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def _metrics_key(activity):
+    return _metrics_day(activity.start), activity.category
+
+
+def _capacity_totals(activity):
+    if not activity.capacity or activity.capacity <= 0:
+        return 0, 0
+    return activity.capacity, activity.actual_attendees or 0
+
+
+@receiver(post_save, sender=ActivityEnrollment)
+def track_enrollment_metrics(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    was_attended = False if created else getattr(instance, "_loaded_attended", instance.attended)
+    instance._loaded_attended = instance.attended
+    DailyMetrics.bump_activity(
+        instance.activity,
+        enrollments=int(created),
+        attendees=int(instance.attended) - int(bool(was_attended)),
+    )
+
+
+@receiver(post_delete, sender=ActivityEnrollment)
+def untrack_enrollment_metrics(sender, instance, **kwargs):
+    try:
+        activity = instance.activity
+    except Activity.DoesNotExist:
+        return
+    DailyMetrics.bump_activity(activity, enrollments=-1, attendees=-int(instance.attended))
+
+
+@receiver(post_delete, sender=Activity)
+def untrack_activity_metrics(sender, instance, **kwargs):
+    capacity, attendees = _capacity_totals(instance)
+    DailyMetrics.bump(*_metrics_key(instance), capacity=-capacity, actual_attendees=-attendees)
+
+
+@receiver(post_delete, sender=User)
+def untrack_signup_metrics(sender, instance, **kwargs):
+    if instance.date_joined:
+        DailyMetrics.bump(_metrics_day(instance.date_joined), DailyMetrics.USERS_CATEGORY, new_users=-1)
+    transaction.on_commit(bump_reports_version)
+
+
+@receiver([post_save, post_delete], sender=Activity)
+@receiver([post_save, post_delete], sender=ActivityEnrollment)
+def invalidate_reports_cache(sender, **kwargs):
+    # After commit, so a concurrent request cannot cache pre-commit data under the new version
+    transaction.on_commit(bump_reports_version)
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_session_payload_on_change(sender, instance, **kwargs):
+    user_id = instance.user_id if sender is UserProfile else instance.pk
+    transaction.on_commit(lambda: invalidate_session_payload(user_id))
+
 
 # ======================
 # Notifications module
@@ -349,11 +745,65 @@ class NotificationPreference(models.Model):
     def __str__(self):
         return f"Prefs({self.user.username})"
 
+    def quiet_until(self, moment):
+        """End of the quiet-hours window ``moment`` falls in (local time), or None outside it."""
+        start, end = self.quiet_hours_start, self.quiet_hours_end
+        if start is None or end is None or start == end:
+            return None
+        local = timezone.localtime(moment)
+        now = local.time()
+        if start < end:
+            quiet = start <= now < end
+        else:
+            # Window crosses midnight, e.g. 22:00-07:00
+            quiet = now >= start or now < end
+        if not quiet:
+            return None
+        until = local.replace(hour=end.hour, minute=end.minute, second=end.second, microsecond=0)
+        if until <= local:
+            until += timezone.timedelta(days=1)
+        return until
+
 
 @receiver(post_save, sender=User)
-def ensure_notification_prefs(sender, instance, created, **kwargs):
-    if created:
+def setup_new_user(sender, instance, created, raw=False, **kwargs):
+    """
+    Create the UserProfile and NotificationPreference of a new user and
+    count the signup. Later saves of the user (e.g. ``last_login`` on every
+    login) do nothing here.
+    """
+    if not created:
+        return
+    with transaction.atomic():
+        UserProfile.objects.create(user=instance)
         NotificationPreference.objects.create(user=instance)
+        if not raw and instance.date_joined:
+            DailyMetrics.bump(_metrics_day(instance.date_joined), DailyMetrics.USERS_CATEGORY, new_users=1)
+    transaction.on_commit(bump_reports_version)
+
+
+def bulk_create_users(users, profiles=None, batch_size=None):
+    """
+    Insert ``users`` (unsaved User instances) with their UserProfile and
+    NotificationPreference rows using ``bulk_create``; ``post_save`` does not
+    run. ``profiles`` optionally holds one dict of UserProfile fields per
+    user. Signup metrics and the reports cache are updated once for the
+    whole batch. Returns the created users.
+    """
+    profiles = profiles or [{}] * len(users)
+    with transaction.atomic():
+        created = User.objects.bulk_create(users, batch_size=batch_size)
+        UserProfile.objects.bulk_create(
+            [UserProfile(user=user, **fields) for user, fields in zip(created, profiles)], batch_size=batch_size
+        )
+        NotificationPreference.objects.bulk_create(
+            [NotificationPreference(user=user) for user in created], batch_size=batch_size
+        )
+        signups = Counter(_metrics_day(user.date_joined) for user in created if user.date_joined)
+        for day, count in signups.items():
+            DailyMetrics.bump(day, DailyMetrics.USERS_CATEGORY, new_users=count)
+    transaction.on_commit(bump_reports_version)
+    return created
 
 
 class Campaign(models.Model):
@@ -377,9 +827,13 @@ class Campaign(models.Model):
     selected_user_ids = models.JSONField(null=True, blank=True, default=list)
     schedule_at = models.DateTimeField(null=True, blank=True)
 
+    # Counters kept current as notifications change state; reconcile() recomputes them
     total_recipients = models.PositiveIntegerField(default=0)
     app_sent = models.PositiveIntegerField(default=0)
     emails_sent = models.PositiveIntegerField(default=0)
+    emails_failed = models.PositiveIntegerField(default=0)
+    app_read = models.PositiveIntegerField(default=0)
+    emails_read = models.PositiveIntegerField(default=0)
 
     created_by = models.ForeignKey(User, on_delete=models.PROTECT, related_name="campaigns_created")
     created_at = models.DateTimeField(auto_now_add=True)
@@ -387,15 +841,77 @@ class Campaign(models.Model):
     def __str__(self):
         return f"Campaign({self.name})"
 
+    # (event, channel) -> counter field
+    COUNTERS = {
+        ('delivered', 'app'): 'app_sent',
+        ('delivered', 'email'): 'emails_sent',
+        ('failed', 'email'): 'emails_failed',
+        ('read', 'app'): 'app_read',
+        ('read', 'email'): 'emails_read',
+    }
+    COUNTER_FIELDS = ['total_recipients', 'app_sent', 'emails_sent', 'emails_failed', 'app_read', 'emails_read']
+
+    @classmethod
+    def record(cls, event, counts):
+        """
+        Add ``counts`` ({(campaign_id, channel): n}) of notifications that just
+        went through ``event`` ('delivered', 'failed' or 'read'); one UPDATE per campaign.
+        """
+        changes = defaultdict(Counter)
+        for (campaign_id, channel), n in counts.items():
+            field = cls.COUNTERS.get((event, channel))
+            if campaign_id and field and n:
+                changes[campaign_id][field] += n
+        for campaign_id, deltas in changes.items():
+            cls.objects.filter(pk=campaign_id).update(**{f: F(f) + n for f, n in deltas.items()})
+
+    @classmethod
+    def record_notifications(cls, event, notifications):
+        cls.record(event, Counter((n.campaign_id, n.channel) for n in notifications if n.campaign_id))
+
+    @classmethod
+    def reconcile(cls, queryset=None):
+        """
+        Recompute the counters of ``queryset`` (all campaigns) from one grouped
+        aggregate over live notifications and one over archived ones.
+        """
+        campaigns = list(queryset if queryset is not None else cls.objects.all())
+        campaign_ids = [c.pk for c in campaigns]
+        totals = defaultdict(Counter)
+        live = Notification.objects.filter(campaign__in=campaign_ids)
+        # Recipients with rows in both tables are counted on the live side only
+        archived = ArchivedNotification.objects.filter(campaign__in=campaign_ids)
+        archived_only = ~Exists(
+            Notification.objects.filter(campaign=OuterRef('campaign'), user=OuterRef('user'))
+        )
+        for rows, recipients in ((live, Q()), (archived, Q(archived_only))):
+            delivered_email = Q(channel='email', sent_at__isnull=False)
+            for row in rows.values('campaign').annotate(
+                total_recipients=Count('user', distinct=True, filter=recipients),
+                app_sent=Count('id', filter=Q(channel='app', status__in=['sent', 'read'])),
+                emails_sent=Count('id', filter=delivered_email),
+                emails_failed=Count('id', filter=Q(channel='email', status='failed')),
+                app_read=Count('id', filter=Q(channel='app', status='read')),
+                emails_read=Count('id', filter=delivered_email & Q(status='read')),
+            ):
+                totals[row.pop('campaign')].update(row)
+        for campaign in campaigns:
+            row = totals.get(campaign.pk, {})
+            for field in cls.COUNTER_FIELDS:
+                setattr(campaign, field, row.get(field, 0))
+        cls.objects.bulk_update(campaigns, cls.COUNTER_FIELDS, batch_size=500)
+        return campaigns
+
     def update_metrics(self):
-        from django.db.models import Count
-        app_count = Notification.objects.filter(campaign=self, channel='app').count()
-        email_count = Notification.objects.filter(campaign=self, channel='email', status='sent').count()
-        total = Notification.objects.filter(campaign=self).values('user').distinct().count()
-        self.app_sent = app_count
-        self.emails_sent = email_count
-        self.total_recipients = total
-        self.save(update_fields=['app_sent', 'emails_sent', 'total_recipients'])
+        """Recompute this campaign's counters from its notifications."""
+        Campaign.reconcile([self])
+
+    def read_rates(self):
+        """Share of delivered notifications that were read, per channel."""
+        return {
+            'app': round(self.app_read / self.app_sent, 4) if self.app_sent else None,
+            'email': round(self.emails_read / self.emails_sent, 4) if self.emails_sent else None,
+        }
 
 
 class Notification(models.Model):
@@ -433,15 +949,24 @@ class Notification(models.Model):
     read_at = models.DateTimeField(null=True, blank=True)
 
     metadata = models.JSONField(default=dict, blank=True)
+    # Identifies the event behind the notification; the same event reaches a user once per channel
+    dedupe_key = models.CharField(max_length=40, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)  # añadido para coincidir con la tabla
 
     class Meta:
+        unique_together = ("user", "channel", "dedupe_key")
         indexes = [
             models.Index(fields=["user", "status"]),
             models.Index(fields=["scheduled_for"]),
             models.Index(fields=["activity", "channel"]),
             models.Index(fields=["campaign"]),
+            # Outbox scan used by dispatch_notifications
+            models.Index(
+                fields=["channel", "created_at"],
+                condition=Q(status__in=["pending", "scheduled"]),
+                name="notification_outbox_idx",
+            ),
         ]
 
     def mark_sent(self):
@@ -450,9 +975,12 @@ class Notification(models.Model):
         self.save(update_fields=['status', 'sent_at', 'updated_at'])
 
     def mark_read(self):
+        delivered = self.status == 'sent'
         self.status = 'read'
         self.read_at = timezone.now()
         self.save(update_fields=['status', 'read_at', 'updated_at'])
+        if delivered and self.campaign_id:
+            Campaign.record_notifications('read', [self])
 
     def __str__(self):
         return f"Notif({self.channel}) to {self.user_id}: {self.title[:20]}"
@@ -461,7 +989,7 @@ class Notification(models.Model):
 class NotificationDeliveryLog(models.Model):
     notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='delivery_logs')
     channel = models.CharField(max_length=16, choices=Notification.CHANNEL_CHOICES)
-    status = models.CharField(max_length=16, choices=[('success','Success'), ('error','Error')])
+    status = models.CharField(max_length=16, choices=[('success','Success'), ('retry','Retry'), ('error','Error')])
     detail = models.TextField(blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -469,6 +997,99 @@ class NotificationDeliveryLog(models.Model):
         return f"Log({self.channel},{self.status}) for {self.notification_id}"
 
 
+class ArchivedNotification(models.Model):
+    """
+    Old read/sent notification moved out of the live table by the
+    ``archive_notifications`` command. Keeps the original id; its delivery
+    logs are folded into ``delivery_logs``.
+    """
+    ARCHIVABLE_STATUSES = ('sent', 'read')
+    COPIED_FIELDS = (
+        'id', 'user_id', 'activity_id', 'campaign_id', 'title', 'body', 'channel', 'status', 'priority',
+        'scheduled_for', 'sent_at', 'read_at', 'metadata', 'created_at', 'updated_at',
+    )
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_notifications")
+    activity = models.ForeignKey(Activity, on_delete=models.SET_NULL, null=True, blank=True, related_name="archived_notifications")
+    campaign = models.ForeignKey(Campaign, on_delete=models.SET_NULL, null=True, blank=True, related_name="archived_notifications")
+
+    title = models.CharField(max_length=200)
+    body = models.TextField()
+    channel = models.CharField(max_length=10, choices=Notification.CHANNEL_CHOICES)
+    status = models.CharField(max_length=12, choices=Notification.STATUS_CHOICES)
+    priority = models.CharField(max_length=8, choices=Notification.PRIORITY_CHOICES, default="normal")
+
+    scheduled_for = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    metadata = models.JSONField(default=dict, blank=True)
+    delivery_logs = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at"]),
+            models.Index(fields=["campaign"]),
+        ]
+
+    def __str__(self):
+        return f"Archived({self.user_id},{self.channel},{self.status})"
+
+    @classmethod
+    def from_notification(cls, notification):
+        archived = cls(**{field: getattr(notification, field) for field in cls.COPIED_FIELDS})
+        archived.delivery_logs = [
+            {
+                'id': log.id,
+                'channel': log.channel,
+                'status': log.status,
+                'detail': log.detail,
+                'created_at': log.created_at.isoformat(),
+            }
+            for log in notification.delivery_logs.all()
+        ]
+        return archived
+
+    @classmethod
+    def archive_batch(cls, before, batch_size=1000):
+        """
+        Move up to ``batch_size`` read/sent notifications created before
+        ``before`` (and their delivery logs) into the archive in one
+        transaction. Returns how many were moved. Raises IntegrityError, and
+        moves nothing, if one of them already has an archived copy.
+        """
+        with transaction.atomic():
+            batch = list(
+                Notification.objects.filter(status__in=cls.ARCHIVABLE_STATUSES, created_at__lt=before)
+                .select_for_update(skip_locked=True)
+                .order_by('id')
+                .prefetch_related('delivery_logs')[:batch_size]
+            )
+            if not batch:
+                return 0
+            ids = [n.pk for n in batch]
+            conflicts = sorted(cls.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            if conflicts:
+                # Deleting these would lose whichever copy is not the archived one
+                raise IntegrityError(f"Notifications already archived with the same id: {conflicts}")
+            cls.objects.bulk_create([cls.from_notification(n) for n in batch])
+            Notification.objects.filter(pk__in=ids).delete()
+
+            # Unread in-app rows may have left: recount those users' badges
+            users = {n.user_id for n in batch if n.channel == 'app' and n.status == 'sent'}
+            if users:
+                def _recount():
+                    for user_id in users:
+                        reset_unread_count(user_id)
+
+                transaction.on_commit(_recount)
+        return len(batch)
+
+
 # Helper functions (placed at end to avoid circular imports)
 
 def _activity_change_message(activity: Activity, changes: dict):
@@ -478,23 +1099,45 @@ def _activity_change_message(activity: Activity, changes: dict):
     return title, body
 
 
-def _should_create_similar(user: User, activity: Activity, title: str, window_minutes: int = 10) -> bool:
-    since = timezone.now() - timezone.timedelta(minutes=window_minutes)
-    return not Notification.objects.filter(
-        user=user,
-        activity=activity,
-        title=title,
-        created_at__gte=since,
-    ).exists()
+def _activity_change_key(activity: Activity, changes: dict, now=None):
+    """
+    Dedupe key for an activity change: the same change set on the same
+    activity within one ``NOTIFICATION_DEDUPE_WINDOW_MINUTES`` bucket maps
+    to the same key.
+    """
+    window = getattr(settings, 'NOTIFICATION_DEDUPE_WINDOW_MINUTES', 10) * 60
+    bucket = int((now or timezone.now()).timestamp() // window)
+    change_set = json.dumps(changes, sort_keys=True, default=str)
+    return hashlib.sha1(f"activity:{activity.pk}:{change_set}:{bucket}".encode("utf-8")).hexdigest()
 
 
-def _eligible_channels(user: User):
-    # Use a safe lookup to avoid RelatedObjectDoesNotExist when prefs missing
-    try:
-        from .models import NotificationPreference  # local import avoids circular on app loading
-        prefs = NotificationPreference.objects.filter(user_id=user.id).first()
-    except Exception:
-        prefs = None
+def track_unread_notifications(notifications):
+    """
+    Once committed, add freshly inserted in-app notifications to the cached
+    unread counters and push them to this process's notification streams.
+    """
+    unread = [n for n in notifications if n.channel == 'app' and n.status == 'sent']
+    if not unread:
+        return
+
+    def _on_commit():
+        from .streaming import publish_new_notifications  # local import avoids circular on app loading
+
+        incr_unread_counts(Counter(n.user_id for n in unread))
+        publish_new_notifications(unread)
+
+    transaction.on_commit(_on_commit)
+
+
+def _prefs_by_user(user_ids):
+    """NotificationPreference rows for ``user_ids`` keyed by user id (one query)."""
+    return {
+        prefs.user_id: prefs
+        for prefs in NotificationPreference.objects.filter(user_id__in=user_ids)
+    }
+
+
+def _channels_from_prefs(prefs):
     if not prefs:
         # default behavior if no prefs stored yet
         return {'app', 'email'}
@@ -503,12 +1146,47 @@ def _eligible_channels(user: User):
         channels.add('app')
     if prefs.email_enabled:
         channels.add('email')
-    # Extensions (push/sms) could be added here based on prefs
+    if prefs.push_enabled:
+        channels.add('push')
+    if prefs.sms_enabled:
+        channels.add('sms')
     return channels
 
 
+def notify_waitlist_promotions(activity: Activity, user_ids):
+    """Create in one bulk insert the notifications for users promoted from the waitlist."""
+    if not user_ids:
+        return []
+    prefs_by_user = _prefs_by_user(user_ids)
+    title = f"Cupo asignado: {activity.title}"
+    body = f"Se liberó un cupo en '{activity.title}' y quedaste inscrito desde la lista de espera."
+    now = timezone.now()
+
+    notifs = []
+    for user_id in user_ids:
+        for ch in _channels_from_prefs(prefs_by_user.get(user_id)):
+            notifs.append(
+                Notification(
+                    user_id=user_id,
+                    activity=activity,
+                    title=title,
+                    body=body,
+                    channel=ch,
+                    status='sent' if ch == 'app' else 'pending',
+                    sent_at=now if ch == 'app' else None,
+                    metadata={"type": "waitlist_promotion"},
+                )
+            )
+    created = Notification.objects.bulk_create(notifs)
+    track_unread_notifications(created)
+    return created
+
+
 def enqueue_activity_change_notifications(activity: Activity, changes: dict):
-    """Create Notification rows for enrolled users and assigned professor on activity changes."""
+    """
+    Create Notification rows for enrolled users and assigned professor on
+    activity changes. Returns the in-app notifications that were inserted.
+    """
     title, body = _activity_change_message(activity, changes)
 
     recipients = set(
@@ -517,25 +1195,20 @@ def enqueue_activity_change_notifications(activity: Activity, changes: dict):
     if activity.assigned_professor_id:
         recipients.add(activity.assigned_professor_id)
 
+    prefs_by_user = _prefs_by_user(recipients)
+
     notifs_to_create = []
     now = timezone.now()
+    dedupe_key = _activity_change_key(activity, changes, now)
 
     for user_id in recipients:
-        try:
-            user = User.objects.get(pk=user_id)
-        except User.DoesNotExist:
-            continue
-
-        if not _should_create_similar(user, activity, title):
-            continue
-
-        channels = _eligible_channels(user)
+        channels = _channels_from_prefs(prefs_by_user.get(user_id))
         for ch in channels:
             status = 'sent' if ch == 'app' else 'pending'
             sent_at = now if ch == 'app' else None
             notifs_to_create.append(
                 Notification(
-                    user=user,
+                    user_id=user_id,
                     activity=activity,
                     title=title,
                     body=body,
@@ -543,51 +1216,92 @@ def enqueue_activity_change_notifications(activity: Activity, changes: dict):
                     status=status,
                     sent_at=sent_at,
                     metadata={"type": "activity_change", "fields": list(changes.keys())},
+                    dedupe_key=dedupe_key,
                 )
             )
 
-    created = []
-    if notifs_to_create:
-        created = Notification.objects.bulk_create(notifs_to_create)
+    # Duplicates are dropped by the unique key, so concurrent saves cannot
+    # both notify. Email rows stay pending for the dispatch_notifications worker.
+    if not notifs_to_create:
+        return []
+    Notification.objects.bulk_create(notifs_to_create, ignore_conflicts=True)
+    # Ignored conflicts leave no primary keys: load back the in-app rows this
+    # call inserted (they share its sent_at) for the counters and streams
+    created = list(Notification.objects.filter(
+        activity=activity, channel='app', dedupe_key=dedupe_key, sent_at=now,
+    ))
+    track_unread_notifications(created)
+    return created
+
+
+def fan_out_campaign(campaign, users, channels, schedule_at=None, batch_size=None):
+    """
+    Create the campaign's Notification rows for every user in ``users``.
 
-    # Envío inmediato de emails si aplica (best-effort)
-    try:
-        send_email_immediate = getattr(settings, 'SEND_EMAIL_IMMEDIATE', True)
-        if send_email_immediate:
-            # Seleccionar notificaciones email pendientes recién creadas
-            email_qs = Notification.objects.filter(
-                activity=activity, channel='email', status='pending', title=title,
-                created_at__gte=timezone.now() - timezone.timedelta(minutes=5)
+    Recipients are streamed with their preferences joined in, as plain
+    values, and rows are inserted ``batch_size`` at a time, so memory stays
+    bounded however large the segment is. Returns ``{channel: created}``.
+    """
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_FANOUT_BATCH_SIZE', 1000)
+    now = timezone.now()
+    scheduled = bool(schedule_at and schedule_at > now)
+    # Users without a preferences row get NULLs from the join: everything enabled
+    recipients = users.order_by('id').values_list(
+        'id', 'notification_preferences__app_enabled', 'notification_preferences__email_enabled'
+    ).iterator(chunk_size=batch_size)
+
+    created = Counter()
+    unread = Counter()
+    recipients_reached = 0
+    batch = []
+
+    def flush():
+        Notification.objects.bulk_create(batch)
+        created.update(n.channel for n in batch)
+        unread.update(n.user_id for n in batch if n.channel == 'app' and n.status == 'sent')
+        batch.clear()
+
+    for user_id, app_enabled, email_enabled in recipients:
+        queued = len(batch)
+        for ch in channels:
+            if (ch == 'app' and app_enabled is False) or (ch == 'email' and email_enabled is False):
+                continue
+            if scheduled:
+                # dispatch_notifications releases both channels at schedule_at
+                status, sent_at, scheduled_for = 'scheduled', None, schedule_at
+            elif ch == 'app':
+                status, sent_at, scheduled_for = 'sent', now, None
+            else:
+                # No programación o en el pasado: enviar ahora
+                status, sent_at, scheduled_for = 'pending', None, None
+            batch.append(
+                Notification(
+                    user_id=user_id,
+                    campaign=campaign,
+                    title=campaign.name,
+                    body=campaign.message,
+                    channel=ch,
+                    status=status,
+                    scheduled_for=scheduled_for,
+                    sent_at=sent_at,
+                    metadata={'type': 'campaign'},
+                )
             )
-            for n in email_qs:
-                try:
-                    if not n.user.email:
-                        raise ValueError('Usuario sin email')
-                    if not settings.EMAIL_HOST_USER or not settings.EMAIL_HOST_PASSWORD:
-                        raise ValueError('Credenciales SMTP no configuradas')
-                    msg = EmailMessage(
-                        subject=n.title,
-                        body=n.body,
-                        from_email=settings.DEFAULT_FROM_EMAIL or settings.EMAIL_HOST_USER,
-                        to=[n.user.email],
-                    )
-                    msg.send(fail_silently=False)
-                    n.mark_sent()
-                    NotificationDeliveryLog.objects.create(
-                        notification=n,
-                        channel='email',
-                        status='success',
-                        detail='Email enviado por cambio de actividad'
-                    )
-                except Exception as exc:
-                    NotificationDeliveryLog.objects.create(
-                        notification=n,
-                        channel='email',
-                        status='error',
-                        detail=f'Error email: {exc}'
-                    )
-                    n.status = 'failed'
-                    n.save(update_fields=['status'])
-    except Exception:
-        # No romper en caso de error en envío
-        pass
+        if len(batch) > queued:
+            recipients_reached += 1
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    # Scheduled in-app rows are counted when dispatch_notifications releases them
+    Campaign.objects.filter(pk=campaign.pk).update(
+        total_recipients=F('total_recipients') + recipients_reached,
+        app_sent=F('app_sent') + sum(unread.values()),
+    )
+
+    # Only the per-user counts are kept for the commit hook; open notification
+    # streams pick the rows up from the hub's poller instead of holding them here
+    if unread:
+        transaction.on_commit(lambda: incr_unread_counts(unread))
+    return dict(created)
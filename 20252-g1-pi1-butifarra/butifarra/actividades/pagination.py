@@ -0,0 +1,183 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a fixed, unique ordering.
+
+    The cursor stores the ordering values of the last row served, so each page
+    is a ``WHERE (a, b) < (x, y) ORDER BY a, b LIMIT n`` query that uses the
+    index on the leading field and costs the same on page 1 and on page 1000.
+    Rows inserted while a client walks the listing never shift the pages it
+    has not read yet.
+
+    Pagination is opt-in: the listing is only paginated when the request
+    carries ``cursor`` or ``page_size``, so existing clients that expect the
+    plain array keep working.
+    """
+    # Last field must be unique so every row has a distinct position
+    ordering = ('-id',)
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Cursor inválido'
+
+    def get_default_page_size(self):
+        return getattr(settings, 'API_PAGE_SIZE', 50)
+
+    def get_max_page_size(self):
+        return getattr(settings, 'API_MAX_PAGE_SIZE', 200)
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        raw = request.query_params.get(self.page_size_query_param)
+        try:
+            size = int(raw) if raw else self.get_default_page_size()
+        except (TypeError, ValueError):
+            size = self.get_default_page_size()
+        return max(1, min(size, self.get_max_page_size()))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+
+        position, reverse = self.decode_cursor(request)
+        ordering = self._reversed_ordering() if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._seek_filter(position, ordering))
+
+        # Fetch one extra row to know whether there is another page
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        if reverse:
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.first_position = self._position_of(rows[0]) if rows else position
+        self.last_position = self._position_of(rows[-1]) if rows else position
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or self.last_position is None:
+            return None
+        return self.encode_cursor(self.last_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first_position is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.first_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    # Cursor encoding ---------------------------------------------------
+
+    def encode_cursor(self, position, reverse):
+        payload = {'p': position}
+        if reverse:
+            payload['r'] = 1
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        token = base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            raw_position = payload['p']
+            if len(raw_position) != len(self.ordering):
+                raise ValueError('cursor length mismatch')
+            position = [
+                self._field(name).to_python(value)
+                for name, value in zip(self._field_names(), raw_position)
+            ]
+            if any(value is None for value in position):
+                raise ValueError('null cursor value')
+            return position, bool(payload.get('r'))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    # Ordering helpers --------------------------------------------------
+
+    def _field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def _field(self, name):
+        return self.model._meta.get_field(name)
+
+    def _reversed_ordering(self):
+        return tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        )
+
+    def _position_of(self, instance):
+        position = []
+        for name in self._field_names():
+            value = self._field(name).value_to_string(instance)
+            position.append(value)
+        return position
+
+    def _seek_filter(self, position, ordering):
+        """Build ``(a, b, c) > (x, y, z)`` for the given ordering directions."""
+        seek = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            seek |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return seek
+
+
+class StartCursorPagination(KeysetCursorPagination):
+    """Newest-first listing keyed on ``(start, id)`` for activities and tournaments."""
+    ordering = ('-start', '-id')
+
+
+class CreatedCursorPagination(KeysetCursorPagination):
+    """Newest-first listing keyed on ``(created_at, id)`` for notifications."""
+    ordering = ('-created_at', '-id')
@@ -1,11 +1,13 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.utils.text import Truncator
 from .models import (
     Activity,
     UserProfile,
     Tournament,
     ActivityEnrollment,
     TournamentEnrollment,
+    ArchivedNotification,
     Notification,
     NotificationDeliveryLog,
     NotificationPreference,
@@ -175,6 +177,35 @@ class NotificationSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'activity', 'campaign', 'status', 'sent_at', 'read_at', 'created_at', 'delivery_logs']
 
 
+class NotificationListSerializer(serializers.ModelSerializer):
+    """Listing shape: no delivery logs and the body cut short; the detail view has the rest."""
+    LIST_BODY_CHARS = 280
+
+    body = serializers.SerializerMethodField(read_only=True)
+
+    class Meta:
+        model = Notification
+        fields = [
+            'id', 'activity', 'campaign', 'title', 'body', 'channel', 'status',
+            'priority', 'sent_at', 'read_at', 'created_at'
+        ]
+        read_only_fields = fields
+
+    def get_body(self, obj):
+        return Truncator(obj.body).chars(self.LIST_BODY_CHARS)
+
+
+class ArchivedNotificationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedNotification
+        fields = [
+            'id', 'user', 'activity', 'campaign', 'title', 'body', 'channel', 'status',
+            'priority', 'scheduled_for', 'sent_at', 'read_at', 'metadata', 'created_at', 'delivery_logs',
+            'archived_at'
+        ]
+        read_only_fields = fields
+
+
 class NotificationPreferenceSerializer(serializers.ModelSerializer):
     class Meta:
         model = NotificationPreference
@@ -183,10 +214,19 @@ class NotificationPreferenceSerializer(serializers.ModelSerializer):
 
 
 class CampaignSerializer(serializers.ModelSerializer):
+    read_rate = serializers.SerializerMethodField(read_only=True)
+
     class Meta:
         model = Campaign
         fields = [
             'id', 'name', 'message', 'channel_option', 'segment', 'selected_user_ids', 'schedule_at',
-            'total_recipients', 'app_sent', 'emails_sent', 'created_by', 'created_at'
+            'total_recipients', 'app_sent', 'emails_sent', 'emails_failed', 'app_read', 'emails_read',
+            'read_rate', 'created_by', 'created_at'
         ]
-        read_only_fields = ['id', 'total_recipients', 'app_sent', 'emails_sent', 'created_by', 'created_at']
+        read_only_fields = [
+            'id', 'total_recipients', 'app_sent', 'emails_sent', 'emails_failed', 'app_read', 'emails_read',
+            'created_by', 'created_at'
+        ]
+
+    def get_read_rate(self, obj):
+        return obj.read_rates()
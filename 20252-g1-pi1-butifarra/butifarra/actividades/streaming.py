@@ -0,0 +1,219 @@
+"""
+Server-Sent Events for in-app notifications.
+
+Each process keeps one NotificationHub. Stream handlers subscribe a queue
+per connection; new notifications reach them two ways:
+
+* rows created in this process are published right after commit;
+* one background thread per process polls for rows created elsewhere
+  (other workers, the dispatcher) with a single query per tick, however
+  many clients are connected.
+
+The poller follows ``updated_at`` rather than the id: an in-app row released
+from ``scheduled`` later, or one committed after a row with a higher id, is
+still picked up. Each tick re-reads a short overlap window so rows committed
+late are not skipped; ids already published are not sent twice.
+
+Clients resume with ``Last-Event-ID`` (the notification id); anything they
+missed is replayed from the database before live events.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import Notification
+
+STREAM_QUEUE_SIZE = 100
+# Ids a stream remembers having sent, to drop the same row arriving from both the hub and the poller
+STREAM_SEEN_IDS = 1000
+# Queued after STREAM_QUEUE_SIZE undelivered events: the stream closes and the client resumes from its last id
+OVERFLOW = object()
+
+
+def notification_event(notification):
+    return {
+        'id': notification.id,
+        'user_id': notification.user_id,
+        'title': notification.title,
+        'body': notification.body,
+        'priority': notification.priority,
+        'activity': notification.activity_id,
+        'campaign': notification.campaign_id,
+        'created_at': notification.created_at.isoformat() if notification.created_at else None,
+    }
+
+
+def format_event(event):
+    data = {key: value for key, value in event.items() if key != 'user_id'}
+    return f"id: {event['id']}\nevent: notification\ndata: {json.dumps(data)}\n\n"
+
+
+class _Subscriber:
+    __slots__ = ('loop', 'queue', 'overflowed')
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.overflowed = False
+
+    def deliver(self, event):
+        # Runs on the subscriber's own event loop. Nothing queued is dropped,
+        # so resuming from the last delivered id cannot skip an event.
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= STREAM_QUEUE_SIZE:
+            self.overflowed = True
+            event = OVERFLOW
+        self.queue.put_nowait(event)
+
+
+class NotificationHub:
+    """Per-process fan-out of new in-app notifications to open streams."""
+
+    def __init__(self, poll=True):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._poll = poll
+        self._poller = None
+        self._since = None
+        # id -> updated_at of the rows published inside the overlap window
+        self._published = {}
+
+    def subscribe(self, user_id):
+        subscriber = _Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[user_id].add(subscriber)
+            if self._poll and (self._poller is None or not self._poller.is_alive()):
+                self._poller = threading.Thread(target=self._poll_forever, name='notification-hub', daemon=True)
+                self._poller.start()
+        return subscriber
+
+    def unsubscribe(self, user_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, events):
+        """Hand events to the subscribed connections. Safe to call from any thread."""
+        with self._lock:
+            targets = [
+                (subscriber, event)
+                for event in events
+                for subscriber in self._subscribers.get(event['user_id'], ())
+            ]
+        for subscriber, event in targets:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.deliver, event)
+            except RuntimeError:
+                # The connection's loop is already closed
+                pass
+
+    def poll_once(self):
+        """Publish unread in-app notifications changed since the last poll for connected users (one query)."""
+        now = timezone.now()
+        if self._since is None:
+            self._since = now
+            return 0
+        with self._lock:
+            user_ids = list(self._subscribers)
+        if not user_ids:
+            self._since = now
+            return 0
+        overlap = timedelta(seconds=getattr(settings, 'NOTIFICATION_STREAM_POLL_OVERLAP', 10))
+        window_start = self._since - overlap
+        rows = list(
+            Notification.objects.filter(
+                channel='app', status='sent', user_id__in=user_ids, updated_at__gte=window_start
+            ).order_by('updated_at', 'id')[:500]
+        )
+        fresh = [n for n in rows if self._published.get(n.id) != n.updated_at]
+        for notification in rows:
+            self._published[notification.id] = notification.updated_at
+        # A full page resumes from its last row; otherwise everything up to now was read
+        self._since = rows[-1].updated_at if len(rows) == 500 else now
+        cutoff = self._since - overlap
+        self._published = {pk: updated for pk, updated in self._published.items() if updated >= cutoff}
+        if fresh:
+            self.publish([notification_event(n) for n in fresh])
+        return len(fresh)
+
+    def _poll_forever(self):
+        interval = getattr(settings, 'NOTIFICATION_STREAM_POLL_INTERVAL', 2.0)
+        while True:
+            close_old_connections()
+            try:
+                self.poll_once()
+            except Exception:
+                # Keep the hub alive across transient database errors
+                pass
+            time.sleep(interval)
+
+
+notification_hub = NotificationHub()
+
+
+def publish_new_notifications(notifications):
+    """Push just-committed in-app notifications to this process's open streams."""
+    notification_hub.publish([
+        notification_event(n) for n in notifications if n.channel == 'app' and n.id is not None
+    ])
+
+
+def _missed_events(user_id, last_id):
+    return [
+        notification_event(n)
+        for n in Notification.objects.filter(user_id=user_id, channel='app', id__gt=last_id)
+        .exclude(status='scheduled')
+        .order_by('id')[:500]
+    ]
+
+
+async def event_stream(user_id, last_id=None, heartbeat=None, hub=None):
+    """Yield SSE frames for one user until the client disconnects."""
+    heartbeat = heartbeat or getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+    hub = hub or notification_hub
+    subscriber = hub.subscribe(user_id)
+    seen, seen_order = set(), deque()
+
+    def remember(event_id):
+        seen.add(event_id)
+        seen_order.append(event_id)
+        if len(seen_order) > STREAM_SEEN_IDS:
+            seen.discard(seen_order.popleft())
+
+    try:
+        yield "retry: 3000\n\n"
+        if last_id is not None:
+            # Subscribed first, so nothing created meanwhile is lost; duplicates are skipped by id
+            for event in await sync_to_async(_missed_events)(user_id, last_id):
+                remember(event['id'])
+                yield format_event(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            if event is OVERFLOW:
+                return
+            if event['id'] in seen:
+                continue
+            remember(event['id'])
+            yield format_event(event)
+    finally:
+        hub.unsubscribe(user_id, subscriber)
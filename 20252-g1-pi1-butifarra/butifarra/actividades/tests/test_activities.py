@@ -3,10 +3,13 @@ Comprehensive tests for Activity model, serializers and API endpoints
 """
 import pytest
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from datetime import timedelta
 from rest_framework.test import APIClient
-from actividades.models import Activity, ActivityEnrollment, UserProfile
+from actividades.models import Activity, ActivityEnrollment, Notification, UserProfile
 
 
 @pytest.fixture
@@ -168,6 +171,52 @@ class TestActivityModel:
         assert activity.assigned_professor == professor_user
 
 
+@pytest.mark.django_db
+class TestActivityChangeDetection:
+    """Test that Activity.save diffs against the values loaded from the database"""
+
+    @pytest.fixture
+    def loaded(self, activity, professor_user):
+        UserProfile.objects.filter(user=professor_user).update(role='PROFESSOR')
+        Activity.objects.filter(pk=activity.pk).update(assigned_professor=professor_user)
+        ActivityEnrollment.objects.create(user=User.objects.create_user(username='s', password='x'), activity=activity)
+        return Activity.objects.get(pk=activity.pk)
+
+    def test_partial_save_is_a_single_update(self, loaded, django_assert_num_queries):
+        loaded.notes = 'Buena sesión'
+        with django_assert_num_queries(1):
+            loaded.save(update_fields=['notes'])
+        loaded.available_spots = 0
+        with django_assert_num_queries(1):
+            loaded.save(update_fields=['available_spots'])
+        assert Activity.objects.get(pk=loaded.pk).available_spots == 0
+
+    def test_counter_save_still_validates_counters(self, loaded):
+        loaded.actual_attendees = loaded.capacity + 1
+        with pytest.raises(ValidationError):
+            loaded.save(update_fields=['actual_attendees'])
+
+    def test_change_is_detected_without_reloading(self, loaded):
+        loaded.location = 'Gym B'
+        with CaptureQueriesContext(connection) as ctx:
+            loaded.save()
+        assert not any(
+            q['sql'].startswith('SELECT') and 'FROM "actividades_activity"' in q['sql'] for q in ctx.captured_queries
+        )
+        # The enrolled student and the assigned professor
+        notifications = Notification.objects.filter(channel='app')
+        assert [n.metadata['fields'] for n in notifications] == [['location'], ['location']]
+
+        # The snapshot follows the saved values: saving again changes nothing
+        loaded.save()
+        assert Notification.objects.filter(channel='app').count() == 2
+
+    def test_unsaved_field_changes_are_ignored(self, loaded):
+        loaded.location = 'Gym B'
+        loaded.save(update_fields=['notes'])
+        assert not Notification.objects.exists()
+
+
 @pytest.mark.django_db
 class TestActivityEnrollmentModel:
     """Test ActivityEnrollment model functionality"""
@@ -160,3 +160,63 @@ class TestReportsFiltering:
         response = api_client.get(f'/api/reports/dashboard/?from={from_date}&to={to_date}')
         assert response.status_code == 200
 
+
+
+@pytest.mark.django_db
+class TestReportsDashboardQueries:
+    """Pin the number of queries issued by the dashboard"""
+
+    DASHBOARD_QUERIES = 7
+
+    def _seed(self, admin_user, students, count):
+        for i in range(count):
+            activity = Activity.objects.create(
+                title=f'Query Activity {i}',
+                category='DEPORTE' if i % 2 else 'CULTURA',
+                start=timezone.now() + timedelta(days=i - 3),
+                end=timezone.now() + timedelta(days=i - 3, hours=2),
+                capacity=20,
+                actual_attendees=i,
+                created_by=admin_user
+            )
+            for j, student in enumerate(students):
+                ActivityEnrollment.objects.create(user=student, activity=activity, attended=bool((i + j) % 2))
+
+    def test_query_count_is_constant(self, api_client, admin_user, django_assert_num_queries):
+        students = [
+            User.objects.create_user(username=f'query_student{i}', password='student123')
+            for i in range(3)
+        ]
+        api_client.force_authenticate(user=admin_user)
+
+        self._seed(admin_user, students, 2)
+        with django_assert_num_queries(self.DASHBOARD_QUERIES):
+            response = api_client.get('/api/reports/dashboard/')
+        assert response.status_code == 200
+
+        self._seed(admin_user, students, 8)
+        with django_assert_num_queries(self.DASHBOARD_QUERIES):
+            response = api_client.get('/api/reports/dashboard/?activity_type=DEPORTE,CULTURA')
+        assert response.status_code == 200
+
+    def test_kpis_match_raw_counts(self, api_client, admin_user, beneficiary_user):
+        today = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        activity = Activity.objects.create(
+            title='Today Activity',
+            category='DEPORTE',
+            start=today,
+            end=today + timedelta(hours=1),
+            capacity=10,
+            created_by=admin_user
+        )
+        ActivityEnrollment.objects.create(user=beneficiary_user, activity=activity, attended=True)
+        ActivityEnrollment.objects.create(user=admin_user, activity=activity, attended=False)
+
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.get('/api/reports/dashboard/')
+        cards = {card['key']: card for card in response.data['summary_cards']}
+        assert cards['attendance_today']['value'] == 1
+        weekly = {metric['key']: metric for metric in response.data['weekly_metrics']}
+        assert weekly['weekly_attendance']['current'] == 1
+        assert response.data['enrollment_series'] == [{'date': today.date().isoformat(), 'enrollments': 2}]
+        assert response.data['attendance_series'] == [{'date': today.date().isoformat(), 'attendees': 1}]
@@ -5,8 +5,15 @@ import pytest
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
+from django.test import override_settings
 from rest_framework.test import APIClient
 from actividades.models import Activity, ActivityEnrollment, UserProfile
+from butifarra.actividades.checkin_tokens import (
+    ExpiredCheckinToken,
+    InvalidCheckinToken,
+    make_checkin_token,
+    read_checkin_token,
+)
 
 
 @pytest.fixture
@@ -23,15 +30,14 @@ def admin_user(db):
         is_staff=True,
         is_superuser=True
     )
-    UserProfile.objects.get_or_create(
-        user=user,
-        defaults={
-            'role': 'ADMIN',
-            'phone_number': '1234567890',
-            'program': 'Admin',
-            'semester': 1
-        }
+    # The profile is created on signup; set its fields
+    UserProfile.objects.filter(user=user).update(
+        role='ADMIN',
+        phone_number='1234567890',
+        program='Admin',
+        semester=1,
     )
+    user.refresh_from_db()
     return user
 
 
@@ -42,15 +48,14 @@ def professor_user(db):
         email='professor1@test.com',
         password='prof123'
     )
-    UserProfile.objects.get_or_create(
-        user=user,
-        defaults={
-            'role': 'PROFESSOR',
-            'phone_number': '1111111111',
-            'program': 'Engineering',
-            'semester': 1
-        }
+    # The profile is created on signup; set its fields
+    UserProfile.objects.filter(user=user).update(
+        role='PROFESSOR',
+        phone_number='1111111111',
+        program='Engineering',
+        semester=1,
     )
+    user.refresh_from_db()
     return user
 
 
@@ -61,15 +66,14 @@ def beneficiary_user(db):
         email='student1@test.com',
         password='student123'
     )
-    UserProfile.objects.get_or_create(
-        user=user,
-        defaults={
-            'role': 'BENEFICIARY',
-            'phone_number': '2222222222',
-            'program': 'Computer Science',
-            'semester': 5
-        }
+    # The profile is created on signup; set its fields
+    UserProfile.objects.filter(user=user).update(
+        role='BENEFICIARY',
+        phone_number='2222222222',
+        program='Computer Science',
+        semester=5,
     )
+    user.refresh_from_db()
     return user
 
 
@@ -125,22 +129,28 @@ class TestCheckinTokenGeneration:
         response = api_client.post(f'/api/actividades/{other_activity.id}/generate-checkin/')
         assert response.status_code == 403
 
-    def test_token_regeneration_replaces_old_token(self, api_client, professor_user, activity_with_professor):
+    def test_regenerated_tokens_stay_valid_together(self, api_client, professor_user, beneficiary_user, activity_with_professor):
         api_client.force_authenticate(user=professor_user)
 
         # Generate first token
         response1 = api_client.post(f'/api/actividades/{activity_with_professor.id}/generate-checkin/')
         token1 = response1.data['token']
 
-        # Generate second token
+        # Generate second token (e.g. a second QR display)
         response2 = api_client.post(f'/api/actividades/{activity_with_professor.id}/generate-checkin/')
         token2 = response2.data['token']
 
         assert token1 != token2
 
+        # The latest one is kept for the detail page
         activity_with_professor.refresh_from_db()
         assert activity_with_professor.checkin_token == token2
 
+        # Both check in
+        api_client.force_authenticate(user=beneficiary_user)
+        assert api_client.post('/api/actividades/checkin/', {'token': token1}, format='json').status_code == 200
+        assert api_client.post('/api/actividades/checkin/', {'token': token2}, format='json').status_code == 200
+
 
 @pytest.mark.django_db
 class TestCheckinProcess:
@@ -202,14 +212,8 @@ class TestCheckinProcess:
         assert response.status_code == 400
 
     def test_checkin_with_expired_token_fails(self, api_client, professor_user, beneficiary_user, activity_with_professor):
-        # Generate token
-        api_client.force_authenticate(user=professor_user)
-        token_response = api_client.post(f'/api/actividades/{activity_with_professor.id}/generate-checkin/')
-        token = token_response.data['token']
-
-        # Manually expire the token
-        activity_with_professor.checkin_expires_at = timezone.now() - timedelta(minutes=1)
-        activity_with_professor.save()
+        # A token issued eleven minutes ago (TTL is ten)
+        token, _ = make_checkin_token(activity_with_professor.id, now=timezone.now() - timedelta(minutes=11))
 
         # Try to check in with expired token
         api_client.force_authenticate(user=beneficiary_user)
@@ -278,7 +282,8 @@ class TestCheckinProcess:
         # Try to check in without authentication
         api_client.force_authenticate(user=None)
         response = api_client.post('/api/actividades/checkin/', {'token': token}, format='json')
-        assert response.status_code == 401
+        # Session authentication sends no WWW-Authenticate challenge, so DRF answers 403
+        assert response.status_code == 403
 
 
 @pytest.mark.django_db
@@ -305,9 +310,11 @@ class TestCheckinTokenExpiration:
         token_response = api_client.post(f'/api/actividades/{activity_with_professor.id}/generate-checkin/')
         token = token_response.data['token']
 
-        # Manually set expiration to past
-        activity_with_professor.checkin_expires_at = timezone.now() - timedelta(hours=1)
-        activity_with_professor.save()
+        # The expiry travels inside the token: check it an hour later
+        with pytest.raises(ExpiredCheckinToken):
+            read_checkin_token(token, now=timezone.now() + timedelta(hours=1))
+
+        token, _ = make_checkin_token(activity_with_professor.id, now=timezone.now() - timedelta(hours=1))
 
         # Try to use expired token
         api_client.force_authenticate(user=beneficiary_user)
@@ -338,3 +345,48 @@ class TestCheckinURL:
         # URL should be absolute (start with http)
         assert checkin_url.startswith('http')
 
+
+@pytest.mark.django_db
+class TestSignedCheckinTokens:
+    """Test signature checks, key rotation and DB-free validation"""
+
+    def test_validation_does_not_query(self, activity_with_professor, django_assert_num_queries):
+        token, _ = make_checkin_token(activity_with_professor.id)
+        with django_assert_num_queries(0):
+            assert read_checkin_token(token) == activity_with_professor.id
+
+    def test_tampered_token_is_rejected(self, api_client, beneficiary_user, activity_with_professor):
+        token, _ = make_checkin_token(activity_with_professor.id)
+        value, signature = token.rsplit('.', 1)
+        other, _ = make_checkin_token(activity_with_professor.id + 1)
+        forged = other.rsplit('.', 1)[0] + '.' + signature
+
+        with pytest.raises(InvalidCheckinToken):
+            read_checkin_token(forged)
+
+        api_client.force_authenticate(user=beneficiary_user)
+        response = api_client.post('/api/actividades/checkin/', {'token': forged}, format='json')
+        assert response.status_code == 404
+
+    def test_key_rotation(self, activity_with_professor):
+        with override_settings(CHECKIN_TOKEN_KEYS=['clave-vieja']):
+            old_token, _ = make_checkin_token(activity_with_professor.id)
+
+        # New key first, old one still accepted
+        with override_settings(CHECKIN_TOKEN_KEYS=['clave-nueva', 'clave-vieja']):
+            assert read_checkin_token(old_token) == activity_with_professor.id
+            new_token, _ = make_checkin_token(activity_with_professor.id)
+
+        # Old key dropped
+        with override_settings(CHECKIN_TOKEN_KEYS=['clave-nueva']):
+            assert read_checkin_token(new_token) == activity_with_professor.id
+            with pytest.raises(InvalidCheckinToken):
+                read_checkin_token(old_token)
+
+    def test_token_for_deleted_activity(self, api_client, beneficiary_user, activity_with_professor):
+        token, _ = make_checkin_token(activity_with_professor.id)
+        activity_with_professor.delete()
+
+        api_client.force_authenticate(user=beneficiary_user)
+        response = api_client.post('/api/actividades/checkin/', {'token': token}, format='json')
+        assert response.status_code == 404
@@ -0,0 +1,183 @@
+"""
+Tests for the DailyMetrics reporting rollup
+"""
+import io
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from datetime import timedelta
+from rest_framework.test import APIClient
+from actividades.models import Activity, ActivityEnrollment, DailyMetrics
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def admin_user(db):
+    return User.objects.create_user(
+        username='admin',
+        email='admin@test.com',
+        password='admin123',
+        is_staff=True,
+        is_superuser=True
+    )
+
+
+@pytest.fixture
+def students(db):
+    return [
+        User.objects.create_user(username=f'student{i}', password='student123')
+        for i in range(3)
+    ]
+
+
+@pytest.fixture
+def start():
+    return timezone.now().replace(hour=12, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+
+@pytest.fixture
+def activity(db, admin_user, start):
+    return Activity.objects.create(
+        title='Yoga',
+        category='BIENESTAR',
+        start=start,
+        end=start + timedelta(hours=1),
+        capacity=2,
+        available_spots=2,
+        created_by=admin_user
+    )
+
+
+def _rollup():
+    return {
+        (row.day, row.category): (row.enrollments, row.attendees, row.new_users, row.capacity, row.actual_attendees)
+        for row in DailyMetrics.objects.all()
+        if any((row.enrollments, row.attendees, row.new_users, row.capacity, row.actual_attendees))
+    }
+
+
+def assert_matches_rebuild():
+    incremental = _rollup()
+    DailyMetrics.rebuild()
+    assert incremental == _rollup()
+
+
+@pytest.mark.django_db
+class TestIncrementalRollup:
+    """Event deltas must agree with a rebuild from the source tables"""
+
+    def test_enroll_checkin_and_unenroll(self, activity, students):
+        ActivityEnrollment.enroll(students[0], activity)
+        ActivityEnrollment.enroll(students[1], activity)
+        enrollment = ActivityEnrollment.objects.get(user=students[0], activity=activity)
+        enrollment.attended = True
+        enrollment.save(update_fields=['attended'])
+        activity.actual_attendees = 1
+        activity.save(update_fields=['actual_attendees'])
+
+        row = DailyMetrics.objects.get(day=activity.start.date(), category='BIENESTAR')
+        assert (row.enrollments, row.attendees, row.capacity, row.actual_attendees) == (2, 1, 2, 1)
+        assert_matches_rebuild()
+
+        ActivityEnrollment.unenroll(students[0], activity)
+        assert_matches_rebuild()
+
+    def test_waitlist_promotion_counts_enrollment(self, activity, students):
+        for user in students:
+            ActivityEnrollment.enroll(user, activity)
+        ActivityEnrollment.unenroll(students[0], activity)
+        row = DailyMetrics.objects.get(day=activity.start.date(), category='BIENESTAR')
+        assert row.enrollments == 2
+        assert_matches_rebuild()
+
+    def test_moving_activity_moves_its_counters(self, activity, students):
+        ActivityEnrollment.enroll(students[0], activity)
+        activity.start += timedelta(days=3)
+        activity.end += timedelta(days=3)
+        activity.category = 'DEPORTE'
+        activity.save()
+        assert not DailyMetrics.objects.filter(category='BIENESTAR', enrollments__gt=0).exists()
+        assert DailyMetrics.objects.get(day=activity.start.date(), category='DEPORTE').enrollments == 1
+        assert_matches_rebuild()
+
+    def test_moving_activity_keeps_other_deltas(self, activity, students, monkeypatch):
+        ActivityEnrollment.enroll(students[0], activity)
+        # A delta nobody has written to the source tables yet, as a concurrent
+        # bump would be when the move commits: a recompute would drop it
+        DailyMetrics.bump(activity.start.date(), 'BIENESTAR', enrollments=5)
+        monkeypatch.setattr(DailyMetrics, 'rebuild', classmethod(lambda cls, days=None: pytest.fail('rebuild')))
+        activity.start += timedelta(days=3)
+        activity.end += timedelta(days=3)
+        activity.save()
+        old_row = DailyMetrics.objects.get(day=(activity.start - timedelta(days=3)).date(), category='BIENESTAR')
+        new_row = DailyMetrics.objects.get(day=activity.start.date(), category='BIENESTAR')
+        assert (old_row.enrollments, old_row.capacity) == (5, 0)
+        assert (new_row.enrollments, new_row.capacity) == (1, 2)
+
+    def test_deleting_activity_removes_its_counters(self, activity, students):
+        ActivityEnrollment.enroll(students[0], activity)
+        activity.delete()
+        assert _rollup().get((activity.start.date(), 'BIENESTAR')) is None
+        assert_matches_rebuild()
+
+    def test_signup_counts_new_user(self, db):
+        user = User.objects.create_user(username='newcomer', password='x')
+        row = DailyMetrics.objects.get(day=user.date_joined.date(), category=DailyMetrics.USERS_CATEGORY)
+        assert row.new_users == 1
+        user.delete()
+        assert_matches_rebuild()
+
+
+@pytest.mark.django_db
+class TestRollupCommand:
+    """Test the rollup_daily_metrics management command"""
+
+    def test_incremental_run_repairs_touched_days(self, activity, students):
+        ActivityEnrollment.enroll(students[0], activity)
+        DailyMetrics.objects.all().delete()
+
+        out = io.StringIO()
+        call_command('rollup_daily_metrics', stdout=out)
+        assert 'Recomputed' in out.getvalue()
+        assert DailyMetrics.objects.get(day=activity.start.date(), category='BIENESTAR').enrollments == 1
+
+    def test_full_rebuild(self, activity, students):
+        ActivityEnrollment.enroll(students[0], activity)
+        DailyMetrics.objects.update(enrollments=99)
+        call_command('rollup_daily_metrics', full=True, stdout=io.StringIO())
+        assert DailyMetrics.objects.get(day=activity.start.date(), category='BIENESTAR').enrollments == 1
+
+    def test_invalid_day_is_rejected(self, db):
+        with pytest.raises(CommandError):
+            call_command('rollup_daily_metrics', day=['not-a-day'], stdout=io.StringIO())
+
+
+@pytest.mark.django_db
+class TestDashboardReadsRollup:
+    """The dashboard series come from DailyMetrics for whole-day ranges"""
+
+    def test_whole_day_range_uses_rollup(self, api_client, admin_user, activity, students):
+        ActivityEnrollment.enroll(students[0], activity)
+        # Skew the rollup so we can tell which source answered
+        DailyMetrics.objects.filter(category='BIENESTAR').update(enrollments=5)
+        api_client.force_authenticate(user=admin_user)
+
+        day = activity.start.date().isoformat()
+        response = api_client.get(f'/api/reports/dashboard/?start_date={day}&end_date={day}')
+        assert response.data['enrollment_series'] == [{'date': day, 'enrollments': 5}]
+
+    def test_partial_day_range_reads_source_tables(self, api_client, admin_user, activity, students):
+        ActivityEnrollment.enroll(students[0], activity)
+        DailyMetrics.objects.filter(category='BIENESTAR').update(enrollments=5)
+        api_client.force_authenticate(user=admin_user)
+
+        since = (activity.start - timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%S')
+        response = api_client.get(f'/api/reports/dashboard/?start_date={since}')
+        day = activity.start.date().isoformat()
+        assert response.data['enrollment_series'] == [{'date': day, 'enrollments': 1}]
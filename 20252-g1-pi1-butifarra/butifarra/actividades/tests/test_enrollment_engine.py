@@ -0,0 +1,133 @@
+"""
+Tests for the conditional-UPDATE enrollment engine and its concurrency benchmark
+"""
+import io
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
+from rest_framework.test import APIClient
+from actividades.models import Activity, ActivityEnrollment
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def admin_user(db):
+    return User.objects.create_user(
+        username='admin',
+        email='admin@test.com',
+        password='admin123',
+        is_staff=True,
+        is_superuser=True
+    )
+
+
+@pytest.fixture
+def students(db):
+    return [
+        User.objects.create_user(username=f'student{i}', password='student123')
+        for i in range(3)
+    ]
+
+
+@pytest.fixture
+def activity(db, admin_user):
+    return Activity.objects.create(
+        title='Futsal',
+        category='DEPORTE',
+        start=timezone.now() + timedelta(days=1),
+        end=timezone.now() + timedelta(days=1, hours=1),
+        capacity=2,
+        available_spots=2,
+        created_by=admin_user
+    )
+
+
+@pytest.mark.django_db
+class TestEnrollmentEngine:
+    """Test ActivityEnrollment.enroll / unenroll"""
+
+    def test_enroll_claims_a_seat(self, activity, students):
+        result, enrollment = ActivityEnrollment.enroll(students[0], activity)
+        assert result == ActivityEnrollment.RESULT_ENROLLED
+        assert enrollment.user == students[0]
+        activity.refresh_from_db()
+        assert activity.available_spots == 1
+
+    def test_enroll_never_exceeds_capacity(self, activity, students):
+        results = [ActivityEnrollment.enroll(user, activity, waitlist=False)[0] for user in students]
+        assert results == [
+            ActivityEnrollment.RESULT_ENROLLED,
+            ActivityEnrollment.RESULT_ENROLLED,
+            ActivityEnrollment.RESULT_FULL,
+        ]
+        activity.refresh_from_db()
+        assert activity.available_spots == 0
+        assert ActivityEnrollment.objects.filter(activity=activity).count() == 2
+
+    def test_duplicate_enroll_does_not_consume_a_seat(self, activity, students):
+        ActivityEnrollment.enroll(students[0], activity)
+        result, enrollment = ActivityEnrollment.enroll(students[0], activity)
+        assert result == ActivityEnrollment.RESULT_ALREADY_ENROLLED
+        assert enrollment is None
+        activity.refresh_from_db()
+        assert activity.available_spots == 1
+
+    def test_unenroll_returns_the_seat(self, activity, students):
+        ActivityEnrollment.enroll(students[0], activity)
+        assert ActivityEnrollment.unenroll(students[0], activity) is True
+        activity.refresh_from_db()
+        assert activity.available_spots == 2
+
+    def test_unenroll_without_enrollment_keeps_spots(self, activity, students):
+        assert ActivityEnrollment.unenroll(students[0], activity) is False
+        activity.refresh_from_db()
+        assert activity.available_spots == 2
+
+    def test_enroll_does_not_call_activity_save(self, activity, students):
+        with CaptureQueriesContext(connection) as ctx:
+            ActivityEnrollment.enroll(students[0], activity)
+        statements = [q['sql'] for q in ctx.captured_queries]
+        assert not any(sql.lstrip().upper().startswith('SELECT') for sql in statements)
+
+
+@pytest.mark.django_db
+class TestEnrollmentEndpoints:
+    """Test the enroll/unenroll actions on top of the engine"""
+
+    def test_student_can_enroll_and_unenroll(self, api_client, activity, students):
+        api_client.force_authenticate(user=students[0])
+        response = api_client.post(f'/api/actividades/{activity.id}/enroll/')
+        assert response.status_code == 201
+
+        response = api_client.post(f'/api/actividades/{activity.id}/unenroll/')
+        assert response.status_code == 200
+        activity.refresh_from_db()
+        assert activity.available_spots == 2
+
+    def test_enroll_full_activity_joins_waitlist(self, api_client, activity, students):
+        for user in students[:2]:
+            ActivityEnrollment.enroll(user, activity)
+        api_client.force_authenticate(user=students[2])
+        response = api_client.post(f'/api/actividades/{activity.id}/enroll/')
+        assert response.status_code == 202
+        assert 'No hay cupos' in response.data['detail']
+        assert response.data['position'] == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_benchmark_enrollment_reports_no_overselling():
+    out = io.StringIO()
+    call_command('benchmark_enrollment', requests=40, seats=10, workers=4, stdout=out)
+    output = out.getvalue()
+    assert 'No overselling detected' in output
+    assert '201:' in output
+    assert not Activity.objects.filter(title__startswith='Benchmark bench-enroll-').exists()
@@ -0,0 +1,206 @@
+"""
+Tests for the Server-Sent Events notification stream
+"""
+import asyncio
+import io
+
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import Client
+from actividades.models import Notification, track_unread_notifications
+from butifarra.actividades import streaming
+from butifarra.actividades.streaming import STREAM_QUEUE_SIZE, NotificationHub, event_stream
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    # Hub without the background poller; poll_once() is driven by the tests
+    hub = NotificationHub(poll=False)
+    monkeypatch.setattr(streaming, 'notification_hub', hub)
+    return hub
+
+
+@pytest.fixture
+def student(db):
+    return User.objects.create_user(username='listener', email='listener@test.com', password='x')
+
+
+def _event(event_id, user_id):
+    return {
+        'id': event_id, 'user_id': user_id, 'title': f'Aviso {event_id}', 'body': '', 'priority': 'normal',
+        'activity': None, 'campaign': None, 'created_at': None,
+    }
+
+
+@async_to_sync
+async def _read(stream, count):
+    frames = []
+    try:
+        for _ in range(count):
+            frames.append(await stream.__anext__())
+    except StopAsyncIteration:
+        pass
+    finally:
+        await stream.aclose()
+    return frames
+
+
+class TestEventStream:
+    """Test the per-connection event generator"""
+
+    def test_heartbeat_when_idle(self, hub):
+        frames = _read(event_stream(1, heartbeat=0.01), 3)
+        assert frames == ['retry: 3000\n\n', ': heartbeat\n\n', ': heartbeat\n\n']
+        assert hub.connection_count() == 0
+
+    def test_replays_from_last_event_id(self, hub, student):
+        seen = Notification.objects.create(user=student, title='Vista', body='b', channel='app', status='read')
+        missed = [
+            Notification.objects.create(user=student, title=f'Nueva {i}', body='b', channel='app', status='sent')
+            for i in range(2)
+        ]
+        Notification.objects.create(user=student, title='Correo', body='b', channel='email')
+
+        frames = _read(event_stream(student.id, last_id=seen.id, heartbeat=0.01), 4)
+
+        assert frames[1].startswith(f'id: {missed[0].id}\nevent: notification\n')
+        assert frames[2].startswith(f'id: {missed[1].id}\n')
+        assert 'Nueva 1' in frames[2]
+        assert frames[3] == ': heartbeat\n\n'
+
+    def test_live_events_skip_already_sent_ids(self, hub):
+        @async_to_sync
+        async def scenario():
+            stream = event_stream(7, heartbeat=0.05)
+            await stream.__anext__()
+            # The same row published in-process and by the poller, plus another user's
+            hub.publish([_event(6, 7), _event(6, 7), _event(9, 8)])
+            try:
+                return await stream.__anext__(), await stream.__anext__()
+            finally:
+                await stream.aclose()
+
+        live, idle = scenario()
+        assert live.startswith('id: 6\n')
+        assert idle == ': heartbeat\n\n'
+
+    def test_slow_consumer_is_disconnected(self, hub):
+        @async_to_sync
+        async def scenario():
+            stream = event_stream(3, heartbeat=1)
+            await stream.__anext__()
+            hub.publish([_event(i, 3) for i in range(1, STREAM_QUEUE_SIZE + 10)])
+            await asyncio.sleep(0)
+            frames = []
+            async for frame in stream:
+                frames.append(frame)
+            return frames
+
+        frames = scenario()
+        # The stream ends so the client reconnects and replays from its last id
+        assert len(frames) == STREAM_QUEUE_SIZE
+        assert frames[-1].startswith(f'id: {STREAM_QUEUE_SIZE}\n')
+        assert hub.connection_count() == 0
+
+
+class TestNotificationHub:
+    """Test the per-process fan-out"""
+
+    def test_poll_picks_up_rows_from_other_processes(self, hub, student):
+        @async_to_sync
+        async def scenario():
+            stream = event_stream(student.id, heartbeat=0.05)
+            await stream.__anext__()
+            first = await sync_to_async(hub.poll_once)()
+            notification = await sync_to_async(Notification.objects.create)(
+                user=student, title='Otro worker', body='b', channel='app', status='sent'
+            )
+            await sync_to_async(Notification.objects.create)(user=student, title='Correo', body='b', channel='email')
+            second = await sync_to_async(hub.poll_once)()
+            try:
+                return first, second, notification.id, await stream.__anext__()
+            finally:
+                await stream.aclose()
+
+        first, second, notification_id, frame = scenario()
+        assert (first, second) == (0, 1)
+        assert frame.startswith(f'id: {notification_id}\n')
+
+    def test_poll_picks_up_released_rows_with_lower_ids(self, hub, student):
+        @async_to_sync
+        async def scenario():
+            stream = event_stream(student.id, heartbeat=0.05)
+            await stream.__anext__()
+            held = await sync_to_async(Notification.objects.create)(
+                user=student, title='En espera', body='b', channel='app', status='scheduled'
+            )
+            await sync_to_async(hub.poll_once)()
+            newer = await sync_to_async(Notification.objects.create)(
+                user=student, title='Nueva', body='b', channel='app', status='sent'
+            )
+            first = await sync_to_async(hub.poll_once)()
+            held.status = 'sent'
+            await sync_to_async(held.save)(update_fields=['status', 'updated_at'])
+            second = await sync_to_async(hub.poll_once)()
+            try:
+                return first, second, newer.id, held.id, await stream.__anext__(), await stream.__anext__()
+            finally:
+                await stream.aclose()
+
+        first, second, newer_id, held_id, frame1, frame2 = scenario()
+        # The overlap re-reads the first row but does not publish it again
+        assert (first, second) == (1, 1)
+        assert frame1.startswith(f'id: {newer_id}\n')
+        assert frame2.startswith(f'id: {held_id}\n')
+        assert held_id < newer_id
+
+    def test_committed_notifications_are_published(self, hub, student, django_capture_on_commit_callbacks):
+        @async_to_sync
+        async def scenario():
+            stream = event_stream(student.id, heartbeat=0.05)
+            await stream.__anext__()
+
+            def create():
+                with django_capture_on_commit_callbacks(execute=True):
+                    notification = Notification.objects.create(
+                        user=student, title='Al instante', body='b', channel='app', status='sent'
+                    )
+                    track_unread_notifications([notification])
+                return notification
+
+            notification = await sync_to_async(create)()
+            try:
+                return notification.id, await stream.__anext__()
+            finally:
+                await stream.aclose()
+
+        notification_id, frame = scenario()
+        assert frame.startswith(f'id: {notification_id}\n')
+        assert 'Al instante' in frame
+
+
+@pytest.mark.django_db
+class TestStreamEndpoint:
+    """Test the SSE endpoint"""
+
+    def test_requires_authentication(self):
+        response = Client().get('/api/notifications/stream/')
+        assert response.status_code == 401
+
+    def test_streams_event_source(self, hub, student):
+        client = Client()
+        client.force_login(student)
+        response = client.get('/api/notifications/stream/', HTTP_LAST_EVENT_ID='12')
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'text/event-stream'
+        assert response['Cache-Control'] == 'no-cache'
+        assert response.streaming
+
+    def test_benchmark_reports_connections(self):
+        out = io.StringIO()
+        call_command('benchmark_notification_stream', connections=50, poll_every=10, stdout=out)
+        output = out.getvalue()
+        assert 'Idle streams: 50' in output
+        assert 'Polling every 10s: 5.0 req/s' in output
@@ -0,0 +1,926 @@
+"""
+Tests for notifications triggered by activity changes and the outbox dispatcher
+"""
+import io
+import json
+import smtplib
+
+import pytest
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
+from rest_framework.test import APIClient
+from actividades.models import (
+    Activity,
+    ArchivedNotification,
+    ActivityEnrollment,
+    Campaign,
+    Notification,
+    NotificationDeliveryLog,
+    NotificationPreference,
+    UserProfile,
+    enqueue_activity_change_notifications,
+    fan_out_campaign,
+)
+from butifarra.actividades.channels import ADAPTERS, LoopbackTransport, TransientError, get_adapter, send_email_batch
+from butifarra.actividades.delivery import dispatch_batch
+from butifarra.actividades.serializers import NotificationListSerializer
+
+
+class FlakyBackend(LocmemBackend):
+    """Locmem backend that counts sessions and can drop or reject messages."""
+    opens = 0
+    disconnect_once = False
+    rejected = set()
+    unreachable = False
+
+    def open(self):
+        if FlakyBackend.unreachable:
+            raise ConnectionRefusedError('SMTP caído')
+        FlakyBackend.opens += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if FlakyBackend.disconnect_once:
+                FlakyBackend.disconnect_once = False
+                raise smtplib.SMTPServerDisconnected('Conexión cerrada')
+            if message.to[0] in FlakyBackend.rejected:
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b'No existe')})
+        return super().send_messages(messages)
+
+
+@pytest.fixture
+def flaky_backend(settings):
+    settings.EMAIL_BACKEND = f'{__name__}.FlakyBackend'
+    FlakyBackend.opens = 0
+    FlakyBackend.disconnect_once = False
+    FlakyBackend.rejected = set()
+    FlakyBackend.unreachable = False
+    return FlakyBackend
+
+
+@pytest.fixture
+def admin_user(db):
+    return User.objects.create_user(
+        username='admin',
+        email='admin@test.com',
+        password='admin123',
+        is_staff=True,
+        is_superuser=True
+    )
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def activity(db, admin_user):
+    start = timezone.now() + timedelta(days=2)
+    return Activity.objects.create(
+        title='Danza',
+        category='CULTURA',
+        start=start,
+        end=start + timedelta(hours=1),
+        capacity=100,
+        location='Auditorio',
+        created_by=admin_user
+    )
+
+
+def _enroll_students(activity, count, offset=0):
+    users = [
+        User.objects.create_user(username=f'student{offset + i}', email=f's{offset + i}@test.com', password='x')
+        for i in range(count)
+    ]
+    ActivityEnrollment.objects.bulk_create([ActivityEnrollment(user=u, activity=activity) for u in users])
+    return users
+
+
+@pytest.mark.django_db
+class TestActivityChangeNotifications:
+    """Test enqueue_activity_change_notifications"""
+
+    CHANGES = {'location': {'old': 'Auditorio', 'new': 'Coliseo'}}
+
+    def test_notifies_each_recipient_on_enabled_channels(self, activity):
+        users = _enroll_students(activity, 2)
+        NotificationPreference.objects.filter(user=users[1]).update(email_enabled=False)
+
+        enqueue_activity_change_notifications(activity, self.CHANGES)
+
+        assert set(Notification.objects.filter(user=users[0]).values_list('channel', flat=True)) == {'app', 'email'}
+        assert set(Notification.objects.filter(user=users[1]).values_list('channel', flat=True)) == {'app'}
+
+    def test_recent_duplicate_is_skipped(self, activity):
+        users = _enroll_students(activity, 2)
+        enqueue_activity_change_notifications(activity, self.CHANGES)
+        Notification.objects.filter(user=users[1]).delete()
+
+        enqueue_activity_change_notifications(activity, self.CHANGES)
+
+        assert Notification.objects.filter(user=users[0]).count() == 2
+        assert Notification.objects.filter(user=users[1]).count() == 2
+
+    def test_dedupe_key_covers_change_set_and_window(self, activity, settings, monkeypatch):
+        users = _enroll_students(activity, 1)
+        created = enqueue_activity_change_notifications(activity, self.CHANGES)
+        assert [n.user_id for n in created] == [users[0].id] and created[0].pk is not None
+
+        # A different change in the same window still notifies
+        enqueue_activity_change_notifications(activity, {'location': {'old': 'Coliseo', 'new': 'Cancha'}})
+        assert Notification.objects.filter(user=users[0], channel='app').count() == 2
+
+        # The same change once the window has rolled over notifies again
+        later = timezone.now() + timedelta(minutes=settings.NOTIFICATION_DEDUPE_WINDOW_MINUTES)
+        monkeypatch.setattr(timezone, 'now', lambda: later)
+        assert len(enqueue_activity_change_notifications(activity, self.CHANGES)) == 1
+        assert Notification.objects.filter(user=users[0], channel='app').count() == 3
+
+    def test_query_count_is_independent_of_recipients(self, activity, django_assert_num_queries):
+        _enroll_students(activity, 3)
+        with django_assert_num_queries(4):
+            enqueue_activity_change_notifications(activity, self.CHANGES)
+
+        Notification.objects.all().delete()
+        _enroll_students(activity, 30, offset=3)
+        with django_assert_num_queries(4):
+            enqueue_activity_change_notifications(activity, self.CHANGES)
+        assert Notification.objects.filter(channel='app').count() == 33
+
+    def test_emails_are_left_in_the_outbox(self, activity):
+        _enroll_students(activity, 2)
+        enqueue_activity_change_notifications(activity, self.CHANGES)
+        assert len(mail.outbox) == 0
+        assert Notification.objects.filter(channel='email', status='pending').count() == 2
+
+
+@pytest.mark.django_db
+class TestOutboxDispatcher:
+    """Test the dispatch_notifications worker"""
+
+    def test_broadcast_only_queues_emails(self, api_client, admin_user):
+        User.objects.create_user(username='student', email='student@test.com', password='x')
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.post('/api/notifications/broadcast/', {'name': 'Aviso', 'message': 'Hola'}, format='json')
+        assert response.status_code == 201
+        assert response.data['email_queue'] == 2
+        assert len(mail.outbox) == 0
+        assert Notification.objects.filter(channel='email', status='pending').count() == 2
+
+    def test_dispatch_sends_and_logs(self, api_client, admin_user):
+        User.objects.create_user(username='student', email='student@test.com', password='x')
+        api_client.force_authenticate(user=admin_user)
+        api_client.post('/api/notifications/broadcast/', {'name': 'Aviso', 'message': 'Hola'}, format='json')
+
+        out = io.StringIO()
+        call_command('dispatch_notifications', once=True, batch_size=1, stdout=out)
+
+        assert 'Done: 2 notifications processed' in out.getvalue()
+        assert sorted(m.to[0] for m in mail.outbox) == ['admin@test.com', 'student@test.com']
+        assert not Notification.objects.filter(channel='email').exclude(status='sent').exists()
+        assert NotificationDeliveryLog.objects.filter(status='success').count() == 2
+        assert Campaign.objects.get().emails_sent == 2
+
+    def test_batch_writes_are_constant(self, admin_user, django_assert_num_queries):
+        campaign = Campaign.objects.create(name='Aviso', message='m', created_by=admin_user)
+        students = _enroll_students(Activity.objects.create(
+            title='Yoga', category='CULTURA', start=timezone.now(), end=timezone.now() + timedelta(hours=1),
+            capacity=50, location='Sala', created_by=admin_user,
+        ), 30)
+        Notification.objects.bulk_create([
+            Notification(user=u, campaign=campaign, title='t', body='b', channel='email') for u in students
+        ])
+        User.objects.filter(pk=students[0].pk).update(email='')
+
+        # Savepoint pair, two claims, preferences, one bulk UPDATE, one INSERT of logs, two counter UPDATEs
+        with django_assert_num_queries(9):
+            assert dispatch_batch(batch_size=50) == 30
+
+        assert len(mail.outbox) == 29
+        assert NotificationDeliveryLog.objects.filter(status='success').count() == 29
+        assert Notification.objects.get(user=students[0]).status == 'failed'
+        assert Campaign.objects.get().emails_sent == 29
+
+    def test_failure_is_logged_and_not_retried(self, admin_user):
+        user = User.objects.create_user(username='noemail', password='x')
+        notif = Notification.objects.create(user=user, title='t', body='b', channel='email')
+
+        call_command('dispatch_notifications', once=True, stdout=io.StringIO())
+        call_command('dispatch_notifications', once=True, stdout=io.StringIO())
+
+        notif.refresh_from_db()
+        assert notif.status == 'failed'
+        log = NotificationDeliveryLog.objects.get(notification=notif)
+        assert log.status == 'error'
+        assert 'sin email' in log.detail
+
+    def test_future_scheduled_notifications_wait(self, admin_user):
+        later = Notification.objects.create(
+            user=admin_user, title='t', body='b', channel='email',
+            status='scheduled', scheduled_for=timezone.now() + timedelta(hours=1)
+        )
+        due = Notification.objects.create(
+            user=admin_user, title='t', body='b', channel='email',
+            status='scheduled', scheduled_for=timezone.now() - timedelta(minutes=1)
+        )
+
+        call_command('dispatch_notifications', once=True, stdout=io.StringIO())
+
+        later.refresh_from_db()
+        due.refresh_from_db()
+        assert later.status == 'scheduled'
+        assert due.status == 'sent'
+
+
+@pytest.mark.django_db
+class TestScheduledDispatch:
+    """Test scheduled release, quiet hours and rate limiting in the dispatcher"""
+
+    @pytest.fixture
+    def student(self, db):
+        return User.objects.create_user(username='night', email='night@test.com', password='x')
+
+    def _at(self, hour, minute=0, days=0):
+        moment = timezone.localtime().replace(hour=hour, minute=minute, second=0, microsecond=0)
+        return moment + timedelta(days=days)
+
+    def test_quiet_until(self, student):
+        prefs = student.notification_preferences
+        prefs.quiet_hours_start, prefs.quiet_hours_end = self._at(22).time(), self._at(7).time()
+
+        assert prefs.quiet_until(self._at(23, 30)) == self._at(7, days=1)
+        assert prefs.quiet_until(self._at(5)) == self._at(7)
+        assert prefs.quiet_until(self._at(12)) is None
+
+        prefs.quiet_hours_start, prefs.quiet_hours_end = self._at(13).time(), self._at(15).time()
+        assert prefs.quiet_until(self._at(14)) == self._at(15)
+        assert prefs.quiet_until(self._at(15)) is None
+
+    def test_scheduled_campaign_is_released_when_due(self, api_client, admin_user, student):
+        api_client.force_authenticate(user=admin_user)
+        later = timezone.localtime() + timedelta(days=1)
+        api_client.post('/api/notifications/broadcast/', {
+            'name': 'Aviso', 'message': 'Hola',
+            'scheduleDate': later.strftime('%Y-%m-%d'), 'scheduleTime': later.strftime('%H:%M'),
+        }, format='json')
+
+        assert dispatch_batch() == 0
+        api_client.force_authenticate(user=student)
+        assert api_client.get('/api/notifications/').data == []
+
+        dispatch_batch(now=later + timedelta(minutes=1))
+
+        assert not Notification.objects.filter(status='scheduled').exists()
+        assert len(mail.outbox) == 2
+        assert api_client.get('/api/notifications/unread-count/').data['unread'] == 1
+        campaign = Campaign.objects.get()
+        assert (campaign.app_sent, campaign.emails_sent) == (2, 2)
+
+    def test_quiet_hours_defer_to_end_of_window(self, student):
+        NotificationPreference.objects.filter(user=student).update(
+            quiet_hours_start=self._at(22).time(), quiet_hours_end=self._at(7).time()
+        )
+        normal = Notification.objects.create(user=student, title='t', body='b', channel='email')
+        urgent = Notification.objects.create(user=student, title='t', body='b', channel='email', priority='high')
+
+        assert dispatch_batch(now=self._at(23)) == 2
+
+        normal.refresh_from_db()
+        urgent.refresh_from_db()
+        assert (normal.status, normal.scheduled_for) == ('scheduled', self._at(7, days=1))
+        assert urgent.status == 'sent'
+
+        dispatch_batch(now=self._at(7, days=1))
+        normal.refresh_from_db()
+        assert normal.status == 'sent'
+
+    def test_due_scheduled_rows_go_first(self, student):
+        pending = Notification.objects.create(user=student, title='t', body='b', channel='email')
+        overdue = Notification.objects.create(
+            user=student, title='t', body='b', channel='email',
+            status='scheduled', scheduled_for=timezone.now() - timedelta(hours=1)
+        )
+
+        dispatch_batch(batch_size=1)
+
+        pending.refresh_from_db()
+        overdue.refresh_from_db()
+        assert (overdue.status, pending.status) == ('sent', 'pending')
+
+    def test_rate_limit_spreads_batches(self, student, monkeypatch):
+        from butifarra.actividades.management.commands import dispatch_notifications
+
+        pauses = []
+        monkeypatch.setattr(dispatch_notifications.time, 'sleep', pauses.append)
+        for _ in range(3):
+            Notification.objects.create(user=student, title='t', body='b', channel='email')
+
+        call_command('dispatch_notifications', once=True, batch_size=2, rate=60, stdout=io.StringIO())
+
+        assert len(mail.outbox) == 3
+        assert len(pauses) == 2
+        assert 1.5 < pauses[0] <= 2
+        assert 0.5 < pauses[1] <= 1
+
+    def test_rate_limit_ignores_released_and_deferred_rows(self, student, monkeypatch):
+        from butifarra.actividades.management.commands import dispatch_notifications
+
+        pauses = []
+        monkeypatch.setattr(dispatch_notifications.time, 'sleep', pauses.append)
+        past = timezone.now() - timedelta(minutes=1)
+        for _ in range(3):
+            Notification.objects.create(
+                user=student, title='t', body='b', channel='app', status='scheduled', scheduled_for=past
+            )
+        Notification.objects.create(user=student, title='t', body='b', channel='email')
+
+        call_command('dispatch_notifications', once=True, batch_size=4, rate=60, stdout=io.StringIO())
+
+        # Only the email paces the worker (one second at 60/min), not the three released in-app rows
+        assert len(pauses) == 1
+        assert 0.5 < pauses[0] <= 1
+
+
+@pytest.mark.django_db
+class TestCampaignCounters:
+    """Test incremental campaign counters and their reconciliation"""
+
+    COUNTERS = ('total_recipients', 'app_sent', 'emails_sent', 'emails_failed', 'app_read', 'emails_read')
+
+    def _counters(self, campaign):
+        campaign.refresh_from_db()
+        return tuple(getattr(campaign, field) for field in self.COUNTERS)
+
+    def test_counters_follow_notification_lifecycle(self, api_client, admin_user):
+        student = User.objects.create_user(username='student', email='student@test.com', password='x')
+        User.objects.create_user(username='noemail', password='x')
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.post('/api/notifications/broadcast/', {'name': 'Aviso', 'message': 'Hola'}, format='json')
+        campaign = Campaign.objects.get(pk=response.data['campaign_id'])
+        assert response.data['app_sent'] == 3
+        assert self._counters(campaign) == (3, 3, 0, 0, 0, 0)
+
+        dispatch_batch()
+        assert self._counters(campaign) == (3, 3, 2, 1, 0, 0)
+
+        api_client.force_authenticate(user=student)
+        api_client.post('/api/notifications/mark-all-read/')
+        single = Notification.objects.get(user=admin_user, channel='app')
+        api_client.force_authenticate(user=admin_user)
+        api_client.post(f'/api/notifications/{single.pk}/read/')
+        assert self._counters(campaign) == (3, 3, 2, 1, 2, 1)
+
+        expected = self._counters(campaign)
+        Campaign.objects.filter(pk=campaign.pk).update(app_sent=0, app_read=0, total_recipients=99)
+        out = io.StringIO()
+        call_command('reconcile_campaign_metrics', stdout=out)
+        assert 'Reconciled 1 campaigns (1 had drifted)' in out.getvalue()
+        assert self._counters(campaign) == expected
+
+    def test_reconcile_is_one_aggregate(self, admin_user, django_assert_num_queries):
+        campaigns = [Campaign.objects.create(name=f'C{i}', message='m', created_by=admin_user) for i in range(3)]
+        for campaign in campaigns:
+            Notification.objects.create(user=admin_user, campaign=campaign, title='t', body='b', channel='app', status='read')
+
+        # Live and archived aggregates, then the bulk update
+        with django_assert_num_queries(3):
+            Campaign.reconcile(campaigns)
+
+        assert self._counters(campaigns[0]) == (1, 1, 0, 0, 1, 0)
+
+    def test_serializer_reports_read_rate(self, api_client, admin_user):
+        Campaign.objects.create(
+            name='Aviso', message='m', created_by=admin_user, app_sent=4, app_read=1, emails_sent=0
+        )
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.get('/api/notifications/campaigns/')
+        assert response.data[0]['read_rate'] == {'app': 0.25, 'email': None}
+
+
+@pytest.mark.django_db
+class TestNotificationList:
+    """Test the slim, filterable and paginated notification listing"""
+
+    @pytest.fixture
+    def student(self, db):
+        return User.objects.create_user(username='inbox', email='inbox@test.com', password='x')
+
+    @pytest.fixture
+    def notifications(self, student):
+        rows = []
+        for i in range(6):
+            n = Notification.objects.create(
+                user=student, title=f'N{i}', body='x' * 500, channel='app' if i % 2 else 'email',
+                status='read' if i < 2 else 'sent'
+            )
+            NotificationDeliveryLog.objects.create(notification=n, channel=n.channel, status='success')
+            rows.append(n)
+        return rows
+
+    def test_list_is_slim_and_one_query(self, api_client, student, notifications, django_assert_num_queries):
+        api_client.force_authenticate(user=student)
+        with django_assert_num_queries(1):
+            response = api_client.get('/api/notifications/')
+        assert len(response.data) == 6
+        assert 'delivery_logs' not in response.data[0]
+        assert len(response.data[0]['body']) == NotificationListSerializer.LIST_BODY_CHARS
+
+    def test_detail_prefetches_logs(self, api_client, student, notifications, django_assert_num_queries):
+        api_client.force_authenticate(user=student)
+        with django_assert_num_queries(2):
+            response = api_client.get(f'/api/notifications/{notifications[0].pk}/')
+        assert len(response.data['body']) == 500
+        assert len(response.data['delivery_logs']) == 1
+
+    def test_filters_by_status_and_channel(self, api_client, student, notifications):
+        api_client.force_authenticate(user=student)
+        response = api_client.get('/api/notifications/?status=sent&channel=app')
+        assert {n['id'] for n in response.data} == {notifications[3].pk, notifications[5].pk}
+        assert api_client.get('/api/notifications/?status=nope').status_code == 400
+
+    def test_cursor_pagination_is_opt_in(self, api_client, student, notifications):
+        api_client.force_authenticate(user=student)
+        first = api_client.get('/api/notifications/?page_size=4')
+        assert [n['id'] for n in first.data['results']] == [n.pk for n in reversed(notifications)][:4]
+        second = api_client.get(first.data['next'])
+        assert [n['id'] for n in second.data['results']] == [notifications[1].pk, notifications[0].pk]
+        assert second.data['next'] is None
+
+
+@pytest.mark.django_db
+class TestRetention:
+    """Test archive_notifications and the archived history flag"""
+
+    @pytest.fixture
+    def student(self, db):
+        return User.objects.create_user(username='history', email='history@test.com', password='x')
+
+    def _old(self, user, days=200, **fields):
+        notification = Notification.objects.create(user=user, title='t', body='b', **fields)
+        Notification.objects.filter(pk=notification.pk).update(created_at=timezone.now() - timedelta(days=days))
+        return notification
+
+    def test_moves_old_read_and_sent_rows_in_batches(self, student):
+        old = [self._old(student, channel='app', status='read') for _ in range(4)]
+        NotificationDeliveryLog.objects.create(notification=old[0], channel='app', status='success', detail='ok')
+        self._old(student, channel='email', status='sent')
+        kept = [
+            self._old(student, channel='email', status='failed'),
+            self._old(student, channel='email', status='pending'),
+            self._old(student, days=10, channel='app', status='read'),
+        ]
+
+        out = io.StringIO()
+        call_command('archive_notifications', batch_size=2, stdout=out)
+
+        assert out.getvalue().count('Archived 2 notifications') == 2
+        assert 'Done: 5 notifications archived' in out.getvalue()
+        assert set(Notification.objects.values_list('pk', flat=True)) == {n.pk for n in kept}
+        archived = ArchivedNotification.objects.get(pk=old[0].pk)
+        assert archived.status == 'read'
+        assert [log['detail'] for log in archived.delivery_logs] == ['ok']
+        assert not NotificationDeliveryLog.objects.exists()
+
+    def test_conflicting_archived_copy_keeps_live_row(self, student):
+        live = self._old(student, channel='app', status='read')
+        ArchivedNotification.objects.create(
+            id=live.pk, user=student, title='otra', body='b', channel='app', status='read',
+            created_at=timezone.now(), updated_at=timezone.now(),
+        )
+
+        with pytest.raises(CommandError, match=str(live.pk)):
+            call_command('archive_notifications', stdout=io.StringIO())
+
+        assert Notification.objects.filter(pk=live.pk).exists()
+        assert ArchivedNotification.objects.get(pk=live.pk).title == 'otra'
+
+    def test_dry_run_only_counts(self, student):
+        self._old(student, channel='app', status='read')
+        out = io.StringIO()
+        call_command('archive_notifications', dry_run=True, days=30, stdout=out)
+        assert '1 notifications older than 30 days would be archived' in out.getvalue()
+        assert Notification.objects.count() == 1
+
+    def test_archived_flag_lists_history(self, api_client, student):
+        old = self._old(student, channel='app', status='read')
+        recent = Notification.objects.create(user=student, title='t', body='b', channel='app', status='sent')
+        call_command('archive_notifications', stdout=io.StringIO())
+        api_client.force_authenticate(user=student)
+
+        live = api_client.get('/api/notifications/')
+        history = api_client.get('/api/notifications/?archived=1')
+
+        assert [n['id'] for n in live.data] == [recent.pk]
+        assert [n['id'] for n in history.data] == [old.pk]
+        assert history.data[0]['archived_at']
+
+    def test_unread_counter_and_campaign_counters_survive(
+        self, api_client, admin_user, student, django_capture_on_commit_callbacks
+    ):
+        campaign = Campaign.objects.create(name='Aviso', message='m', created_by=admin_user)
+        self._old(student, channel='app', status='sent', campaign=campaign)
+        Notification.objects.create(user=student, title='t', body='b', channel='app', status='read', campaign=campaign)
+        Campaign.reconcile()
+        api_client.force_authenticate(user=student)
+        assert api_client.get('/api/notifications/unread-count/').data['unread'] == 1
+
+        with django_capture_on_commit_callbacks(execute=True):
+            call_command('archive_notifications', stdout=io.StringIO())
+        Campaign.reconcile()
+
+        campaign.refresh_from_db()
+        assert (campaign.total_recipients, campaign.app_sent, campaign.app_read) == (1, 2, 1)
+        assert api_client.get('/api/notifications/unread-count/').data['unread'] == 0
+
+
+@pytest.mark.django_db
+class TestCampaignFanOut:
+    """Test the chunked broadcast fan-out"""
+
+    @pytest.fixture
+    def campaign(self, admin_user):
+        return Campaign.objects.create(name='Aviso', message='Hola', created_by=admin_user)
+
+    def test_inserts_in_bounded_batches(self, campaign):
+        for i in range(5):
+            User.objects.create_user(username=f'fan{i}', email=f'fan{i}@test.com', password='x')
+
+        with CaptureQueriesContext(connection) as ctx:
+            created = fan_out_campaign(campaign, User.objects.all(), ['email', 'app'], batch_size=4)
+
+        # 6 recipients x 2 channels, flushed every 4 rows once a recipient is complete
+        assert created == {'email': 6, 'app': 6}
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+        assert len(inserts) == 3
+        assert Notification.objects.filter(campaign=campaign).count() == 12
+
+    def test_respects_preferences_and_schedule(self, campaign, admin_user):
+        muted = User.objects.create_user(username='muted', email='muted@test.com', password='x')
+        NotificationPreference.objects.filter(user=muted).update(app_enabled=False)
+        NotificationPreference.objects.filter(user=admin_user).delete()
+        later = timezone.now() + timedelta(days=1)
+
+        created = fan_out_campaign(campaign, User.objects.all(), ['email', 'app'], schedule_at=later)
+
+        assert created == {'email': 2, 'app': 1}
+        assert not Notification.objects.filter(user=muted, channel='app').exists()
+        email = Notification.objects.get(user=muted, channel='email')
+        assert (email.status, email.scheduled_for) == ('scheduled', later)
+        assert Notification.objects.get(user=admin_user, channel='app').status == 'scheduled'
+
+    def test_benchmark_reports_peak_memory(self):
+        out = io.StringIO()
+        call_command('benchmark_campaign_fanout', recipients=50, batch_size=10, stdout=out)
+        output = out.getvalue()
+        assert 'Single batch: 100 notifications' in output
+        assert 'Chunked: 100 notifications' in output
+        assert not User.objects.filter(username__startswith='bench-fanout').exists()
+
+
+@pytest.mark.django_db
+class TestBatchedEmailSender:
+    """Test SMTP session reuse in send_email_batch"""
+
+    @pytest.fixture
+    def notifications(self, db):
+        users = [
+            User.objects.create_user(username=f'mail{i}', email=f'mail{i}@test.com', password='x')
+            for i in range(5)
+        ]
+        return list(
+            Notification.objects.bulk_create([
+                Notification(user=u, title='Aviso', body='Hola', channel='email') for u in users
+            ])
+        )
+
+    def test_one_session_per_chunk(self, flaky_backend, notifications):
+        results = send_email_batch(notifications, chunk_size=2)
+        assert flaky_backend.opens == 3
+        assert all(error is None for error in results.values())
+        assert len(mail.outbox) == 5
+
+    def test_reconnects_after_disconnect(self, flaky_backend, notifications):
+        flaky_backend.disconnect_once = True
+        results = send_email_batch(notifications, chunk_size=10)
+        assert flaky_backend.opens == 2
+        assert all(error is None for error in results.values())
+        assert len(mail.outbox) == 5
+
+    def test_rejected_recipient_fails_alone(self, flaky_backend, notifications):
+        flaky_backend.rejected = {'mail2@test.com'}
+        results = send_email_batch(notifications, chunk_size=10)
+        failed = [pk for pk, error in results.items() if error is not None]
+        assert failed == [notifications[2].pk]
+        assert flaky_backend.opens == 1
+        assert len(mail.outbox) == 4
+
+    def test_unreachable_server_keeps_emails_queued(self, flaky_backend, notifications):
+        flaky_backend.unreachable = True
+        call_command('dispatch_notifications', once=True, stdout=io.StringIO())
+        assert Notification.objects.filter(channel='email', status='pending').count() == 5
+        assert not NotificationDeliveryLog.objects.exists()
+
+    def test_benchmark_reports_sessions(self, db):
+        out = io.StringIO()
+        call_command('benchmark_email_dispatch', messages=20, chunk_size=10, stdout=out)
+        output = out.getvalue()
+        assert 'One connection per message' in output and '20 sessions' in output
+        assert 'Batched connection reuse' in output and '2 sessions' in output
+        assert not Notification.objects.exists()
+
+
+class FailingTransport:
+    """Transport whose provider answers every payload with ``error``."""
+    error = None
+
+    def __init__(self, channel=None, **options):
+        pass
+
+    def send(self, payloads):
+        return [self.error] * len(payloads)
+
+
+@pytest.mark.django_db
+class TestChannelAdapters:
+    """Test the push/SMS adapters, retries and the local transports"""
+
+    @pytest.fixture(autouse=True)
+    def loopback(self, monkeypatch):
+        monkeypatch.setattr(LoopbackTransport, 'outbox', [])
+        return LoopbackTransport.outbox
+
+    @pytest.fixture
+    def student(self, db):
+        user = User.objects.create_user(username='phone', email='phone@test.com', password='x')
+        UserProfile.objects.filter(user=user).update(phone_number='3001234567')
+        return user
+
+    def test_registry_covers_outgoing_channels(self):
+        assert set(ADAPTERS) == {'email', 'push', 'sms'}
+        assert get_adapter('push', concurrency=2).concurrency == 2
+        assert isinstance(get_adapter('sms').transport, LoopbackTransport)
+
+    def test_preferences_enable_push_and_sms(self, activity, student):
+        NotificationPreference.objects.filter(user=student).update(email_enabled=False, push_enabled=True, sms_enabled=True)
+        ActivityEnrollment.objects.create(activity=activity, user=student)
+        enqueue_activity_change_notifications(activity, TestActivityChangeNotifications.CHANGES)
+        channels = set(Notification.objects.filter(user=student).values_list('channel', flat=True))
+        assert channels == {'app', 'push', 'sms'}
+        assert not Notification.objects.filter(user=student, channel__in=['push', 'sms']).exclude(status='pending').exists()
+
+    def test_push_and_sms_are_delivered_through_transport(self, student, loopback):
+        push = Notification.objects.create(user=student, title='Aviso', body='Hola', channel='push')
+        sms = Notification.objects.create(user=student, title='Aviso', body='x' * 300, channel='sms')
+
+        assert dispatch_batch() == 2
+
+        assert {channel for channel, _ in loopback} == {'push', 'sms'}
+        payload = next(p for channel, p in loopback if channel == 'sms')
+        assert payload['to'] == '3001234567' and len(payload['body']) == 160
+        assert Notification.objects.filter(pk__in=[push.pk, sms.pk], status='sent').count() == 2
+        assert set(NotificationDeliveryLog.objects.values_list('detail', flat=True)) == {
+            'Push enviado correctamente', 'SMS enviado correctamente',
+        }
+
+    def test_sms_without_phone_fails(self, admin_user, loopback):
+        notif = Notification.objects.create(user=admin_user, title='t', body='b', channel='sms')
+        dispatch_batch()
+        notif.refresh_from_db()
+        assert notif.status == 'failed'
+        assert NotificationDeliveryLog.objects.get(notification=notif).detail == 'Error al enviar: Usuario sin celular'
+        assert loopback == []
+
+    def test_unconfigured_transport_fails_rows(self, student, settings, loopback):
+        settings.NOTIFICATION_CHANNELS = {'push': {'TRANSPORT': ''}}
+        notif = Notification.objects.create(user=student, title='t', body='b', channel='push')
+
+        dispatch_batch()
+
+        notif.refresh_from_db()
+        assert notif.status == 'failed'
+        log = NotificationDeliveryLog.objects.get(notification=notif)
+        assert log.detail == 'Error al enviar: Transporte Push no configurado'
+        assert loopback == []
+
+    def test_transient_errors_back_off_then_fail(self, student, settings):
+        FailingTransport.error = TransientError('Proveedor saturado')
+        settings.NOTIFICATION_CHANNELS = {'push': {
+            'TRANSPORT': f'{__name__}.FailingTransport', 'MAX_ATTEMPTS': 3, 'RETRY_BACKOFF': 10,
+        }}
+        notif = Notification.objects.create(user=student, title='t', body='b', channel='push')
+        now = timezone.now()
+
+        dispatch_batch(now=now)
+        notif.refresh_from_db()
+        assert notif.status == 'scheduled' and notif.scheduled_for == now + timedelta(seconds=10)
+        dispatch_batch(now=now + timedelta(seconds=5))
+        assert Notification.objects.get(pk=notif.pk).metadata['attempts'] == 1
+        dispatch_batch(now=now + timedelta(seconds=10))
+        notif.refresh_from_db()
+        assert notif.scheduled_for == now + timedelta(seconds=30)
+        dispatch_batch(now=now + timedelta(seconds=30))
+
+        notif.refresh_from_db()
+        assert notif.status == 'failed' and notif.metadata['attempts'] == 3
+        logs = list(NotificationDeliveryLog.objects.filter(notification=notif).order_by('id'))
+        assert [log.status for log in logs] == ['retry', 'retry', 'error']
+        assert logs[0].detail == 'Intento 1 fallido: Proveedor saturado. Reintento en 10s'
+
+    def test_permanent_errors_are_not_retried(self, student, settings):
+        FailingTransport.error = ValueError('Token inválido')
+        settings.NOTIFICATION_CHANNELS = {'push': {'TRANSPORT': f'{__name__}.FailingTransport'}}
+        notif = Notification.objects.create(user=student, title='t', body='b', channel='push')
+        dispatch_batch()
+        notif.refresh_from_db()
+        assert notif.status == 'failed'
+        assert NotificationDeliveryLog.objects.get(notification=notif).status == 'error'
+
+    def test_file_transport_appends_json_lines(self, student, settings, tmp_path):
+        settings.NOTIFICATION_CHANNELS = {'push': {
+            'TRANSPORT': 'butifarra.actividades.channels.FileTransport', 'OPTIONS': {'directory': str(tmp_path)},
+        }}
+        Notification.objects.bulk_create([
+            Notification(user=student, title=f'Aviso {i}', body='Hola', channel='push') for i in range(3)
+        ])
+        dispatch_batch()
+        lines = (tmp_path / 'push.jsonl').read_text(encoding='utf-8').splitlines()
+        assert [json.loads(line)['title'] for line in lines] == ['Aviso 0', 'Aviso 1', 'Aviso 2']
+
+    def test_benchmark_reports_throughput(self):
+        out = io.StringIO()
+        call_command('benchmark_channels', channel=['sms'], messages=400, latency=0.01, concurrency=4, stdout=out)
+        output = out.getvalue()
+        assert 'sms sequential: 400 sent' in output
+        assert 'sms 4 workers: 400 sent' in output
+        assert not Notification.objects.exists()
+
+
+@pytest.mark.django_db
+class TestMarkRead:
+    """Test mark-all-read and the bulk mark-read endpoint"""
+
+    @pytest.fixture
+    def student(self, db):
+        return User.objects.create_user(username='reader', email='reader@test.com', password='x')
+
+    def _notify(self, user, count, **kwargs):
+        kwargs.setdefault('channel', 'app')
+        kwargs.setdefault('status', 'sent')
+        return list(Notification.objects.bulk_create([
+            Notification(user=user, title=f'Aviso {i}', body='Hola', **kwargs) for i in range(count)
+        ]))
+
+    def test_mark_all_read_is_one_update(self, api_client, student, admin_user, django_assert_num_queries):
+        self._notify(student, 5)
+        other = self._notify(admin_user, 1)[0]
+        api_client.force_authenticate(user=student)
+
+        # SELECT ... FOR UPDATE and the UPDATE, inside a savepoint (the test already runs in a transaction)
+        with django_assert_num_queries(4):
+            response = api_client.post('/api/notifications/mark-all-read/')
+
+        assert response.data == {'marked': 5}
+        assert set(Notification.objects.filter(user=student).values_list('status', flat=True)) == {'read'}
+        assert not Notification.objects.filter(user=student, read_at__isnull=True).exists()
+        other.refresh_from_db()
+        assert other.status == 'sent'
+
+    def test_queued_emails_are_not_marked(self, api_client, student):
+        self._notify(student, 1)
+        queued = self._notify(student, 1, channel='email', status='pending')[0]
+        api_client.force_authenticate(user=student)
+
+        response = api_client.post('/api/notifications/mark-all-read/')
+
+        assert response.data == {'marked': 1}
+        queued.refresh_from_db()
+        assert queued.status == 'pending'
+
+    def test_mark_read_detail_keeps_undelivered_rows(self, api_client, student):
+        queued = self._notify(student, 1, channel='email', status='pending')[0]
+        failed = self._notify(student, 1, channel='email', status='failed')[0]
+        api_client.force_authenticate(user=student)
+
+        for notif in (queued, failed):
+            response = api_client.post(f'/api/notifications/{notif.id}/read/')
+            assert response.status_code == 409
+        queued.refresh_from_db()
+        failed.refresh_from_db()
+        assert (queued.status, failed.status) == ('pending', 'failed')
+
+        delivered = self._notify(student, 1)[0]
+        response = api_client.post(f'/api/notifications/{delivered.id}/read/')
+        assert response.data['status'] == 'read'
+
+    def test_mark_read_by_ids(self, api_client, student, admin_user):
+        notifs = self._notify(student, 3)
+        foreign = self._notify(admin_user, 1)[0]
+        api_client.force_authenticate(user=student)
+
+        response = api_client.post(
+            '/api/notifications/mark-read/', {'ids': [notifs[0].id, foreign.id]}, format='json'
+        )
+
+        assert response.data == {'marked': 1}
+        assert Notification.objects.filter(status='read').get().id == notifs[0].id
+
+    def test_mark_read_older_than(self, api_client, student):
+        old, new = self._notify(student, 2)
+        Notification.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=3))
+        api_client.force_authenticate(user=student)
+
+        before = (timezone.now() - timedelta(days=1)).isoformat()
+        response = api_client.post('/api/notifications/mark-read/', {'before': before}, format='json')
+
+        assert response.data == {'marked': 1}
+        old.refresh_from_db()
+        new.refresh_from_db()
+        assert (old.status, new.status) == ('read', 'sent')
+
+    @pytest.mark.parametrize('body', [{}, {'ids': 'x'}, {'ids': [True]}, {'before': 'ayer'}])
+    def test_mark_read_validation(self, api_client, student, body):
+        api_client.force_authenticate(user=student)
+        response = api_client.post('/api/notifications/mark-read/', body, format='json')
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestUnreadCount:
+    """Test the cached unread-count action"""
+
+    @pytest.fixture(autouse=True)
+    def shared_cache(self, settings, tmp_path):
+        # A file cache stands in for a shared backend (Redis/Memcached): counters are not cached on LocMem
+        settings.CACHES = {
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': str(tmp_path)}
+        }
+
+    @pytest.fixture
+    def student(self, db):
+        return User.objects.create_user(username='reader', email='reader@test.com', password='x')
+
+    def _unread(self, client):
+        response = client.get('/api/notifications/unread-count/')
+        assert response.status_code == 200
+        return response.data['unread']
+
+    def test_counts_unread_app_notifications(self, api_client, student, django_assert_num_queries):
+        Notification.objects.create(user=student, title='a', body='b', channel='app', status='sent')
+        Notification.objects.create(user=student, title='a', body='b', channel='app', status='read')
+        Notification.objects.create(user=student, title='a', body='b', channel='email', status='sent')
+        api_client.force_authenticate(user=student)
+
+        assert self._unread(api_client) == 1
+        with django_assert_num_queries(0):
+            assert self._unread(api_client) == 1
+
+    def test_broadcast_increments_cached_counter(self, api_client, admin_user, student, django_capture_on_commit_callbacks):
+        api_client.force_authenticate(user=student)
+        assert self._unread(api_client) == 0
+
+        api_client.force_authenticate(user=admin_user)
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.post('/api/notifications/broadcast/', {'name': 'Aviso', 'message': 'Hola'}, format='json')
+
+        api_client.force_authenticate(user=student)
+        assert self._unread(api_client) == 1
+
+    def test_activity_change_increments_cached_counter(self, api_client, activity, django_capture_on_commit_callbacks):
+        student = _enroll_students(activity, 1)[0]
+        api_client.force_authenticate(user=student)
+        assert self._unread(api_client) == 0
+
+        with django_capture_on_commit_callbacks(execute=True):
+            enqueue_activity_change_notifications(activity, TestActivityChangeNotifications.CHANGES)
+        assert self._unread(api_client) == 1
+
+    def test_mark_read_decrements_and_mark_all_resets(self, api_client, student):
+        notifs = [
+            Notification.objects.create(user=student, title=f'a{i}', body='b', channel='app', status='sent')
+            for i in range(3)
+        ]
+        api_client.force_authenticate(user=student)
+        assert self._unread(api_client) == 3
+
+        api_client.post(f'/api/notifications/{notifs[0].id}/read/')
+        assert self._unread(api_client) == 2
+
+        api_client.post('/api/notifications/mark-all-read/')
+        assert self._unread(api_client) == 0
+
+    def test_process_local_cache_counts_every_time(self, api_client, student, settings, django_assert_num_queries):
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        Notification.objects.create(user=student, title='a', body='b', channel='app', status='sent')
+        api_client.force_authenticate(user=student)
+
+        assert self._unread(api_client) == 1
+        with django_assert_num_queries(1):
+            assert self._unread(api_client) == 1
@@ -0,0 +1,158 @@
+"""
+Tests for keyset (cursor) pagination on activity and tournament listings
+"""
+import pytest
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from rest_framework.test import APIClient
+from actividades.models import Activity, Tournament
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def admin_user(db):
+    return User.objects.create_user(
+        username='admin',
+        email='admin@test.com',
+        password='admin123',
+        is_staff=True,
+        is_superuser=True
+    )
+
+
+@pytest.fixture
+def base_time():
+    return timezone.now().replace(microsecond=0) + timedelta(days=1)
+
+
+def _create_activity(admin_user, start, title='Activity'):
+    return Activity.objects.create(
+        title=title,
+        category='DEPORTE',
+        start=start,
+        end=start + timedelta(hours=1),
+        capacity=10,
+        created_by=admin_user
+    )
+
+
+def _walk(client, url):
+    """Follow ``next`` links and return every id served, in order."""
+    ids = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        ids.extend(item['id'] for item in response.data['results'])
+        url = response.data['next']
+    return ids
+
+
+@pytest.mark.django_db
+class TestActivityCursorPagination:
+    """Test keyset pagination of /api/actividades/"""
+
+    def test_list_without_cursor_params_is_not_paginated(self, api_client, admin_user, base_time):
+        _create_activity(admin_user, base_time)
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.get('/api/actividades/')
+        assert response.status_code == 200
+        assert isinstance(response.data, list)
+
+    def test_first_page_respects_page_size(self, api_client, admin_user, base_time):
+        for i in range(5):
+            _create_activity(admin_user, base_time + timedelta(hours=i))
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.get('/api/actividades/?page_size=2')
+        assert response.status_code == 200
+        assert len(response.data['results']) == 2
+        assert response.data['next'] is not None
+        assert response.data['previous'] is None
+
+    def test_walk_returns_every_row_once_in_start_order(self, api_client, admin_user, base_time):
+        # Several rows share the same start to exercise the id tiebreaker
+        activities = [
+            _create_activity(admin_user, base_time + timedelta(hours=i // 3))
+            for i in range(9)
+        ]
+        api_client.force_authenticate(user=admin_user)
+        ids = _walk(api_client, '/api/actividades/?page_size=2')
+
+        expected = [
+            a.id for a in sorted(activities, key=lambda a: (a.start, a.id), reverse=True)
+        ]
+        assert ids == expected
+
+    def test_inserts_during_walk_do_not_shift_pages(self, api_client, admin_user, base_time):
+        for i in range(4):
+            _create_activity(admin_user, base_time + timedelta(hours=i))
+        api_client.force_authenticate(user=admin_user)
+
+        first = api_client.get('/api/actividades/?page_size=2')
+        seen = [item['id'] for item in first.data['results']]
+        # A newer activity appears while the client is paging
+        _create_activity(admin_user, base_time + timedelta(days=5), title='Late insert')
+        second = api_client.get(first.data['next'])
+        seen.extend(item['id'] for item in second.data['results'])
+
+        assert len(seen) == len(set(seen)) == 4
+
+    def test_previous_link_returns_prior_page(self, api_client, admin_user, base_time):
+        for i in range(5):
+            _create_activity(admin_user, base_time + timedelta(hours=i))
+        api_client.force_authenticate(user=admin_user)
+
+        first = api_client.get('/api/actividades/?page_size=2')
+        second = api_client.get(first.data['next'])
+        back = api_client.get(second.data['previous'])
+
+        assert [i['id'] for i in back.data['results']] == [i['id'] for i in first.data['results']]
+
+    def test_page_size_is_capped(self, api_client, admin_user, base_time, settings):
+        settings.API_MAX_PAGE_SIZE = 3
+        for i in range(5):
+            _create_activity(admin_user, base_time + timedelta(hours=i))
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.get('/api/actividades/?page_size=100')
+        assert len(response.data['results']) == 3
+
+    def test_invalid_cursor_returns_404(self, api_client, admin_user):
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.get('/api/actividades/?cursor=not-a-cursor')
+        assert response.status_code == 404
+
+    def test_filters_apply_to_paginated_listing(self, api_client, admin_user, base_time):
+        _create_activity(admin_user, base_time)
+        other = _create_activity(admin_user, base_time + timedelta(hours=1))
+        other.category = 'CULTURA'
+        other.save()
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.get('/api/actividades/?category=CULTURA&page_size=10')
+        assert [item['id'] for item in response.data['results']] == [other.id]
+
+
+@pytest.mark.django_db
+class TestTournamentCursorPagination:
+    """Test keyset pagination of /api/torneos/"""
+
+    def test_walk_tournaments(self, api_client, admin_user, base_time):
+        tournaments = [
+            Tournament.objects.create(
+                name=f'Torneo {i}',
+                start=base_time + timedelta(days=i // 2),
+                end=base_time + timedelta(days=i // 2, hours=3),
+                created_by=admin_user
+            )
+            for i in range(5)
+        ]
+        api_client.force_login(admin_user)
+        ids = _walk(api_client, '/api/torneos/?page_size=2')
+
+        expected = [
+            t.id for t in sorted(tournaments, key=lambda t: (t.start, t.id), reverse=True)
+        ]
+        assert ids == expected
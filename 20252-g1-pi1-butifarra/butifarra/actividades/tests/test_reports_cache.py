@@ -0,0 +1,123 @@
+"""
+Tests for the versioned reports dashboard cache
+"""
+import pytest
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from rest_framework.test import APIClient
+from actividades.models import Activity, ActivityEnrollment
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def admin_user(db):
+    return User.objects.create_user(
+        username='admin',
+        email='admin@test.com',
+        password='admin123',
+        is_staff=True,
+        is_superuser=True
+    )
+
+
+@pytest.fixture
+def activity(db, admin_user):
+    start = timezone.now() + timedelta(days=1)
+    return Activity.objects.create(
+        title='Natación',
+        category='DEPORTE',
+        start=start,
+        end=start + timedelta(hours=1),
+        capacity=5,
+        created_by=admin_user
+    )
+
+
+@pytest.fixture
+def admin_client(api_client, admin_user):
+    api_client.force_authenticate(user=admin_user)
+    return api_client
+
+
+@pytest.mark.django_db
+class TestReportsCache:
+    """Test caching and invalidation of /api/reports/dashboard/"""
+
+    @pytest.fixture(autouse=True)
+    def shared_cache(self, settings, tmp_path):
+        # A file cache stands in for a shared backend (Redis/Memcached): reports are not cached on LocMem
+        settings.CACHES = {
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': str(tmp_path)}
+        }
+
+    def test_second_request_is_served_from_cache(self, admin_client, activity, django_assert_num_queries):
+        first = admin_client.get('/api/reports/dashboard/')
+        assert first['X-Cache'] == 'MISS'
+
+        with django_assert_num_queries(0):
+            second = admin_client.get('/api/reports/dashboard/')
+        assert second['X-Cache'] == 'HIT'
+        assert second.data['generated_at'] == first.data['generated_at']
+        assert second.data == first.data
+
+    def test_filters_are_cached_separately(self, admin_client, activity):
+        admin_client.get('/api/reports/dashboard/')
+        response = admin_client.get('/api/reports/dashboard/?activity_type=DEPORTE')
+        assert response['X-Cache'] == 'MISS'
+
+    def test_activity_type_order_is_normalized(self, admin_client, activity):
+        admin_client.get('/api/reports/dashboard/?activity_type=DEPORTE,CULTURA')
+        response = admin_client.get('/api/reports/dashboard/?activity_type=CULTURA,DEPORTE')
+        assert response['X-Cache'] == 'HIT'
+
+    def test_activity_save_invalidates(self, admin_client, activity, django_capture_on_commit_callbacks):
+        admin_client.get('/api/reports/dashboard/')
+        with django_capture_on_commit_callbacks(execute=True):
+            activity.status = 'cancelled'
+            activity.save()
+        assert admin_client.get('/api/reports/dashboard/')['X-Cache'] == 'MISS'
+
+    def test_enrollment_invalidates(self, admin_client, activity, django_capture_on_commit_callbacks):
+        student = User.objects.create_user(username='student', password='student123')
+        first = admin_client.get('/api/reports/dashboard/')
+        with django_capture_on_commit_callbacks(execute=True):
+            ActivityEnrollment.enroll(student, activity)
+        second = admin_client.get('/api/reports/dashboard/')
+        assert second['X-Cache'] == 'MISS'
+        assert second.data['enrollment_series'] != first.data['enrollment_series']
+
+    def test_signup_invalidates(self, admin_client, activity, django_capture_on_commit_callbacks):
+        admin_client.get('/api/reports/dashboard/')
+        with django_capture_on_commit_callbacks(execute=True):
+            User.objects.create_user(username='newcomer', password='x')
+        assert admin_client.get('/api/reports/dashboard/')['X-Cache'] == 'MISS'
+
+    def test_zero_timeout_disables_cache(self, admin_client, activity, settings):
+        settings.REPORTS_CACHE_TIMEOUT = 0
+        admin_client.get('/api/reports/dashboard/')
+        assert admin_client.get('/api/reports/dashboard/')['X-Cache'] == 'MISS'
+
+    def test_process_local_cache_is_not_used(self, admin_client, activity, settings):
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        admin_client.get('/api/reports/dashboard/')
+        assert admin_client.get('/api/reports/dashboard/')['X-Cache'] == 'MISS'
+
+    def test_stats_count_hits_and_misses(self, admin_client, activity):
+        admin_client.get('/api/reports/dashboard/')
+        admin_client.get('/api/reports/dashboard/')
+        admin_client.get('/api/reports/dashboard/')
+        response = admin_client.get('/api/reports/dashboard/cache-stats/')
+        assert response.status_code == 200
+        assert response.data['hits'] == 2
+        assert response.data['misses'] == 1
+
+    def test_stats_require_admin(self, api_client, db):
+        student = User.objects.create_user(username='student', password='student123')
+        api_client.force_authenticate(user=student)
+        response = api_client.get('/api/reports/dashboard/cache-stats/')
+        assert response.status_code == 403
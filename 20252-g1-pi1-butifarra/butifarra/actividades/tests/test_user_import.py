@@ -0,0 +1,156 @@
+"""
+Tests for the bulk user import (endpoint, command and import_users)
+"""
+import io
+import json
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from rest_framework.test import APIClient
+from actividades.models import NotificationPreference, UserProfile
+from butifarra.actividades.user_import import TooManyRows, import_users
+
+HEADER = 'username,email,phone_number,program,semester,role,password\n'
+
+
+def _csv(*rows):
+    return (HEADER + ''.join(row + '\n' for row in rows)).encode('utf-8')
+
+
+@pytest.fixture
+def admin_client(db):
+    admin = User.objects.create_user(username='admin', email='admin@test.com', password='x', is_staff=True)
+    client = APIClient()
+    client.force_login(admin)
+    return client
+
+
+@pytest.mark.django_db
+class TestImportUsers:
+    """Test validation, chunking and the error report"""
+
+    def test_creates_users_profiles_and_preferences(self):
+        data = _csv(
+            'ana,ana@test.com,300 123 4567,Ingeniería,3,PROFESSOR,Clave-segura-2025',
+            'beto,beto@test.com,3001234568,Diseño,1,,',
+        )
+        report = import_users(io.BytesIO(data), 'csv', workers=1)
+
+        assert report == {'total': 2, 'created': 2, 'errors': []}
+        ana = User.objects.get(username='ana')
+        assert ana.check_password('Clave-segura-2025')
+        assert (ana.profile.role, ana.profile.phone_number, ana.profile.semester) == ('PROFESSOR', '3001234567', 3)
+        assert not User.objects.get(username='beto').has_usable_password()
+        assert UserProfile.objects.get(user__username='beto').role == 'BENEFICIARY'
+        assert NotificationPreference.objects.filter(user__username__in=['ana', 'beto']).count() == 2
+
+    def test_reports_each_rejected_row(self):
+        User.objects.create_user(username='Taken', password='x')
+        data = _csv(
+            'ok1,ok1@test.com,3001234567,Ingeniería,2,,',
+            'taken,t@test.com,3001234567,Ingeniería,2,,',
+            'ok1,dup@test.com,3001234567,Ingeniería,2,,',
+            'bad,no-es-email,123,Ingeniería,40,ADMIN,123',
+        )
+        report = import_users(io.BytesIO(data), 'csv', workers=1)
+
+        assert report['created'] == 1
+        errors = {error['row']: error['errors'] for error in report['errors']}
+        assert errors[3] == {'username': ['Ya existe un usuario con ese nombre.']}
+        assert errors[4] == {'username': ['Usuario repetido en el archivo.']}
+        assert set(errors[5]) == {'email', 'phone_number', 'semester', 'role', 'password'}
+
+    def test_jsonl_in_chunks_with_process_pool(self, django_assert_max_num_queries):
+        lines = [
+            json.dumps({'username': f'u{i}', 'email': f'u{i}@test.com', 'phone_number': '3001234567',
+                        'program': 'Artes', 'semester': 2, 'password': f'Clave-larga-{i}'})
+            for i in range(5)
+        ]
+        lines.insert(2, '{roto')
+        data = '\n'.join(lines).encode('utf-8')
+
+        # Per chunk of two: username check, savepoint pair, three INSERTs and the metrics write(s)
+        with django_assert_max_num_queries(3 * 8):
+            report = import_users(io.BytesIO(data), 'jsonl', chunk_size=2, workers=2)
+
+        assert report['created'] == 5
+        assert report['errors'] == [{'row': 3, 'errors': {'__all__': ['JSON inválido']}}]
+        assert User.objects.get(username='u4').check_password('Clave-larga-4')
+
+    def test_dry_run_writes_nothing(self):
+        report = import_users(io.BytesIO(_csv('solo,solo@test.com,3001234567,Artes,2,,')), 'csv', dry_run=True)
+        assert report['created'] == 1
+        assert not User.objects.filter(username='solo').exists()
+
+    def test_row_limit_is_checked_before_writing(self):
+        data = _csv('h1,h1@test.com,3001234567,Artes,2,,', 'h2,h2@test.com,3001234567,Artes,2,,')
+        with pytest.raises(TooManyRows):
+            import_users(io.BytesIO(data), 'csv', max_rows=1)
+        assert import_users(io.BytesIO(data), 'csv', max_rows=2)['created'] == 2
+
+
+@pytest.mark.django_db
+class TestImportEndpointAndCommand:
+    """Test the upload endpoint and the import_users command"""
+
+    def test_requires_admin(self, db):
+        student = User.objects.create_user(username='student', password='x')
+        client = APIClient()
+        client.force_login(student)
+        response = client.post('/api/users/import/', {'file': SimpleUploadedFile('u.csv', _csv())})
+        assert response.status_code == 403
+
+    def test_upload_returns_report(self, admin_client):
+        upload = SimpleUploadedFile('usuarios.csv', _csv(
+            'carla,carla@test.com,3001234567,Música,4,,',
+            'x,,,,,,',
+        ), content_type='text/csv')
+        response = admin_client.post('/api/users/import/', {'file': upload})
+
+        assert response.status_code == 200
+        body = response.json()
+        assert (body['ok'], body['created'], body['total']) == (True, 1, 2)
+        assert body['errors'][0]['row'] == 3
+        assert User.objects.filter(username='carla').exists()
+
+    def test_unknown_format_is_rejected(self, admin_client):
+        response = admin_client.post('/api/users/import/', {'file': SimpleUploadedFile('u.xlsx', b'...')})
+        assert response.status_code == 400
+
+    def test_upload_hashes_inline(self, admin_client, monkeypatch):
+        monkeypatch.setattr(
+            'butifarra.actividades.user_import.ProcessPoolExecutor',
+            lambda *args, **kwargs: pytest.fail('process pool in a request'),
+        )
+        upload = SimpleUploadedFile('u.csv', _csv('eva,eva@test.com,3001234567,Artes,2,,Clave-segura-2025'))
+        response = admin_client.post('/api/users/import/', {'file': upload})
+        assert response.json()['created'] == 1
+        assert User.objects.get(username='eva').check_password('Clave-segura-2025')
+
+    def test_upload_over_row_limit_is_rejected(self, admin_client, settings):
+        settings.USER_IMPORT_MAX_ROWS = 1
+        upload = SimpleUploadedFile('u.csv', _csv(
+            'fer,fer@test.com,3001234567,Artes,2,,',
+            'gabi,gabi@test.com,3001234567,Artes,2,,',
+        ))
+        response = admin_client.post('/api/users/import/', {'file': upload})
+        assert response.status_code == 413
+        assert not User.objects.filter(username__in=['fer', 'gabi']).exists()
+
+    def test_upload_requires_csrf_token(self, db):
+        admin = User.objects.create_user(username='admin', password='x', is_staff=True)
+        client = APIClient(enforce_csrf_checks=True)
+        client.force_login(admin)
+        response = client.post('/api/users/import/', {'file': SimpleUploadedFile('u.csv', _csv())})
+        assert response.status_code == 403
+
+    def test_command(self, tmp_path):
+        path = tmp_path / 'usuarios.csv'
+        path.write_bytes(_csv('dani,dani@test.com,3001234567,Artes,2,,', 'dani,d2@test.com,3001234567,Artes,2,,'))
+        out = io.StringIO()
+        call_command('import_users', str(path), workers=1, stdout=out)
+        output = out.getvalue()
+        assert 'Fila 3: username: Usuario repetido en el archivo.' in output
+        assert 'Done: 1 users created, 1 rejected of 2 rows' in output
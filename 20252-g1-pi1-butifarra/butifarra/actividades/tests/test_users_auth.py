@@ -1,5 +1,11 @@
+import tempfile
+
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
+
+from actividades.models import DailyMetrics, NotificationPreference, UserProfile, bulk_create_users
+from butifarra.actividades.caching import get_session_payload, set_session_payload
+from butifarra.actividades.checks import check_session_engine_cache
 
 
 class UserRoleTests(TestCase):
@@ -48,3 +54,126 @@ class UserRoleTests(TestCase):
         self.assertTrue(profile.is_admin)
         self.assertFalse(profile.is_beneficiary)
         self.assertFalse(profile.is_professor)
+
+
+class UserSignalTests(TestCase):
+    def test_creation_sets_up_profile_and_preferences(self):
+        user = User.objects.create_user(username="new_user", password="testpass123")
+
+        self.assertTrue(UserProfile.objects.filter(user=user).exists())
+        self.assertTrue(NotificationPreference.objects.filter(user=user).exists())
+        self.assertEqual(DailyMetrics.objects.get(category=DailyMetrics.USERS_CATEGORY).new_users, 1)
+
+    def test_login_does_not_write_profile(self):
+        User.objects.create_user(username="returning", password="testpass123")
+        updated_at = UserProfile.objects.get(user__username="returning").updated_at
+
+        user = User.objects.get(username="returning")
+        with self.assertNumQueries(1):
+            user.save(update_fields=["last_login"])
+        self.assertTrue(self.client.login(username="returning", password="testpass123"))
+
+        self.assertEqual(UserProfile.objects.get(user__username="returning").updated_at, updated_at)
+
+    def test_bulk_create_users(self):
+        User.objects.create_user(username="existing", password="testpass123")
+        users = [User(username=f"bulk{i}", email=f"bulk{i}@test.com") for i in range(3)]
+        profiles = [{"role": "PROFESSOR" if i == 0 else "BENEFICIARY", "program": "Ingeniería"} for i in range(3)]
+
+        # Savepoint pair, three multi-row INSERTs and one metrics UPDATE, whatever the batch size
+        with self.assertNumQueries(6):
+            created = bulk_create_users(users, profiles)
+
+        self.assertEqual(len(created), 3)
+        self.assertEqual(UserProfile.objects.get(user__username="bulk0").role, "PROFESSOR")
+        self.assertEqual(UserProfile.objects.filter(program="Ingeniería").count(), 3)
+        self.assertEqual(NotificationPreference.objects.filter(user__in=created).count(), 3)
+        self.assertEqual(DailyMetrics.objects.get(category=DailyMetrics.USERS_CATEGORY).new_users, 4)
+
+
+class SessionPayloadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # A file cache stands in for a shared backend (Redis/Memcached): the shortcut is off on LocMem
+        location = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location}},
+            SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+        ))
+        super().setUpClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="spa_user", password="testpass123")
+        self.client.force_login(self.user)
+
+    def test_steady_state_is_a_304_without_queries(self):
+        first = self.client.get("/api/session/")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()["user"]["username"], "spa_user")
+
+        with self.assertNumQueries(0):
+            cached = self.client.get("/api/session/")
+            revalidated = self.client.get("/api/session/", HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached["ETag"], first["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated["ETag"], first["ETag"])
+
+    def test_profile_save_invalidates_payload(self):
+        etag = self.client.get("/api/session/")["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = UserProfile.objects.get(user=self.user)
+            profile.program = "Diseño"
+            profile.save()
+
+        response = self.client.get("/api/session/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["user"]["profile"]["program"], "Diseño")
+
+    def test_password_change_ends_cached_session(self):
+        self.client.get("/api/session/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password("otherpass456")
+            self.user.save()
+
+        self.assertEqual(self.client.get("/api/session/").status_code, 401)
+
+    def test_deactivated_user_is_refused(self):
+        self.client.get("/api/session/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.client.get("/api/session/").status_code, 401)
+
+    def test_inactive_cache_entry_is_not_served(self):
+        self.client.get("/api/session/")
+        entry = get_session_payload(self.user.pk)
+        set_session_payload(self.user.pk, entry["user"], entry["auth_hash"], is_active=False)
+        # Deactivated without signals, so only the entry's flag stops the cached answer
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        self.assertEqual(self.client.get("/api/session/").status_code, 401)
+
+
+class SessionPayloadLocalCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="local_user", password="testpass123")
+        self.client.force_login(self.user)
+
+    def test_per_process_cache_is_not_used(self):
+        first = self.client.get("/api/session/")
+        revalidated = self.client.get("/api/session/", HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertIsNone(get_session_payload(self.user.pk))
+
+    def test_cached_sessions_on_local_cache_are_refused(self):
+        self.assertEqual(check_session_engine_cache(None), [])
+        with override_settings(SESSION_ENGINE="django.contrib.sessions.backends.cached_db"):
+            self.assertEqual([error.id for error in check_session_engine_cache(None)], ["actividades.E001"])
@@ -0,0 +1,197 @@
+"""
+Tests for the activity waitlist and automatic promotion on unenroll
+"""
+import pytest
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from rest_framework.test import APIClient
+from actividades.models import (
+    Activity,
+    ActivityEnrollment,
+    ActivityWaitlistEntry,
+    Notification,
+)
+from butifarra.actividades.checkin_tokens import make_checkin_token
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def admin_user(db):
+    return User.objects.create_user(
+        username='admin',
+        email='admin@test.com',
+        password='admin123',
+        is_staff=True,
+        is_superuser=True
+    )
+
+
+@pytest.fixture
+def students(db):
+    return [
+        User.objects.create_user(username=f'student{i}', email=f'student{i}@test.com', password='student123')
+        for i in range(4)
+    ]
+
+
+@pytest.fixture
+def full_activity(db, admin_user, students):
+    activity = Activity.objects.create(
+        title='Taller de Teatro',
+        category='CULTURA',
+        start=timezone.now() + timedelta(days=1),
+        end=timezone.now() + timedelta(days=1, hours=2),
+        capacity=1,
+        available_spots=1,
+        created_by=admin_user
+    )
+    ActivityEnrollment.enroll(students[0], activity)
+    return activity
+
+
+@pytest.mark.django_db
+class TestWaitlistModel:
+    """Test joining, leaving and promotion"""
+
+    def test_full_activity_puts_users_in_fifo_order(self, full_activity, students):
+        positions = []
+        for user in students[1:]:
+            result, entry = ActivityEnrollment.enroll(user, full_activity)
+            assert result == ActivityEnrollment.RESULT_WAITLISTED
+            positions.append(entry.position)
+        assert positions == [1, 2, 3]
+
+    def test_joining_twice_keeps_position(self, full_activity, students):
+        ActivityEnrollment.enroll(students[1], full_activity)
+        ActivityEnrollment.enroll(students[2], full_activity)
+        _, entry = ActivityEnrollment.enroll(students[1], full_activity)
+        assert entry.position == 1
+        assert ActivityWaitlistEntry.objects.filter(activity=full_activity).count() == 2
+
+    def test_enrolled_user_is_not_waitlisted(self, full_activity, students):
+        result, _ = ActivityEnrollment.enroll(students[0], full_activity)
+        assert result == ActivityEnrollment.RESULT_ALREADY_ENROLLED
+        assert not ActivityWaitlistEntry.objects.exists()
+
+    def test_unenroll_promotes_head_of_waitlist(self, full_activity, students, django_capture_on_commit_callbacks):
+        for user in students[1:]:
+            ActivityEnrollment.enroll(user, full_activity)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            assert ActivityEnrollment.unenroll(students[0], full_activity) is True
+
+        assert ActivityEnrollment.objects.filter(user=students[1], activity=full_activity).exists()
+        full_activity.refresh_from_db()
+        assert full_activity.available_spots == 0
+        remaining = dict(
+            ActivityWaitlistEntry.objects.filter(activity=full_activity).values_list('user_id', 'position')
+        )
+        assert remaining == {students[2].id: 1, students[3].id: 2}
+
+    def test_promotion_notifies_promoted_user(self, full_activity, students, django_capture_on_commit_callbacks):
+        ActivityEnrollment.enroll(students[1], full_activity)
+        with django_capture_on_commit_callbacks(execute=True):
+            ActivityEnrollment.unenroll(students[0], full_activity)
+
+        notifs = Notification.objects.filter(user=students[1], activity=full_activity)
+        assert set(notifs.values_list('channel', flat=True)) == {'app', 'email'}
+        assert all(n.metadata['type'] == 'waitlist_promotion' for n in notifs)
+
+    def test_unenroll_without_waitlist_returns_seat(self, full_activity, students):
+        ActivityEnrollment.unenroll(students[0], full_activity)
+        full_activity.refresh_from_db()
+        assert full_activity.available_spots == 1
+
+    def test_leave_compacts_positions(self, full_activity, students):
+        for user in students[1:]:
+            ActivityEnrollment.enroll(user, full_activity)
+        assert ActivityWaitlistEntry.leave(students[2], full_activity) is True
+        remaining = dict(
+            ActivityWaitlistEntry.objects.filter(activity=full_activity).values_list('user_id', 'position')
+        )
+        assert remaining == {students[1].id: 1, students[3].id: 2}
+
+    def test_freed_seat_goes_to_waitlist_before_newcomers(self, full_activity, students):
+        ActivityEnrollment.enroll(students[1], full_activity)
+        ActivityEnrollment.enroll(students[2], full_activity)
+        # A seat freed outside unenroll, as the check-in recount does
+        Activity.objects.filter(pk=full_activity.pk).update(available_spots=1)
+
+        result, _ = ActivityEnrollment.enroll(students[3], full_activity)
+
+        assert result == ActivityEnrollment.RESULT_WAITLISTED
+        assert ActivityEnrollment.objects.filter(activity=full_activity, user=students[1]).exists()
+        assert dict(
+            ActivityWaitlistEntry.objects.filter(activity=full_activity).values_list('user_id', 'position')
+        ) == {students[2].id: 1, students[3].id: 2}
+
+    def test_reenroll_after_seat_frees_leaves_waitlist(self, full_activity, students):
+        # enroll -> waitlisted -> enroll once a seat frees up -> unenroll
+        assert ActivityEnrollment.enroll(students[1], full_activity)[0] == ActivityEnrollment.RESULT_WAITLISTED
+        Activity.objects.filter(pk=full_activity.pk).update(available_spots=1)
+
+        result, enrollment = ActivityEnrollment.enroll(students[1], full_activity)
+
+        assert result == ActivityEnrollment.RESULT_ENROLLED and enrollment.user == students[1]
+        assert not ActivityWaitlistEntry.objects.exists()
+        assert ActivityEnrollment.unenroll(students[0], full_activity) is True
+        full_activity.refresh_from_db()
+        assert full_activity.available_spots == 1
+
+    def test_checkin_drops_waitlist_entry(self, api_client, full_activity, students):
+        ActivityEnrollment.enroll(students[1], full_activity)
+        ActivityEnrollment.enroll(students[2], full_activity)
+        token, _ = make_checkin_token(full_activity.id)
+        api_client.force_authenticate(user=students[1])
+        assert api_client.post('/api/actividades/checkin/', {'token': token}, format='json').status_code == 200
+
+        assert dict(
+            ActivityWaitlistEntry.objects.filter(activity=full_activity).values_list('user_id', 'position')
+        ) == {students[2].id: 1}
+        ActivityEnrollment.unenroll(students[0], full_activity)
+        assert ActivityEnrollment.objects.filter(activity=full_activity, user=students[2]).exists()
+
+    def test_promote_skips_users_already_enrolled(self, full_activity, students):
+        ActivityEnrollment.enroll(students[1], full_activity)
+        ActivityEnrollment.enroll(students[2], full_activity)
+        # An enrollment that bypassed the signal (e.g. bulk_create) leaves a stale entry
+        ActivityEnrollment.objects.bulk_create([ActivityEnrollment(user=students[1], activity=full_activity)])
+
+        ActivityEnrollment.unenroll(students[0], full_activity)
+
+        assert set(
+            ActivityEnrollment.objects.filter(activity=full_activity).values_list('user_id', flat=True)
+        ) == {students[1].id, students[2].id}
+        assert not ActivityWaitlistEntry.objects.exists()
+
+
+@pytest.mark.django_db
+class TestWaitlistAPI:
+    """Test waitlist endpoints"""
+
+    def test_enroll_when_full_returns_waitlist_position(self, api_client, full_activity, students):
+        api_client.force_authenticate(user=students[1])
+        response = api_client.post(f'/api/actividades/{full_activity.id}/enroll/')
+        assert response.status_code == 202
+        assert response.data['waitlisted'] is True
+        assert response.data['position'] == 1
+
+    def test_waitlist_position_endpoint(self, api_client, full_activity, students):
+        ActivityEnrollment.enroll(students[1], full_activity)
+        ActivityEnrollment.enroll(students[2], full_activity)
+        api_client.force_authenticate(user=students[2])
+        response = api_client.get(f'/api/actividades/{full_activity.id}/waitlist/')
+        assert response.status_code == 200
+        assert response.data == {'waitlisted': True, 'position': 2}
+
+    def test_unenroll_from_waitlist(self, api_client, full_activity, students):
+        ActivityEnrollment.enroll(students[1], full_activity)
+        api_client.force_authenticate(user=students[1])
+        response = api_client.post(f'/api/actividades/{full_activity.id}/unenroll/')
+        assert response.status_code == 200
+        assert not ActivityWaitlistEntry.objects.filter(user=students[1]).exists()
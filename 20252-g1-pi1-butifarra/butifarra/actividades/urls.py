@@ -34,11 +34,16 @@ urlpatterns = [
     path('api/session/', views.api_session),
     # POST JSON payload: {"username", "email", "password1", "password2"}
     path('api/register/', views.api_register),
+    # Bulk user import (admin): CSV or JSON-lines upload, per-row error report
+    path('api/users/import/', views.api_import_users),
     # User activities endpoint for calendars
     path('api/user/activities', views.api_user_activities),
     # List professors
     path('api/professors/', views.api_professors),
     path('api/reports/dashboard/', views.api_reports_dashboard),
+    path('api/reports/dashboard/cache-stats/', views.api_reports_cache_stats),
+    # Server-Sent Events (serve with an ASGI server); before the router so it is not taken as a pk
+    path('api/notifications/stream/', views.api_notifications_stream),
     # Notification preferences
     path('api/notification-preferences/', views.api_notification_preferences),
 
@@ -0,0 +1,238 @@
+"""
+Bulk user import from CSV or JSON lines.
+
+Rows are read and validated one at a time, so the upload is never held in
+memory as a whole. Valid rows are collected into chunks; each chunk checks
+usernames against the database with one query, hashes its passwords
+(inline, or in a process pool for the ``import_users`` command: hashing is
+deliberately slow and CPU bound) and inserts users, profiles and
+preferences with ``bulk_create_users``. The result is a
+report with the number of users created and the errors of every rejected
+row, keyed by its line number.
+"""
+import csv
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django import forms
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.db.models.functions import Lower
+
+from .models import UserProfile, bulk_create_users
+
+FORMATS = ("csv", "jsonl")
+
+
+class TooManyRows(ValueError):
+    """The upload has more rows than an import accepts."""
+
+
+class ProfileFieldsMixin:
+    """Validation of the profile fields shared by registration and import."""
+
+    def clean_phone_number(self):
+        phone = self.cleaned_data.get("phone_number", "")
+        digits = "".join(char for char in phone if char.isdigit())
+
+        if len(digits) != 10:
+            raise forms.ValidationError("El número de celular debe tener 10 dígitos.")
+
+        return digits
+
+    def clean_semester(self):
+        semester = self.cleaned_data.get("semester")
+        if semester is None:
+            raise forms.ValidationError("Debes ingresar el semestre.")
+
+        try:
+            semester = int(semester)
+        except (TypeError, ValueError):
+            raise forms.ValidationError("Debes ingresar un número de semestre válido.")
+
+        if not 1 <= semester <= 20:
+            raise forms.ValidationError("El semestre debe estar entre 1 y 20.")
+
+        return semester
+
+
+class UserImportRowForm(ProfileFieldsMixin, forms.Form):
+    """One imported row. Without a password the account gets an unusable one (reset by email)."""
+    username = forms.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    email = forms.EmailField()
+    first_name = forms.CharField(max_length=150, required=False)
+    last_name = forms.CharField(max_length=150, required=False)
+    phone_number = forms.CharField(max_length=20)
+    program = forms.CharField(max_length=120)
+    semester = forms.IntegerField()
+    role = forms.ChoiceField(
+        required=False,
+        choices=[
+            (value, label)
+            for value, label in UserProfile.ROLE_CHOICES
+            if value in {"BENEFICIARY", "PROFESSOR"}
+        ],
+    )
+    password = forms.CharField(required=False, strip=False)
+
+    def clean(self):
+        cleaned = super().clean()
+        password = cleaned.get("password")
+        if password:
+            user = User(username=cleaned.get("username", ""), email=cleaned.get("email", ""))
+            try:
+                validate_password(password, user)
+            except ValidationError as exc:
+                self.add_error("password", exc)
+        return cleaned
+
+
+def detect_format(name="", content_type=""):
+    """``csv``/``jsonl`` from a file name or content type, or None."""
+    name, content_type = (name or "").lower(), (content_type or "").lower()
+    if name.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    if name.endswith((".jsonl", ".ndjson")) or "ndjson" in content_type or "jsonl" in content_type:
+        return "jsonl"
+    return None
+
+
+def read_rows(stream, fmt):
+    """
+    Yield ``(line, row)`` from a binary stream; ``row`` is a dict, or an
+    error message when the line cannot be parsed.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield reader.line_num, {key.strip(): (value or "").strip() for key, value in row.items() if key}
+            return
+        for line, raw in enumerate(text, start=1):
+            if not raw.strip():
+                continue
+            try:
+                row = json.loads(raw)
+            except ValueError:
+                yield line, "JSON inválido"
+                continue
+            yield line, row if isinstance(row, dict) else "Cada línea debe ser un objeto JSON"
+    finally:
+        # Leave the stream open for the caller
+        text.detach()
+
+
+def _chunks_of_valid_rows(rows, report, chunk_size):
+    seen = set()
+    chunk = []
+    for line, row in rows:
+        report["total"] += 1
+        if isinstance(row, str):
+            report["errors"].append({"row": line, "errors": {"__all__": [row]}})
+            continue
+        form = UserImportRowForm(row)
+        if not form.is_valid():
+            errors = {field: [str(error) for error in error_list] for field, error_list in form.errors.items()}
+            report["errors"].append({"row": line, "errors": errors})
+            continue
+        username = form.cleaned_data["username"]
+        if username.lower() in seen:
+            report["errors"].append({"row": line, "errors": {"username": ["Usuario repetido en el archivo."]}})
+            continue
+        seen.add(username.lower())
+        chunk.append((line, form.cleaned_data))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _drop_existing(chunk, report):
+    # Case-insensitive, like the registration form
+    existing = set(
+        User.objects.annotate(username_lower=Lower("username"))
+        .filter(username_lower__in=[data["username"].lower() for _, data in chunk])
+        .values_list("username_lower", flat=True)
+    )
+    fresh = []
+    for line, data in chunk:
+        if data["username"].lower() in existing:
+            report["errors"].append({"row": line, "errors": {"username": ["Ya existe un usuario con ese nombre."]}})
+        else:
+            fresh.append((line, data))
+    return fresh
+
+
+def import_users(stream, fmt, chunk_size=None, workers=1, dry_run=False, max_rows=None):
+    """
+    Validate and insert the users in ``stream`` (binary CSV or JSON lines).
+    Returns ``{"total", "created", "errors"}``; with ``dry_run`` nothing is
+    written and ``created`` counts the rows that would be.
+
+    Passwords are hashed in the calling process unless ``workers`` > 1.
+    With ``max_rows`` the rows are counted first (``stream`` must be
+    seekable) and ``TooManyRows`` is raised before anything is written.
+    """
+    chunk_size = chunk_size or getattr(settings, "USER_IMPORT_CHUNK_SIZE", 500)
+    if max_rows is not None:
+        if sum(1 for _ in islice(read_rows(stream, fmt), max_rows + 1)) > max_rows:
+            raise TooManyRows(max_rows)
+        stream.seek(0)
+    report = {"total": 0, "created": 0, "errors": []}
+    pool = None
+    try:
+        for chunk in _chunks_of_valid_rows(read_rows(stream, fmt), report, chunk_size):
+            chunk = _drop_existing(chunk, report)
+            if dry_run or not chunk:
+                report["created"] += len(chunk)
+                continue
+            passwords = [data["password"] or None for _, data in chunk]
+            if not workers or workers == 1:
+                hashes = [make_password(password) for password in passwords]
+            else:
+                # The pool outlives a chunk: worker start-up is paid once per import
+                pool = pool or ProcessPoolExecutor(max_workers=workers)
+                hashes = list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // 16)))
+            users = [
+                User(
+                    username=data["username"],
+                    email=data["email"],
+                    first_name=data["first_name"],
+                    last_name=data["last_name"],
+                    password=password_hash,
+                )
+                for (_, data), password_hash in zip(chunk, hashes)
+            ]
+            profiles = [
+                {
+                    "role": data["role"] or "BENEFICIARY",
+                    "phone_number": data["phone_number"],
+                    "program": data["program"],
+                    "semester": data["semester"],
+                }
+                for _, data in chunk
+            ]
+            try:
+                bulk_create_users(users, profiles)
+            except IntegrityError:
+                # A username taken between the check and the insert: the whole chunk rolled back
+                for line, _ in chunk:
+                    report["errors"].append(
+                        {"row": line, "errors": {"__all__": ["Conflicto al insertar el bloque; vuelve a importarlo."]}}
+                    )
+                continue
+            report["created"] += len(users)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    report["errors"].sort(key=lambda error: error["row"])
+    return report
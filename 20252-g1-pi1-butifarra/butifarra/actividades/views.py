@@ -1,11 +1,12 @@
+import io
 import json
-import secrets
+from collections import Counter
 
 from django import forms
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.views.decorators.csrf import csrf_exempt
-from django.contrib.auth import authenticate, get_user_model, login, logout
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY, authenticate, get_user_model, login, logout
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods, require_GET
@@ -18,34 +19,54 @@ from datetime import datetime, timedelta, time
 from django.utils import timezone
 from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Sum
 from django.db.models.functions import TruncDate
+from django.utils.crypto import constant_time_compare
 from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags
 from rest_framework import viewsets, filters, permissions
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
 from django.db import transaction
-from django.core.mail import send_mail, EmailMessage
 from django.conf import settings
 
-from .models import Activity, UserProfile, Tournament, ActivityEnrollment, TournamentEnrollment, Notification, Campaign, NotificationPreference, NotificationDeliveryLog
+from .models import Activity, UserProfile, Tournament, ActivityEnrollment, ActivityWaitlistEntry, DailyMetrics, TournamentEnrollment, Notification, ArchivedNotification, Campaign, NotificationPreference, fan_out_campaign
 from .serializers import (
     ActivitySerializer,
     TournamentSerializer,
     ActivityEnrollmentSerializer,
     TournamentEnrollmentSerializer,
     NotificationSerializer,
+    NotificationListSerializer,
+    ArchivedNotificationSerializer,
     CampaignSerializer,
     NotificationPreferenceSerializer,
 )
+from .caching import (
+    cache_is_shared,
+    decr_unread_count,
+    get_cached_report,
+    get_session_payload,
+    get_unread_count,
+    reports_cache_key,
+    reports_cache_stats,
+    reset_unread_count,
+    session_payload_etag,
+    set_cached_report,
+    set_session_payload,
+)
+from .checkin_tokens import ExpiredCheckinToken, InvalidCheckinToken, make_checkin_token, read_checkin_token
+from .delivery import OUTBOX_CHANNELS
+from .pagination import CreatedCursorPagination, StartCursorPagination
+from .streaming import event_stream
+from .user_import import FORMATS, ProfileFieldsMixin, TooManyRows, detect_format, import_users
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-CHECKIN_TOKEN_TTL_MINUTES = 10
-
 def index(request):
     return HttpResponse("Bienvenidos al Centro Artístico y Deportivo")
 
@@ -160,23 +181,109 @@ def _percentage_change(current, previous):
         return None
 
 
-def _average_occupancy(queryset):
-    """Calculate the average occupancy (0-1) for the given queryset of activities."""
-    if queryset is None:
-        return None
+def _occupancy_expression():
+    """Per-activity occupancy (0-1), to be averaged over activities with capacity."""
+    return ExpressionWrapper(
+        F("actual_attendees") * 1.0 / F("capacity"),
+        output_field=FloatField(),
+    )
 
-    result = queryset.aggregate(
-        occupancy=Avg(
-            ExpressionWrapper(
-                F("actual_attendees") * 1.0 / F("capacity"),
-                output_field=FloatField(),
-            )
+
+def _covers_whole_days(range_start, range_end):
+    """True when the range bounds fall on local day boundaries (or are open)."""
+    if range_start and timezone.localtime(range_start).time() != time.min:
+        return False
+    if range_end and timezone.localtime(range_end).time() != time.max:
+        return False
+    return True
+
+
+def _series_point(day, key, value):
+    return {"date": day.isoformat() if day else None, key: value}
+
+
+def _rollup_series(range_start, range_end, activity_types):
+    """Dashboard series read from DailyMetrics: two small grouped queries."""
+    rows = DailyMetrics.objects.all()
+    if range_start:
+        rows = rows.filter(day__gte=timezone.localdate(range_start))
+    if range_end:
+        rows = rows.filter(day__lte=timezone.localdate(range_end))
+
+    users_rows = Q(category=DailyMetrics.USERS_CATEGORY)
+    activity_rows = Q(category__in=activity_types) if activity_types else ~users_rows
+
+    daily = list(
+        rows.filter(activity_rows | users_rows)
+        .values("day")
+        .annotate(
+            total_enrollments=Sum("enrollments", filter=activity_rows),
+            total_attendees=Sum("attendees", filter=activity_rows),
+            total_users=Sum("new_users", filter=users_rows),
         )
+        .order_by("day")
+    )
+    attendance_series = [
+        _series_point(entry["day"], "attendees", entry["total_attendees"])
+        for entry in daily
+        if entry["total_attendees"]
+    ]
+    enrollment_series = [
+        _series_point(entry["day"], "enrollments", entry["total_enrollments"])
+        for entry in daily
+        if entry["total_enrollments"]
+    ]
+    new_users_series = [
+        _series_point(entry["day"], "users", entry["total_users"])
+        for entry in daily
+        if entry["total_users"]
+    ]
+    capacity_totals = (
+        rows.filter(activity_rows, capacity__gt=0)
+        .values("category")
+        .annotate(total_capacity=Sum("capacity"), total_attendees=Sum("actual_attendees"))
+        .order_by("category")
+    )
+    return attendance_series, enrollment_series, new_users_series, capacity_totals
+
+
+def _raw_series(enrollments_qs, users_qs, activities_qs):
+    """Dashboard series computed from the source tables, for partial-day ranges."""
+    # Enrollment and attendance series share one grouped pass over enrollments
+    daily_enrollments = list(
+        enrollments_qs
+        .annotate(day=TruncDate("activity__start"))
+        .values("day")
+        .annotate(total=Count("id"), attended=Count("id", filter=Q(attended=True)))
+        .order_by("day")
+    )
+    attendance_series = [
+        _series_point(entry["day"], "attendees", entry["attended"])
+        for entry in daily_enrollments
+        if entry["attended"]
+    ]
+    enrollment_series = [
+        _series_point(entry["day"], "enrollments", entry["total"])
+        for entry in daily_enrollments
+    ]
+    new_users_series = [
+        _series_point(entry["day"], "users", entry["total"])
+        for entry in users_qs
+        .annotate(day=TruncDate("date_joined"))
+        .values("day")
+        .annotate(total=Count("id"))
+        .order_by("day")
+    ]
+    capacity_totals = (
+        activities_qs.filter(capacity__gt=0)
+        .values("category")
+        .annotate(total_capacity=Sum("capacity"), total_attendees=Sum("actual_attendees"))
+        .order_by("category")
     )
-    return result.get("occupancy")
+    return attendance_series, enrollment_series, new_users_series, capacity_totals
 
 
-class UserProfileRegistrationForm(UserCreationForm):
+class UserProfileRegistrationForm(ProfileFieldsMixin, UserCreationForm):
     email = forms.EmailField(required=True)
     phone_number = forms.CharField(required=True, max_length=20)
     program = forms.CharField(required=True, max_length=120)
@@ -211,30 +318,6 @@ class UserProfileRegistrationForm(UserCreationForm):
         "password2",
     )
 
-    def clean_phone_number(self):
-        phone = self.cleaned_data.get("phone_number", "")
-        digits = "".join(char for char in phone if char.isdigit())
-
-        if len(digits) != 10:
-            raise forms.ValidationError("El número de celular debe tener 10 dígitos.")
-
-        return digits
-
-    def clean_semester(self):
-        semester = self.cleaned_data.get("semester")
-        if semester is None:
-            raise forms.ValidationError("Debes ingresar el semestre.")
-
-        try:
-            semester = int(semester)
-        except (TypeError, ValueError):
-            raise forms.ValidationError("Debes ingresar un número de semestre válido.")
-
-        if not 1 <= semester <= 20:
-            raise forms.ValidationError("El semestre debe estar entre 1 y 20.")
-
-        return semester
-
     def save(self, commit=True):
         user = super().save(commit=False)
         user.email = self.cleaned_data["email"]
@@ -354,6 +437,57 @@ def api_register(request):
     )
 
 
+def api_import_users(request):
+    """
+    Bulk-create users from an uploaded CSV or JSON-lines file (field
+    ``file``, or the raw request body). Columns: username, email,
+    phone_number, program, semester, role, first_name, last_name, password.
+    ``?dry_run=1`` only validates. Returns a per-row error report.
+
+    Passwords are hashed in the request, so uploads are capped at
+    ``USER_IMPORT_MAX_ROWS`` rows; larger files go through the
+    ``import_users`` command.
+    """
+    if request.method != "POST":
+        return JsonResponse({"ok": False, "error": "Method not allowed"}, status=405)
+
+    if not request.user.is_authenticated:
+        return JsonResponse({"ok": False, "error": "Not authenticated"}, status=401)
+
+    user_profile = getattr(request.user, "profile", None)
+    has_admin_perms = any(
+        [
+            request.user.is_staff,
+            request.user.is_superuser,
+            getattr(user_profile, "is_admin", False),
+        ]
+    )
+
+    if not has_admin_perms:
+        return JsonResponse({"ok": False, "error": "Forbidden"}, status=403)
+
+    upload = request.FILES.get("file")
+    if upload is not None:
+        fmt = request.GET.get("format") or detect_format(upload.name, upload.content_type)
+        stream = upload.file
+    else:
+        fmt = request.GET.get("format") or detect_format(content_type=request.content_type)
+        stream = io.BytesIO(request.body)
+    if fmt not in FORMATS:
+        return JsonResponse({"ok": False, "error": "Formato no soportado: usa CSV o JSONL"}, status=400)
+
+    dry_run = request.GET.get("dry_run", "").lower() in {"1", "true"}
+    max_rows = getattr(settings, "USER_IMPORT_MAX_ROWS", 2000)
+    try:
+        report = import_users(stream, fmt, dry_run=dry_run, max_rows=max_rows)
+    except TooManyRows:
+        return JsonResponse(
+            {"ok": False, "error": f"El archivo supera el máximo de {max_rows} filas: usa el comando import_users"},
+            status=413,
+        )
+    return JsonResponse({"ok": True, "dry_run": dry_run, **report}, status=200)
+
+
 @csrf_exempt
 def api_user_activities(request):
     """Return activities visible to the current user.
@@ -414,12 +548,51 @@ def api_session(request):
     if request.method != "GET":
         return JsonResponse({"ok": False, "error": "Method not allowed"}, status=405)
 
-    if not request.user.is_authenticated:
-        return JsonResponse({"ok": False}, status=401)
+    # Only a cache every worker shares sees the invalidations made by the others
+    shared = cache_is_shared()
+    entry = _cached_session_entry(request) if shared else None
+    if entry is None:
+        if not request.user.is_authenticated:
+            return JsonResponse({"ok": False}, status=401)
+        user_payload = _serialize_user(request.user)
+        if shared:
+            etag = set_session_payload(
+                request.user.pk, user_payload, request.user.get_session_auth_hash(), request.user.is_active
+            )
+        else:
+            etag = session_payload_etag(user_payload)
+    else:
+        user_payload, etag = entry["user"], entry["etag"]
 
     # Ensure CSRF token is issued
     get_token(request)
-    return JsonResponse({"ok": True, "user": _serialize_user(request.user)}, status=200)
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({"ok": True, "user": user_payload}, status=200)
+    response["ETag"] = etag
+    # The browser must revalidate: the payload changes when the user or profile is saved
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _cached_session_entry(request):
+    """
+    Cached payload of the session's user, checked against the session's
+    auth hash the way ``django.contrib.auth.get_user`` does, so that the
+    steady state needs neither the user nor the profile row.
+    """
+    user_id = request.session.get(SESSION_KEY)
+    if user_id is None:
+        return None
+    entry = get_session_payload(user_id)
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if entry is None or not session_hash or not constant_time_compare(session_hash, entry["auth_hash"]):
+        return None
+    # Inactive users are refused like ModelBackend.get_user does
+    if not entry.get("is_active", False):
+        return None
+    return entry
 
 
 # Custom permission class for activities
@@ -472,6 +645,7 @@ class ActivityViewSet(viewsets.ModelViewSet):
     queryset = Activity.objects.all().order_by('-start')
     serializer_class = ActivitySerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = StartCursorPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['category', 'status', 'visibility', 'assigned_professor']
     search_fields = ['title', 'description', 'location', 'instructor']
@@ -566,8 +740,9 @@ class ActivityViewSet(viewsets.ModelViewSet):
         if not profile or not profile.is_professor or activity.assigned_professor_id != user.id:
             return Response({'detail': 'Solo el profesor asignado puede generar el check-in'}, status=403)
 
-        token = secrets.token_urlsafe(20)
-        expires_at = timezone.now() + timedelta(minutes=CHECKIN_TOKEN_TTL_MINUTES)
+        token, expires_at = make_checkin_token(activity.id)
+        # Only the latest token is kept, so the detail page can show its QR again;
+        # the check-in itself never reads these columns
         activity.checkin_token = token
         activity.checkin_expires_at = expires_at
         activity.save(update_fields=['checkin_token', 'checkin_expires_at'])
@@ -596,17 +771,24 @@ class ActivityViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Token requerido'}, status=400)
 
         try:
-            activity = Activity.objects.get(checkin_token=token)
-        except Activity.DoesNotExist:
+            activity_id = read_checkin_token(token)
+        except ExpiredCheckinToken:
+            return Response({'detail': 'Token expirado'}, status=400)
+        except InvalidCheckinToken:
             return Response({'detail': 'Token inválido'}, status=404)
 
-        if not activity.checkin_expires_at or activity.checkin_expires_at < timezone.now():
-            return Response({'detail': 'Token expirado'}, status=400)
+        try:
+            activity = Activity.objects.get(pk=activity_id)
+        except Activity.DoesNotExist:
+            return Response({'detail': 'Token inválido'}, status=404)
 
-        enrollment, _ = ActivityEnrollment.objects.get_or_create(
+        enrollment, created = ActivityEnrollment.objects.get_or_create(
             user=request.user,
             activity=activity,
         )
+        if created:
+            # Attending without a seat: a later promotion must not enroll them again
+            ActivityWaitlistEntry.leave(request.user, activity)
 
         attended_before = enrollment.attended
         if not enrollment.attended:
@@ -636,37 +818,46 @@ class ActivityViewSet(viewsets.ModelViewSet):
             }
         )
 
-    @action(detail=True, methods=['post'], url_path='enroll')
+    @action(detail=True, methods=['post'], url_path='enroll', permission_classes=[permissions.IsAuthenticated])
     def enroll(self, request, pk=None):
         activity = self.get_object()
         if not request.user.is_authenticated:
             return Response({'detail': 'Auth required'}, status=401)
-        if activity.available_spots <= 0:
-            return Response({'detail': 'No hay cupos disponibles'}, status=400)
-        obj, created = ActivityEnrollment.objects.get_or_create(user=request.user, activity=activity)
-        if not created:
+        result, obj = ActivityEnrollment.enroll(request.user, activity)
+        if result == ActivityEnrollment.RESULT_WAITLISTED:
+            return Response(
+                {
+                    'detail': 'No hay cupos disponibles. Quedaste en la lista de espera.',
+                    'waitlisted': True,
+                    'position': obj.position,
+                },
+                status=202,
+            )
+        if result == ActivityEnrollment.RESULT_ALREADY_ENROLLED:
             return Response({'detail': 'Ya estás inscrito'}, status=200)
-        # Decrement available spots
-        if activity.available_spots > 0:
-            activity.available_spots -= 1
-            activity.save(update_fields=['available_spots'])
         return Response(ActivityEnrollmentSerializer(obj).data, status=201)
 
-    @action(detail=True, methods=['post'], url_path='unenroll')
+    @action(detail=True, methods=['post'], url_path='unenroll', permission_classes=[permissions.IsAuthenticated])
     def unenroll(self, request, pk=None):
         activity = self.get_object()
         if not request.user.is_authenticated:
             return Response({'detail': 'Auth required'}, status=401)
-        try:
-            enr = ActivityEnrollment.objects.get(user=request.user, activity=activity)
-        except ActivityEnrollment.DoesNotExist:
+        if not ActivityEnrollment.unenroll(request.user, activity):
+            if ActivityWaitlistEntry.leave(request.user, activity):
+                return Response({'ok': True, 'detail': 'Saliste de la lista de espera'})
             return Response({'detail': 'No estás inscrito'}, status=400)
-        enr.delete()
-        # Return spot
-        activity.available_spots += 1
-        activity.save(update_fields=['available_spots'])
         return Response({'ok': True})
 
+    @action(detail=True, methods=['get'], url_path='waitlist', permission_classes=[permissions.IsAuthenticated])
+    def waitlist_position(self, request, pk=None):
+        activity = self.get_object()
+        position = (
+            ActivityWaitlistEntry.objects.filter(activity=activity, user=request.user)
+            .values_list('position', flat=True)
+            .first()
+        )
+        return Response({'waitlisted': position is not None, 'position': position})
+
     @action(detail=True, methods=['patch'], url_path='professor/attendance')
     def professor_attendance(self, request, pk=None):
         activity = self.get_object()
@@ -716,6 +907,7 @@ class TournamentViewSet(viewsets.ModelViewSet):
     serializer_class = TournamentSerializer
     permission_classes = [IsAdminOrReadOnly]
     authentication_classes = [SessionAuthentication]
+    pagination_class = StartCursorPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['sport', 'status', 'visibility']
     search_fields = ['name', 'description', 'location']
@@ -875,15 +1067,17 @@ def api_reports_dashboard(request):
         if not value:
             return None
 
-        parsed_dt = parse_datetime(value)
-        if parsed_dt is None:
-            parsed_date = parse_date(value)
-            if parsed_date is None:
-                return None
+        # Dates first: parse_datetime also accepts a bare date (as midnight)
+        parsed_date = parse_date(value)
+        if parsed_date is not None:
             parsed_dt = datetime.combine(
                 parsed_date,
                 time.min if is_start else time.max,
             )
+        else:
+            parsed_dt = parse_datetime(value)
+            if parsed_dt is None:
+                return None
 
         if timezone.is_naive(parsed_dt):
             parsed_dt = timezone.make_aware(parsed_dt, timezone.get_current_timezone())
@@ -972,89 +1166,88 @@ def api_reports_dashboard(request):
         enrollments_qs = enrollments_qs.filter(activity__category__in=activity_types)
         filters_applied["activity_types"] = activity_types
 
+    # Cached payloads keep the generated_at of the request that computed them
+    cache_key = reports_cache_key(filters_applied)
+    cached = get_cached_report(cache_key)
+    if cached is not None:
+        response = Response(cached, status=200)
+        response["X-Cache"] = "HIT"
+        return response
+
     start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
     end_of_day = start_of_day + timedelta(days=1)
 
-    todays_attendance = enrollments_qs.filter(
-        attended=True,
-        activity__start__gte=start_of_day,
-        activity__start__lt=end_of_day,
-    ).count()
-    yesterdays_attendance = enrollments_qs.filter(
-        attended=True,
-        activity__start__gte=start_of_day - timedelta(days=1),
-        activity__start__lt=start_of_day,
-    ).count()
-
-    open_enrollments = activities_qs.filter(
-        status="active",
-        start__gte=now,
-        available_spots__gt=0,
-    ).count()
-    open_enrollments_previous = activities_qs.filter(
-        status="active",
-        start__gte=now - timedelta(days=14),
-        start__lt=now - timedelta(days=7),
-        available_spots__gt=0,
-    ).count()
-
     week_start = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
     week_end = week_start + timedelta(days=7)
     previous_week_start = week_start - timedelta(days=7)
 
-    occupancy_current = _average_occupancy(
-        activities_qs.filter(
-            start__gte=week_start,
-            start__lt=week_end,
-            capacity__gt=0,
-        )
+    # Scalar KPIs: one conditional-aggregation query per base table
+    attended = Q(attended=True)
+    enrollment_kpis = enrollments_qs.aggregate(
+        todays_attendance=Count(
+            "id", filter=attended & Q(activity__start__gte=start_of_day, activity__start__lt=end_of_day)
+        ),
+        yesterdays_attendance=Count(
+            "id",
+            filter=attended & Q(activity__start__gte=start_of_day - timedelta(days=1), activity__start__lt=start_of_day),
+        ),
+        weekly_attendance_current=Count(
+            "id", filter=attended & Q(activity__start__gte=week_start, activity__start__lt=week_end)
+        ),
+        weekly_attendance_previous=Count(
+            "id", filter=attended & Q(activity__start__gte=previous_week_start, activity__start__lt=week_start)
+        ),
     )
-    occupancy_previous = _average_occupancy(
-        activities_qs.filter(
-            start__gte=previous_week_start,
-            start__lt=week_start,
-            capacity__gt=0,
-        )
+
+    open_activity = Q(status="active", available_spots__gt=0)
+    cancelled = Q(status="cancelled")
+    activity_kpis = activities_qs.aggregate(
+        open_enrollments=Count("id", filter=open_activity & Q(start__gte=now)),
+        open_enrollments_previous=Count(
+            "id", filter=open_activity & Q(start__gte=now - timedelta(days=14), start__lt=now - timedelta(days=7))
+        ),
+        occupancy_current=Avg(
+            _occupancy_expression(),
+            filter=Q(start__gte=week_start, start__lt=week_end, capacity__gt=0),
+        ),
+        occupancy_previous=Avg(
+            _occupancy_expression(),
+            filter=Q(start__gte=previous_week_start, start__lt=week_start, capacity__gt=0),
+        ),
+        incidents_current=Count("id", filter=cancelled & Q(updated_at__gte=now - timedelta(days=7))),
+        incidents_previous=Count(
+            "id",
+            filter=cancelled & Q(updated_at__gte=now - timedelta(days=14), updated_at__lt=now - timedelta(days=7)),
+        ),
+        weekly_activities_created_current=Count(
+            "id", filter=Q(created_at__gte=week_start, created_at__lt=week_end)
+        ),
+        weekly_activities_created_previous=Count(
+            "id", filter=Q(created_at__gte=previous_week_start, created_at__lt=week_start)
+        ),
     )
 
-    incidents_current = activities_qs.filter(
-        status="cancelled",
-        updated_at__gte=now - timedelta(days=7),
-    ).count()
-    incidents_previous = activities_qs.filter(
-        status="cancelled",
-        updated_at__gte=now - timedelta(days=14),
-        updated_at__lt=now - timedelta(days=7),
-    ).count()
-
-    weekly_attendance_current = enrollments_qs.filter(
-        attended=True,
-        activity__start__gte=week_start,
-        activity__start__lt=week_end,
-    ).count()
-    weekly_attendance_previous = enrollments_qs.filter(
-        attended=True,
-        activity__start__gte=previous_week_start,
-        activity__start__lt=week_start,
-    ).count()
-
-    weekly_new_users_current = users_qs.filter(
-        date_joined__gte=week_start,
-        date_joined__lt=week_end,
-    ).count()
-    weekly_new_users_previous = users_qs.filter(
-        date_joined__gte=previous_week_start,
-        date_joined__lt=week_start,
-    ).count()
-
-    weekly_activities_created_current = activities_qs.filter(
-        created_at__gte=week_start,
-        created_at__lt=week_end,
-    ).count()
-    weekly_activities_created_previous = activities_qs.filter(
-        created_at__gte=previous_week_start,
-        created_at__lt=week_start,
-    ).count()
+    user_kpis = users_qs.aggregate(
+        weekly_new_users_current=Count("id", filter=Q(date_joined__gte=week_start, date_joined__lt=week_end)),
+        weekly_new_users_previous=Count(
+            "id", filter=Q(date_joined__gte=previous_week_start, date_joined__lt=week_start)
+        ),
+    )
+
+    todays_attendance = enrollment_kpis["todays_attendance"]
+    yesterdays_attendance = enrollment_kpis["yesterdays_attendance"]
+    weekly_attendance_current = enrollment_kpis["weekly_attendance_current"]
+    weekly_attendance_previous = enrollment_kpis["weekly_attendance_previous"]
+    open_enrollments = activity_kpis["open_enrollments"]
+    open_enrollments_previous = activity_kpis["open_enrollments_previous"]
+    occupancy_current = activity_kpis["occupancy_current"]
+    occupancy_previous = activity_kpis["occupancy_previous"]
+    incidents_current = activity_kpis["incidents_current"]
+    incidents_previous = activity_kpis["incidents_previous"]
+    weekly_activities_created_current = activity_kpis["weekly_activities_created_current"]
+    weekly_activities_created_previous = activity_kpis["weekly_activities_created_previous"]
+    weekly_new_users_current = user_kpis["weekly_new_users_current"]
+    weekly_new_users_previous = user_kpis["weekly_new_users_previous"]
 
     participation_by_type = [
         {
@@ -1068,51 +1261,15 @@ def api_reports_dashboard(request):
         .order_by("-total")
     ]
 
-    attendance_series = [
-        {
-            "date": entry["day"].isoformat() if entry["day"] else None,
-            "attendees": entry["total"],
-        }
-        for entry in enrollments_qs.filter(attended=True)
-        .annotate(day=TruncDate("activity__start"))
-        .values("day")
-        .annotate(total=Count("id"))
-        .order_by("day")
-    ]
-
-    enrollment_series = [
-        {
-            "date": entry["day"].isoformat() if entry["day"] else None,
-            "enrollments": entry["total"],
-        }
-        for entry in enrollments_qs
-        .annotate(day=TruncDate("activity__start"))
-        .values("day")
-        .annotate(total=Count("id"))
-        .order_by("day")
-    ]
-
-    new_users_series = [
-        {
-            "date": entry["day"].isoformat() if entry["day"] else None,
-            "users": entry["total"],
-        }
-        for entry in users_qs
-        .annotate(day=TruncDate("date_joined"))
-        .values("day")
-        .annotate(total=Count("id"))
-        .order_by("day")
-    ]
+    # Daily series come from the rollup unless the range cuts through a day
+    if _covers_whole_days(range_start, range_end):
+        series = _rollup_series(range_start, range_end, activity_types)
+    else:
+        series = _raw_series(enrollments_qs, users_qs, activities_qs)
+    attendance_series, enrollment_series, new_users_series, capacity_totals = series
 
     capacity_vs_attendance = []
-    for item in (
-        activities_qs.filter(capacity__gt=0)
-        .values("category")
-        .annotate(
-            total_capacity=Sum("capacity"),
-            total_attendees=Sum("actual_attendees"),
-        )
-    ):
+    for item in capacity_totals:
         capacity = item["total_capacity"] or 0
         attendees = item["total_attendees"] or 0
         ratio = (attendees / capacity * 100.0) if capacity else None
@@ -1237,7 +1394,44 @@ def api_reports_dashboard(request):
         "generated_at": now.isoformat(),
     }
 
-    return Response(payload, status=200)
+    set_cached_report(cache_key, payload)
+    response = Response(payload, status=200)
+    response["X-Cache"] = "MISS"
+    return response
+
+
+async def api_notifications_stream(request):
+    """
+    Server-Sent Events stream of new in-app notifications for the current user.
+    Resume with the Last-Event-ID header (or ?last_event_id=) to replay missed ones.
+    """
+    if request.method != "GET":
+        return JsonResponse({"detail": "Método no permitido"}, status=405)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+    raw_last_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    try:
+        last_id = int(raw_last_id) if raw_last_id else None
+    except ValueError:
+        last_id = None
+
+    response = StreamingHttpResponse(event_stream(user.id, last_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@api_view(["GET"])
+def api_reports_cache_stats(request):
+    user = request.user
+    if not user.is_authenticated:
+        return Response({"detail": "Authentication credentials were not provided."}, status=401)
+    profile = getattr(user, "profile", None)
+    if not (user.is_staff or user.is_superuser or (profile and profile.is_admin)):
+        return Response({"detail": "No autorizado"}, status=403)
+    return Response(reports_cache_stats(), status=200)
 
 # ======================
 # Notification ViewSets
@@ -1245,27 +1439,116 @@ def api_reports_dashboard(request):
 class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedCursorPagination
+
+    def _archived(self):
+        """``?archived=1`` lists the user's history moved out by archive_notifications."""
+        return self.action in ('list', 'retrieve') and self.request.query_params.get('archived') in ('1', 'true')
+
+    def _filter(self, queryset):
+        """``?status=read,sent`` / ``?channel=app``; with the user filter this uses the (user, status) index."""
+        for param, choices in (('status', Notification.STATUS_CHOICES), ('channel', Notification.CHANNEL_CHOICES)):
+            raw = self.request.query_params.get(param)
+            if not raw:
+                continue
+            values = [value for value in raw.split(',') if value]
+            valid = {choice for choice, _ in choices}
+            if not values or not set(values) <= valid:
+                raise ValidationError({param: f"Valores permitidos: {', '.join(sorted(valid))}"})
+            queryset = queryset.filter(**{f'{param}__in': values})
+        return queryset
 
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user).order_by('-created_at')
+        if self._archived():
+            queryset = ArchivedNotification.objects.filter(user=self.request.user).order_by('-created_at')
+            return self._filter(queryset) if self.action == 'list' else queryset
+        # Scheduled notifications stay hidden until dispatch_notifications releases them
+        queryset = Notification.objects.filter(user=self.request.user).exclude(status='scheduled').order_by('-created_at')
+        if self.action == 'list':
+            queryset = self._filter(queryset)
+        elif self.action == 'retrieve':
+            queryset = queryset.prefetch_related('delivery_logs')
+        return queryset
+
+    def get_serializer_class(self):
+        if self._archived():
+            return ArchivedNotificationSerializer
+        if self.action == 'list':
+            return NotificationListSerializer
+        return super().get_serializer_class()
+
+    def _mark_read(self, qs):
+        """Mark delivered notifications in ``qs`` as read in one UPDATE and tally campaign reads."""
+        now = timezone.now()
+        with transaction.atomic():
+            # Lock the rows first so a concurrent mark-read cannot claim (and count) them too
+            rows = list(
+                qs.exclude(status__in=['read', 'scheduled', 'failed'])
+                .exclude(channel__in=OUTBOX_CHANNELS, status='pending')
+                .select_for_update()
+                .values_list('pk', 'campaign_id', 'channel')
+            )
+            if not rows:
+                return 0
+            Notification.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(
+                status='read', read_at=now, updated_at=now
+            )
+            Campaign.record('read', Counter(
+                (campaign_id, channel) for _, campaign_id, channel in rows if campaign_id
+            ))
+        return len(rows)
 
     @action(detail=False, methods=['post'], url_path='mark-all-read')
     def mark_all_read(self, request):
-        qs = self.get_queryset().exclude(status='read')
-        updated = 0
-        now = timezone.now()
-        for notif in qs:
-            notif.status = 'read'
-            notif.read_at = now
-            notif.save(update_fields=['status', 'read_at'])
-            updated += 1
-        return Response({'marked': updated})
+        marked = self._mark_read(Notification.objects.filter(user=request.user))
+        reset_unread_count(request.user.id)
+        return Response({'marked': marked})
+
+    @action(detail=False, methods=['post'], url_path='mark-read')
+    def mark_read_bulk(self, request):
+        """Body: {"ids": [1, 2, ...]} or {"before": "<ISO datetime>"}"""
+        ids = request.data.get('ids')
+        before = request.data.get('before')
+        qs = Notification.objects.filter(user=request.user)
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+                return Response({'detail': 'ids debe ser una lista de enteros'}, status=400)
+            qs = qs.filter(pk__in=ids)
+        elif before:
+            before_dt = parse_datetime(str(before))
+            if before_dt is None:
+                return Response({'detail': 'before debe ser un datetime ISO 8601'}, status=400)
+            if timezone.is_naive(before_dt):
+                before_dt = timezone.make_aware(before_dt, timezone.get_current_timezone())
+            qs = qs.filter(created_at__lte=before_dt)
+        else:
+            return Response({'detail': 'Indique ids o before'}, status=400)
+        marked = self._mark_read(qs)
+        if marked:
+            reset_unread_count(request.user.id)
+        return Response({'marked': marked})
+
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        """Badge counter: unread in-app notifications, served from the cache."""
+        user_id = request.user.id
+        count = get_unread_count(
+            user_id,
+            lambda: Notification.objects.filter(user_id=user_id, status='sent', channel='app').count(),
+        )
+        return Response({'unread': count})
 
     @action(detail=True, methods=['post'], url_path='read')
     def mark_read(self, request, pk=None):
         notif = self.get_object()
+        if notif.status == 'failed' or (notif.channel in OUTBOX_CHANNELS and notif.status == 'pending'):
+            # Marking it read would drop it from the outbox before delivery
+            return Response({'detail': 'La notificación aún no ha sido entregada'}, status=409)
         if notif.status != 'read':
+            was_unread = notif.channel == 'app' and notif.status == 'sent'
             notif.mark_read()
+            if was_unread:
+                decr_unread_count(notif.user_id)
         return Response({'ok': True, 'id': notif.id, 'status': notif.status, 'read_at': notif.read_at})
 
     @action(detail=False, methods=['get'], url_path='campaigns')
@@ -1322,7 +1605,7 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         )
 
         # Determine recipients
-        users_qs = User.objects.all().select_related('profile')
+        users_qs = User.objects.all()
         if segment == 'Solo Estudiantes':
             users_qs = users_qs.filter(profile__role='BENEFICIARY')
         elif segment == 'Solo Profesores':
@@ -1330,8 +1613,6 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         elif segment == 'Seleccionados':
             users_qs = users_qs.filter(id__in=selected_ids)
 
-        recipients = list(users_qs)
-
         channels = []
         if channel_opt == 'AMBOS':
             channels = ['email', 'app']
@@ -1340,107 +1621,15 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         elif channel_opt == 'PUSH':
             channels = ['app']
 
-        notifs = []
-        now = timezone.now()
-        # Read flag from settings
-        try:
-            from django.conf import settings
-            send_email_immediate = getattr(settings, 'SEND_EMAIL_IMMEDIATE', True)
-        except Exception:
-            send_email_immediate = True
-
-        for user in recipients:
-            prefs = getattr(user, 'notification_preferences', None)
-            for ch in channels:
-                # Respect preferences
-                if ch == 'app' and prefs and not prefs.app_enabled:
-                    continue
-                if ch == 'email' and prefs and not prefs.email_enabled:
-                    continue
-                # Determine initial status
-                if ch == 'app':
-                    status = 'sent'
-                    sent_at = now
-                    scheduled_for = None
-                else:
-                    # email
-                    if schedule_at and schedule_at > now:
-                        status = 'scheduled'
-                        sent_at = None
-                        scheduled_for = schedule_at
-                    else:
-                        # No programación o en el pasado: enviar ahora
-                        status = 'pending'
-                        sent_at = None
-                        scheduled_for = None
-                notifs.append(
-                    Notification(
-                        user=user,
-                        campaign=camp,
-                        title=name,
-                        body=message,
-                        channel=ch,
-                        status=status,
-                        scheduled_for=scheduled_for,
-                        sent_at=sent_at,
-                        metadata={'type': 'campaign'}
-                    )
-                )
-        if notifs:
-            Notification.objects.bulk_create(notifs)
-
-        # Envío inmediato de email si flag y no hay programación futura (o programación pasada)
-        email_queue = 0
-        try:
-            immediate_window = True if (schedule_at is None or schedule_at <= timezone.now()) else False
-        except Exception:
-            immediate_window = True
-
-        if send_email_immediate and immediate_window:
-            email_notifs = Notification.objects.filter(campaign=camp, channel='email', status='pending')
-            for n in email_notifs:
-                try:
-                    if settings.EMAIL_HOST_USER and settings.EMAIL_HOST_PASSWORD:
-                        if not n.user.email:
-                            raise ValueError('Usuario sin email')
-                        msg = EmailMessage(
-                            subject=n.title,
-                            body=n.body,
-                            from_email=settings.DEFAULT_FROM_EMAIL or settings.EMAIL_HOST_USER,
-                            to=[n.user.email],
-                        )
-                        msg.send(fail_silently=False)
-                        n.mark_sent()
-                        NotificationDeliveryLog.objects.create(
-                            notification=n,
-                            channel='email',
-                            status='success',
-                            detail='Email enviado correctamente'
-                        )
-                        email_queue += 1
-                    else:
-                        NotificationDeliveryLog.objects.create(
-                            notification=n,
-                            channel='email',
-                            status='error',
-                            detail='Credenciales de SMTP faltantes'
-                        )
-                        n.status = 'failed'
-                        n.save(update_fields=['status'])
-                except Exception as exc:
-                    NotificationDeliveryLog.objects.create(
-                        notification=n,
-                        channel='email',
-                        status='error',
-                        detail=f'Error al enviar: {exc}'
-                    )
-                    n.status = 'failed'
-                    n.save(update_fields=['status'])
-
-        camp.update_metrics()
+        # Streamed in bounded batches; emails are only queued here and the
+        # dispatch_notifications worker sends them
+        with transaction.atomic():
+            created = fan_out_campaign(camp, users_qs, channels, schedule_at=schedule_at)
+        email_queue = created.get('email', 0)
+        camp.refresh_from_db(fields=['app_sent'])
 
         return Response({
-            'created': len(notifs),
+            'created': sum(created.values()),
             'app_sent': camp.app_sent,
             'email_queue': email_queue,
             'campaign_id': camp.id,
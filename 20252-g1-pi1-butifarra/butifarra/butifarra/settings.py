@@ -202,8 +202,82 @@ CSRF_COOKIE_SECURE = _get_bool_setting(
     "CSRF_COOKIE_SECURE", CSRF_COOKIE_SAMESITE == "None"
 )
 
+# API pagination (opt-in via ?cursor= / ?page_size= on list endpoints)
+API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", "50"))
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "200"))
+
+# Bulk user import: rows inserted per transaction, password-hashing processes of the import_users command
+# (0 = one per CPU; the upload endpoint hashes inline) and rows accepted per upload
+USER_IMPORT_CHUNK_SIZE = int(os.getenv("USER_IMPORT_CHUNK_SIZE", "500"))
+USER_IMPORT_WORKERS = int(os.getenv("USER_IMPORT_WORKERS", "0"))
+USER_IMPORT_MAX_ROWS = int(os.getenv("USER_IMPORT_MAX_ROWS", "2000"))
+
+# Cache (local memory by default; point CACHE_BACKEND/CACHE_LOCATION at a shared cache in production)
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "butifarra"),
+    }
+}
+# Seconds a computed reports dashboard payload is reused (0 disables caching; only with a shared cache backend)
+REPORTS_CACHE_TIMEOUT = int(os.getenv("REPORTS_CACHE_TIMEOUT", "300"))
+# Seconds a cached per-user unread notification counter lives before it is recounted (only with a shared
+# cache backend; otherwise every read counts in the database)
+UNREAD_COUNT_CACHE_TIMEOUT = int(os.getenv("UNREAD_COUNT_CACHE_TIMEOUT", "3600"))
+# Seconds the serialized user returned by /api/session/ is cached (dropped whenever the user or profile is saved;
+# only with a shared cache backend)
+SESSION_PAYLOAD_CACHE_TIMEOUT = int(os.getenv("SESSION_PAYLOAD_CACHE_TIMEOUT", "3600"))
+# Sessions are read through the cache (and written through to the database) only when the cache is
+# shared by every worker; with a per-process cache a logout on one worker would not reach the others
+_SHARED_CACHE = CACHES["default"]["BACKEND"] not in (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+SESSION_ENGINE = os.getenv("SESSION_ENGINE") or (
+    "django.contrib.sessions.backends.cached_db" if _SHARED_CACHE else "django.contrib.sessions.backends.db"
+)
+# Check-in tokens: lifetime, and signing keys (first signs, all verify; empty uses SECRET_KEY)
+CHECKIN_TOKEN_TTL_MINUTES = int(os.getenv("CHECKIN_TOKEN_TTL_MINUTES", "10"))
+CHECKIN_TOKEN_KEYS = [key for key in os.getenv("CHECKIN_TOKEN_KEYS", "").split(",") if key]
+# Notification stream (SSE): heartbeat frame and cross-process poll intervals, in seconds
+NOTIFICATION_STREAM_HEARTBEAT = float(os.getenv("NOTIFICATION_STREAM_HEARTBEAT", "15"))
+NOTIFICATION_STREAM_POLL_INTERVAL = float(os.getenv("NOTIFICATION_STREAM_POLL_INTERVAL", "2"))
+# Seconds each poll looks back past the previous one, so rows committed late are not missed
+NOTIFICATION_STREAM_POLL_OVERLAP = float(os.getenv("NOTIFICATION_STREAM_POLL_OVERLAP", "10"))
+
 # Notification settings
-SEND_EMAIL_IMMEDIATE = _get_bool_setting("SEND_EMAIL_IMMEDIATE", True)
+# Emails are queued as pending notifications and sent by `manage.py dispatch_notifications`
+NOTIFICATION_DISPATCH_BATCH_SIZE = int(os.getenv("NOTIFICATION_DISPATCH_BATCH_SIZE", "50"))
+# Read/sent notifications older than this are moved to the archive by `manage.py archive_notifications`
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "180"))
+# Per-worker cap on notifications dispatched per minute (0 = unlimited), to stay under SMTP provider limits
+NOTIFICATION_DISPATCH_RATE_PER_MINUTE = int(os.getenv("NOTIFICATION_DISPATCH_RATE_PER_MINUTE", "0"))
+# Campaign broadcasts stream recipients and insert notifications in batches of this size
+NOTIFICATION_FANOUT_BATCH_SIZE = int(os.getenv("NOTIFICATION_FANOUT_BATCH_SIZE", "1000"))
+# An identical activity change within the same window of this many minutes notifies only once
+NOTIFICATION_DEDUPE_WINDOW_MINUTES = int(os.getenv("NOTIFICATION_DEDUPE_WINDOW_MINUTES", "10"))
+# Outgoing channel adapters: chunks sent in parallel, attempts before a row is marked failed and
+# seconds before the first retry (doubled on each attempt). Push/SMS need TRANSPORT set to a provider
+# class (or FileTransport); without one their notifications fail with "Transporte ... no configurado".
+NOTIFICATION_CHANNELS = {
+    "email": {
+        "CONCURRENCY": int(os.getenv("NOTIFICATION_EMAIL_CONCURRENCY", "1")),
+        "MAX_ATTEMPTS": int(os.getenv("NOTIFICATION_EMAIL_MAX_ATTEMPTS", "3")),
+        "RETRY_BACKOFF": int(os.getenv("NOTIFICATION_RETRY_BACKOFF", "60")),
+    },
+    "push": {
+        "TRANSPORT": os.getenv("NOTIFICATION_PUSH_TRANSPORT", ""),
+        "CONCURRENCY": int(os.getenv("NOTIFICATION_PUSH_CONCURRENCY", "4")),
+        "MAX_ATTEMPTS": int(os.getenv("NOTIFICATION_PUSH_MAX_ATTEMPTS", "3")),
+        "RETRY_BACKOFF": int(os.getenv("NOTIFICATION_RETRY_BACKOFF", "60")),
+    },
+    "sms": {
+        "TRANSPORT": os.getenv("NOTIFICATION_SMS_TRANSPORT", ""),
+        "CONCURRENCY": int(os.getenv("NOTIFICATION_SMS_CONCURRENCY", "4")),
+        "MAX_ATTEMPTS": int(os.getenv("NOTIFICATION_SMS_MAX_ATTEMPTS", "3")),
+        "RETRY_BACKOFF": int(os.getenv("NOTIFICATION_RETRY_BACKOFF", "60")),
+    },
+}
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "cifuentesclud@gmail.com")
 
 # Email SMTP configuration (use environment variables for secrets)
@@ -213,6 +287,8 @@ EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
 EMAIL_USE_TLS = _get_bool_setting("EMAIL_USE_TLS", True)
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER", "cifuentesclud@gmail.com")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "odkr npmi ojyo ftda")
+# Messages sent over one SMTP session before reconnecting
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "100"))
 
 LOGGING = {
     'version': 1,
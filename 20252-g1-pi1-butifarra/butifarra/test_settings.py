@@ -28,6 +28,12 @@ DEBUG = False
 
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 
+# Push/SMS deliver to the in-memory loopback (no provider is configured by default)
+NOTIFICATION_CHANNELS = {
+    channel: {**config, 'TRANSPORT': 'butifarra.actividades.channels.LoopbackTransport'} if channel in ('push', 'sms') else config
+    for channel, config in NOTIFICATION_CHANNELS.items()  # noqa: F405
+}
+
 # Ensure actividades app is loaded during tests
 try:
     INSTALLED_APPS  # noqa: F821
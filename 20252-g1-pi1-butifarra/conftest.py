@@ -21,3 +21,10 @@ django.setup()
 def _apply_migrations():
     """Ensure the test database has the required tables before tests run."""
     call_command("migrate", run_syncdb=True, verbosity=0)
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    """The database is rolled back after each test but the cache is not."""
+    from django.core.cache import cache
+    cache.clear()